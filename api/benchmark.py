@@ -0,0 +1,374 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+# psycopg2-binary==2.9.11
+import psycopg2
+from psycopg2 import extensions
+
+# ==============================================================================
+# Endpoint benchmark harness
+# ==============================================================================
+# Drives the search, location, details and trips routes of the Flask app
+# in-process (Flask test client, real pool, real PostGIS at DATABASE_URL) and
+# reports per route: p50/p95/p99 latency, throughput, errors and SQL statements
+# per request. Statements are counted by a connection_factory installed on the
+# pool, so the numbers include every query a handler runs.
+#
+# Request parameters are drawn deterministically (--seed) from what is in the
+# database, so load synthetic data first (python -m api.gen_data --load).
+# Caching is off by default (CACHE_BACKEND=none) to measure the database path;
+# --cache keeps the configured backend.
+#
+# Usage:
+#     python -m api.benchmark --requests 500 --concurrency 8 --save
+#     python -m api.benchmark --requests 500 --concurrency 8      (compares to the baseline)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'baseline.json')
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 4
+DEFAULT_WARMUP = 10
+DEFAULT_TOLERANCE = 0.20  # Allowed p95 slowdown before a route counts as regressed
+PERCENTILES = (50, 95, 99)
+SAMPLE_SIZE = 500  # Ids/users/keywords sampled from the database to build requests
+
+
+# ==============================================================================
+# Query counting
+# ==============================================================================
+_counter = threading.local()
+_cursor_classes = {}
+_cursor_classes_lock = threading.Lock()
+
+
+def _count_statement():
+    _counter.queries = getattr(_counter, 'queries', 0) + 1
+
+
+def reset_query_count():
+    _counter.queries = 0
+
+
+def query_count():
+    """Statements executed by the current thread since reset_query_count()."""
+    return getattr(_counter, 'queries', 0)
+
+
+class _CountingCursorMixin:
+    def execute(self, query, vars=None):
+        _count_statement()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        _count_statement()
+        return super().executemany(query, vars_list)
+
+    def callproc(self, procname, parameters=None):
+        _count_statement()
+        return super().callproc(procname, parameters)
+
+    def copy_expert(self, sql, file, size=8192):
+        _count_statement()
+        return super().copy_expert(sql, file, size)
+
+
+def _counting_cursor(factory):
+    with _cursor_classes_lock:
+        if factory not in _cursor_classes:
+            _cursor_classes[factory] = type(f"Counting{factory.__name__}", (_CountingCursorMixin, factory), {})
+        return _cursor_classes[factory]
+
+
+class CountingConnection(extensions.connection):
+    """psycopg2 connection whose cursors (of any cursor_factory) count statements per thread."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _counting_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+
+# ==============================================================================
+# Routes
+# ==============================================================================
+def _viewport(rng, center, span):
+    lat, lng = center
+    half = span / 2
+    return {
+        'northEast': {'lat': min(lat + half, 85.0), 'lng': ((lng + half + 180) % 360) - 180},
+        'southWest': {'lat': max(lat - half, -85.0), 'lng': ((lng - half + 180) % 360) - 180},
+    }
+
+
+def _point(rng, sample):
+    lat, lng = rng.choice(sample['points'])
+    return round(lat + rng.uniform(-0.05, 0.05), 4), round(lng + rng.uniform(-0.05, 0.05), 4)
+
+
+def _trip_details(trip):
+    trip_id, user_id = trip
+    return 'GET', f"/py/trips/get-trip-details/{trip_id}", {'headers': {'X-User-Id': user_id}}
+
+
+# name -> builder(rng, sample) returning (method, path, request kwargs)
+ROUTES = {
+    'search.keyword': lambda rng, s: (
+        'GET', '/py/search/keyword?' + urlencode({'q': rng.choice(s['keywords']), 'limit': 20}), {}),
+    'search.location': lambda rng, s: (
+        'GET', '/py/search/location?' + urlencode(
+            dict(zip(('lat', 'lon'), _point(rng, s)), radius=rng.choice([5, 25, 100]), limit=20)), {}),
+    'search.combined': lambda rng, s: (
+        'GET', '/py/search/combined?' + urlencode(
+            dict(zip(('lat', 'lon'), _point(rng, s)), q=rng.choice(s['keywords']), radius=50, limit=20)), {}),
+    'experiences.location': lambda rng, s: (
+        'POST', '/py/experiences/location',
+        {'json': dict(_viewport(rng, _point(rng, s), rng.choice([0.05, 0.5, 2.0])), photo_size='thumbnail')}),
+    'experiences.location.clusters': lambda rng, s: (
+        'POST', '/py/experiences/location',
+        {'json': dict(_viewport(rng, _point(rng, s), rng.choice([10.0, 40.0, 120.0])), zoom=rng.choice([3, 5, 7]))}),
+    'experiences.details': lambda rng, s: (
+        'GET', f"/py/experiences/details/{rng.choice(s['experience_ids'])}?photo_size=medium", {}),
+    'experiences.top': lambda rng, s: ('GET', '/py/experiences/top_experiences', {}),
+    'experiences.trending': lambda rng, s: ('GET', '/py/experiences/trending', {}),
+    'trips.user_trips': lambda rng, s: (
+        'GET', '/py/trips/user-trips?limit=20', {'headers': {'X-User-Id': rng.choice(s['trip_owners'])}}),
+    'trips.details': lambda rng, s: _trip_details(rng.choice(s['trips'])),
+}
+
+
+def sample_database(dsn, seed):
+    """Pick the ids, users, keywords and points requests are built from."""
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            # Hash order: a stable pseudo-random sample per seed
+            cur.execute("""
+                SELECT experience_id, latitude, longitude
+                FROM experiences
+                ORDER BY md5(experience_id || ':' || %s)
+                LIMIT %s
+            """, (seed, SAMPLE_SIZE))
+            experiences = cur.fetchall()
+            cur.execute("""
+                SELECT k.name
+                FROM keywords k
+                    JOIN experience_keywords ek ON ek.keyword_id = k.keyword_id
+                GROUP BY k.name
+                ORDER BY COUNT(*) DESC, k.name
+                LIMIT %s
+            """, (SAMPLE_SIZE,))
+            keywords = [row[0] for row in cur.fetchall()]
+            cur.execute("""
+                SELECT trip_id, user_id
+                FROM trips
+                ORDER BY md5(trip_id || ':' || %s)
+                LIMIT %s
+            """, (seed, SAMPLE_SIZE))
+            trips = cur.fetchall()
+            cur.execute("SELECT COUNT(*) FROM experiences")
+            experience_count = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*) FROM trips")
+            trip_count = cur.fetchone()[0]
+        conn.rollback()
+    finally:
+        conn.close()
+
+    if not experiences or not keywords:
+        raise RuntimeError("No experiences to benchmark against; run python -m api.gen_data --load first")
+    return {
+        'experience_ids': sorted(row[0] for row in experiences),
+        'points': sorted((row[1], row[2]) for row in experiences),
+        'keywords': keywords,
+        'trips': sorted(trips),
+        'trip_owners': sorted({row[1] for row in trips}),
+        'experience_count': experience_count,
+        'trip_count': trip_count,
+    }
+
+
+# ==============================================================================
+# Running
+# ==============================================================================
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def benchmark_route(app, build, sample, requests, concurrency, warmup, seed):
+    """Run one route; returns its latency/throughput/query statistics."""
+    rng = random.Random(seed)
+    plan = [build(rng, sample) for _ in range(warmup + requests)]
+    local = threading.local()
+
+    def call(spec):
+        method, path, kwargs = spec
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        reset_query_count()
+        started = time.perf_counter()
+        response = local.client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        return elapsed, query_count(), response.status_code
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, plan[:warmup]))
+        started = time.perf_counter()
+        results = list(executor.map(call, plan[warmup:]))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(result[0] * 1000 for result in results)
+    queries = [result[1] for result in results]
+    stats = {f"p{p}_ms": round(percentile(latencies, p), 3) for p in PERCENTILES}
+    stats.update({
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'throughput_rps': round(len(results) / wall, 1),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'errors': sum(1 for result in results if result[2] >= 400),
+        'requests': len(results),
+    })
+    return stats
+
+
+def run_benchmarks(routes, requests=DEFAULT_REQUESTS, concurrency=DEFAULT_CONCURRENCY, warmup=DEFAULT_WARMUP,
+                   seed=42, cache=False):
+    """Benchmark the named routes against DATABASE_URL.
+
+    Returns:
+        dict: {"meta": {...}, "routes": {name: stats}}
+    """
+    if not cache:
+        os.environ['CACHE_BACKEND'] = 'none'
+
+    from api import py_db
+    py_db.use_pool(py_db.ConnectionPool(
+        py_db.DATABASE_URL, max_size=max(py_db.POOL_MAX_SIZE, concurrency + 4),
+        connection_factory=CountingConnection,
+        health_check_idle=float('inf')))  # Keep pings out of the per-request counts
+    from api.py_index import app
+
+    sample = sample_database(py_db.DATABASE_URL, seed)
+    results = {}
+    for name in routes:
+        if name.startswith('trips.') and not sample['trips']:
+            print(f"{name:32} skipped (no trips in the database)")
+            continue
+        results[name] = benchmark_route(app, ROUTES[name], sample, requests, concurrency, warmup, seed)
+        print_route(name, results[name])
+
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=False).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': revision,
+            'seed': seed,
+            'requests': requests,
+            'concurrency': concurrency,
+            'cache': cache,
+            'experiences': sample['experience_count'],
+            'trips': sample['trip_count'],
+        },
+        'routes': results,
+    }
+
+
+def print_route(name, stats):
+    print(f"{name:32} p50 {stats['p50_ms']:8.2f}ms  p95 {stats['p95_ms']:8.2f}ms  "
+          f"p99 {stats['p99_ms']:8.2f}ms  {stats['throughput_rps']:8.1f} req/s  "
+          f"{stats['queries_mean']:5.2f} queries/req"
+          + (f"  ✗ {stats['errors']} errors" if stats['errors'] else ""))
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Print each route against the baseline; returns the names of regressed routes.
+
+    A route regresses when its p95 grows by more than `tolerance`, it runs more
+    queries per request, or it starts returning errors.
+    """
+    for key in ('experiences', 'trips', 'requests', 'concurrency', 'cache'):
+        if current['meta'].get(key) != baseline['meta'].get(key):
+            print(f"  ! {key} differs from the baseline ({current['meta'].get(key)} vs "
+                  f"{baseline['meta'].get(key)}); numbers are not directly comparable")
+
+    regressed = []
+    for name, stats in current['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            print(f"{name:32} (not in baseline)")
+            continue
+        change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        reasons = []
+        if change > tolerance:
+            reasons.append(f"p95 +{change:.0%}")
+        if stats['queries_mean'] > before['queries_mean']:
+            reasons.append(f"queries {before['queries_mean']} -> {stats['queries_mean']}")
+        if stats['errors'] > before['errors']:
+            reasons.append(f"errors {before['errors']} -> {stats['errors']}")
+        marker = f"✗ {', '.join(reasons)}" if reasons else "✓"
+        print(f"{name:32} p95 {before['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f}ms ({change:+.0%})  {marker}")
+        if reasons:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark API routes against the local database.")
+    parser.add_argument('routes', nargs='*', help=f"Routes to run (default: all of {', '.join(ROUTES)})")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="Measured requests per route")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache', action='store_true', help="Keep the configured response cache")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.routes if name not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)}")
+
+    try:
+        current = run_benchmarks(args.routes or list(ROUTES), args.requests, max(1, args.concurrency),
+                                 max(0, args.warmup), args.seed, args.cache)
+    except (RuntimeError, psycopg2.Error) as e:
+        print(f"✗ {e}")
+        return 1
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+        print(f"✓ Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; rerun with --save to create one")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nCompared to baseline {baseline['meta'].get('revision')} ({baseline['meta'].get('created_at')}):")
+    regressed = compare(current, baseline, args.tolerance)
+    if regressed:
+        print(f"✗ {len(regressed)} routes regressed")
+        return 1
+    print("✓ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,581 @@
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+# psycopg2-binary==2.9.11
+import psycopg2
+from psycopg2.extras import Json
+# python-dotenv==1.0.1
+from dotenv import load_dotenv
+
+from api.py_fts import refresh_search_vectors
+from api.py_popularity import TREND_WEIGHT_RATING, reconcile_keyword_usage, trend_event_sql
+
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# ==============================================================================
+# Bulk experience loader
+# ==============================================================================
+# Streams experiences from JSON (a top-level array), NDJSON or CSV and loads
+# them in batches. Each batch is COPY'd into a temp staging table and moved into
+# the real tables with a fixed number of set-based statements: ids are
+# pre-allocated from the identity sequence, locations are built with one
+# ST_Point per row inside the INSERT ... SELECT, keywords are upserted and
+# linked with two statements, ratings/rating stats/trend scores/photos/search
+# documents with one each. Batches run in parallel on separate connections;
+# keyword usage counts, shared by every batch, are reconciled once at the end.
+#
+# Resume: every batch commits together with a row in bulk_load_batches, keyed
+# by the source name and batch number. Rerunning the same command (same input,
+# same --batch-size) skips committed batches, so a failed or interrupted load
+# continues where it stopped without duplicating rows.
+#
+# --defer-indexes drops the secondary indexes of the loaded tables first and
+# rebuilds them (in parallel) once every batch is in. Their definitions are
+# saved in bulk_load_runs, so a rerun after a failure still restores them.
+#
+# Usage:
+#     python -m api.bulk_load public/experiences.json
+#     python -m api.bulk_load data.ndjson --workers 8 --batch-size 20000 --defer-indexes
+#     python -m api.bulk_load --restore-indexes --source data.ndjson
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_WORKERS = 4
+JSON_READ_BYTES = 1 << 16
+MAX_REJECTS_SHOWN = 20
+
+# Tables written by a batch; their non-constraint indexes can be deferred
+LOADED_TABLES = ['experiences', 'keywords', 'experience_keywords', 'experience_search',
+                 'experience_ratings', 'experience_rating_stats', 'experience_popularity',
+                 'experience_photos']
+
+_STAGING_COLUMNS = ['seq', 'user_id', 'title', 'description', 'experience_date', 'create_date',
+                    'address', 'latitude', 'longitude', 'keywords', 'rating', 'photos']
+
+_CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE bulk_staging (
+        seq bigint NOT NULL,
+        experience_id integer,
+        user_id text NOT NULL,
+        title text NOT NULL,
+        description text NOT NULL,
+        experience_date date NOT NULL,
+        create_date timestamptz,
+        address text NOT NULL,
+        latitude double precision NOT NULL,
+        longitude double precision NOT NULL,
+        keywords text NOT NULL,
+        rating smallint,
+        photos text NOT NULL
+    ) ON COMMIT DROP
+"""
+
+# Statements moving one staged batch into the real tables (in order)
+_BATCH_SQL = [
+    # Explicit ids (the identity is GENERATED BY DEFAULT) let later statements join on them
+    """
+    UPDATE bulk_staging
+    SET experience_id = nextval(pg_get_serial_sequence('experiences', 'experience_id'))
+    """,
+    """
+    INSERT INTO experiences (experience_id, user_id, title, description, experience_date, create_date,
+                             address, latitude, longitude, location)
+    SELECT experience_id, user_id, title, description, experience_date, COALESCE(create_date, NOW()),
+           address, latitude, longitude, ST_Point(longitude, latitude)::geography
+    FROM bulk_staging
+    ORDER BY seq
+    """,
+    # Sorted, so concurrent batches take keyword locks in the same order
+    """
+    INSERT INTO keywords (name)
+    SELECT DISTINCT k.name
+    FROM bulk_staging s
+        CROSS JOIN LATERAL json_array_elements_text(s.keywords::json) AS k(name)
+    WHERE btrim(k.name) <> ''
+    ORDER BY k.name
+    ON CONFLICT (name) DO NOTHING
+    """,
+    """
+    INSERT INTO experience_keywords (experience_id, keyword_id)
+    SELECT DISTINCT s.experience_id, kw.keyword_id
+    FROM bulk_staging s
+        CROSS JOIN LATERAL json_array_elements_text(s.keywords::json) AS k(name)
+        JOIN keywords kw ON kw.name = k.name
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO experience_ratings (experience_id, user_id, rating)
+    SELECT experience_id, user_id, rating
+    FROM bulk_staging
+    WHERE rating IS NOT NULL
+    """,
+    """
+    INSERT INTO experience_rating_stats
+        (experience_id, rating_sum, rating_count, count_1, count_2, count_3, count_4, count_5)
+    SELECT experience_id, rating, 1,
+           (rating = 1)::int, (rating = 2)::int, (rating = 3)::int, (rating = 4)::int, (rating = 5)::int
+    FROM bulk_staging
+    WHERE rating IS NOT NULL
+    """,
+    # The rating's trend event (the experiences are new, so no existing row to fold into)
+    f"""
+    INSERT INTO experience_popularity (experience_id, trend_log)
+    SELECT experience_id, {trend_event_sql(f'{TREND_WEIGHT_RATING} * rating / 5.0')}
+    FROM bulk_staging
+    WHERE rating IS NOT NULL
+    """,
+    # Photos are read back ordered by upload_date, so keep the input order in it
+    """
+    INSERT INTO experience_photos (experience_id, photo_url, upload_date)
+    SELECT s.experience_id, p.url, NOW() + p.position * INTERVAL '1 millisecond'
+    FROM bulk_staging s
+        CROSS JOIN LATERAL json_array_elements_text(s.photos::json) WITH ORDINALITY AS p(url, position)
+    WHERE btrim(p.url) <> ''
+    """,
+]
+
+
+class RejectedRecord(ValueError):
+    """An input record that cannot be loaded (reported and skipped)."""
+
+
+# ==============================================================================
+# Input
+# ==============================================================================
+def _iter_json_array(f):
+    """Yield the elements of a top-level JSON array without reading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = f.read(JSON_READ_BYTES)
+        buffer += chunk
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError("JSON input must be an array of experiences")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if not chunk:
+                    raise
+                break  # Element continues in the next chunk
+            yield item
+        buffer = buffer[pos:]
+        if not chunk:
+            raise ValueError("Unterminated JSON array")
+
+
+def _iter_ndjson(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def _iter_csv(f):
+    yield from csv.DictReader(f)
+
+
+READERS = {'json': _iter_json_array, 'ndjson': _iter_ndjson, 'csv': _iter_csv}
+
+
+def detect_format(path):
+    extension = path.rsplit('.', 1)[-1].lower()
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    if extension in READERS:
+        return extension
+    raise ValueError(f"Cannot tell the format of {path!r}; pass --format")
+
+
+def _list_field(value):
+    """Keywords/photo URLs: a list, a JSON list, or a ';'-separated string (CSV)."""
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    value = str(value).strip()
+    if value.startswith('['):
+        return [str(item) for item in json.loads(value)]
+    return [item.strip() for item in value.split(';') if item.strip()]
+
+
+def normalize_record(record):
+    """Validate one input record and map it to staging columns (minus seq).
+
+    Accepts both the public/experiences.json shape (rating, imageURLs) and the
+    API/load_db shape (user_rating, photos).
+
+    Raises:
+        RejectedRecord: If a required field is missing or invalid
+    """
+    if not isinstance(record, dict):
+        raise RejectedRecord("not an object")
+    for field in ('user_id', 'title', 'description', 'experience_date'):
+        if not str(record.get(field) or '').strip():
+            raise RejectedRecord(f"missing {field}")
+    try:
+        latitude, longitude = float(record['latitude']), float(record['longitude'])
+    except (KeyError, TypeError, ValueError):
+        raise RejectedRecord("latitude/longitude must be numeric")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or math.isnan(latitude + longitude):
+        raise RejectedRecord("latitude/longitude out of range")
+    try:
+        experience_date = date.fromisoformat(str(record['experience_date'])[:10])
+        create_date = record.get('create_date') or None
+        if create_date:
+            create_date = datetime.fromisoformat(str(create_date).replace('Z', '+00:00'))
+    except ValueError as e:
+        raise RejectedRecord(f"bad date: {e}")
+
+    rating = record.get('user_rating', record.get('rating'))
+    if rating in (None, ''):
+        rating = None
+    else:
+        try:
+            rating = int(rating)
+        except (TypeError, ValueError):
+            raise RejectedRecord("rating must be an integer")
+        if not 1 <= rating <= 5:
+            rating = None  # Same as the API: out-of-range ratings are ignored
+    try:
+        keywords = _list_field(record.get('keywords'))
+        photos = _list_field(record.get('imageURLs', record.get('photos')))
+    except ValueError as e:
+        raise RejectedRecord(f"bad keywords/photos: {e}")
+
+    return [str(record['user_id']), str(record['title']), str(record['description']), experience_date,
+            create_date, str(record.get('address') or ''), latitude, longitude,
+            json.dumps(keywords), rating, json.dumps(photos)]
+
+
+def batches(records, batch_size):
+    """Group records into numbered batches of (seq, record) pairs."""
+    batch = []
+    batch_no = 0
+    for seq, record in enumerate(records):
+        batch.append((seq, record))
+        if len(batch) == batch_size:
+            yield batch_no, batch
+            batch_no += 1
+            batch = []
+    if batch:
+        yield batch_no, batch
+
+
+# ==============================================================================
+# Loading
+# ==============================================================================
+def _copy_value(value):
+    """Encode a value for COPY's text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def load_batch(conn, source, batch_no, batch):
+    """Stage and load one batch; commits it together with its resume marker.
+
+    Returns:
+        tuple: (loaded rows, rejected [(seq, reason)])
+    """
+    buffer = io.StringIO()
+    rejected = []
+    loaded = 0
+    for seq, record in batch:
+        try:
+            row = normalize_record(record)
+        except RejectedRecord as e:
+            rejected.append((seq, str(e)))
+            continue
+        buffer.write('\t'.join(_copy_value(value) for value in [seq, *row]))
+        buffer.write('\n')
+        loaded += 1
+    buffer.seek(0)
+
+    try:
+        with conn.cursor() as cur:
+            if loaded:
+                cur.execute(_CREATE_STAGING_SQL)
+                cur.copy_expert(f"COPY bulk_staging ({', '.join(_STAGING_COLUMNS)}) FROM STDIN", buffer)
+                for statement in _BATCH_SQL:
+                    cur.execute(statement)
+                cur.execute("SELECT experience_id FROM bulk_staging")
+                refresh_search_vectors(cur, [row[0] for row in cur.fetchall()])
+            cur.execute("""
+                INSERT INTO bulk_load_batches (source, batch_no, row_count, rejected_count)
+                VALUES (%s, %s, %s, %s)
+            """, (source, batch_no, loaded, len(rejected)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return loaded, rejected
+
+
+def _start_run(conn, source, batch_size):
+    """Register (or resume) a load and return the batch numbers already committed."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO bulk_load_runs (source, batch_size)
+            VALUES (%s, %s)
+            ON CONFLICT (source) DO UPDATE SET finished_at = NULL
+            RETURNING batch_size
+        """, (source, batch_size))
+        recorded_size = cur.fetchone()[0]
+        if recorded_size != batch_size:
+            conn.rollback()
+            raise ValueError(f"{source!r} was started with --batch-size {recorded_size}; "
+                             f"resume with the same batch size")
+        cur.execute("SELECT batch_no FROM bulk_load_batches WHERE source = %s", (source,))
+        done = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return done
+
+
+def defer_indexes(conn, source):
+    """Drop the loaded tables' secondary indexes, saving their definitions on the run.
+
+    Indexes backing constraints (primary keys, UNIQUE) stay: ON CONFLICT and
+    foreign keys need them.
+
+    Returns:
+        int: Number of indexes dropped
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            WHERE i.indrelid = ANY(%s::regclass[])
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        """, (LOADED_TABLES,))
+        indexes = dict(cur.fetchall())
+        cur.execute("""
+            UPDATE bulk_load_runs
+            SET deferred_indexes = COALESCE(deferred_indexes, '{}'::jsonb) || %s::jsonb
+            WHERE source = %s
+        """, (Json(indexes), source))
+        for name in indexes:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    return len(indexes)
+
+
+def restore_indexes(source, workers=DEFAULT_WORKERS, dsn=None):
+    """Rebuild indexes deferred by a load (in parallel), then ANALYZE the tables.
+
+    Returns:
+        int: Number of indexes rebuilt
+    """
+    dsn = dsn or DATABASE_URL
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT deferred_indexes FROM bulk_load_runs WHERE source = %s", (source,))
+            row = cur.fetchone()
+        conn.rollback()
+        definitions = list(((row and row[0]) or {}).values())
+
+        def build(definition):
+            statement = (definition.replace('CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS ', 1)
+                         .replace('CREATE UNIQUE INDEX ', 'CREATE UNIQUE INDEX IF NOT EXISTS ', 1))
+            build_conn = psycopg2.connect(dsn)
+            try:
+                build_conn.autocommit = True
+                started = time.monotonic()
+                with build_conn.cursor() as cur:
+                    cur.execute(statement)
+                print(f"  ✓ {statement.split(' ON ')[0]} ({time.monotonic() - started:.1f}s)")
+            finally:
+                build_conn.close()
+
+        if definitions:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                list(executor.map(build, definitions))
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for table in LOADED_TABLES:
+                cur.execute(f"ANALYZE {table}")
+            cur.execute("UPDATE bulk_load_runs SET deferred_indexes = NULL WHERE source = %s", (source,))
+        return len(definitions)
+    finally:
+        conn.close()
+
+
+def bulk_load(records, source, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+              defer=False, dsn=None):
+    """Load an iterable of experience records, resuming a previous run of the same source.
+
+    Args:
+        records: Iterable of dicts (see normalize_record)
+        source (str): Name identifying this input for resume
+        batch_size (int): Records per batch/transaction
+        workers (int): Batches loaded in parallel (one connection each)
+        defer (bool): Drop secondary indexes during the load and rebuild them after
+        dsn (str): Database URL (defaults to DATABASE_URL)
+
+    Returns:
+        dict: loaded, rejected, skipped_batches, seconds
+    """
+    dsn = dsn or DATABASE_URL
+    started = time.monotonic()
+
+    conn = psycopg2.connect(dsn)
+    try:
+        done = _start_run(conn, source, batch_size)
+        if done:
+            print(f"Resuming {source}: {len(done)} batches already loaded")
+        if defer:
+            print(f"Deferred {defer_indexes(conn, source)} indexes until the load finishes")
+    finally:
+        conn.close()
+
+    # One connection per worker; a batch's commit is also its resume point, so
+    # losing the last few on a crash only means they are loaded again
+    connections = queue.Queue()
+    for _ in range(max(1, workers)):
+        worker_conn = psycopg2.connect(dsn)
+        with worker_conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = off")
+        worker_conn.commit()
+        connections.put(worker_conn)
+
+    totals = {'loaded': 0, 'rejected': 0, 'skipped_batches': 0}
+    rejects_shown = 0
+    lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(max(1, workers) * 2)
+    failure = []
+
+    def run(batch_no, batch):
+        nonlocal rejects_shown
+        worker_conn = connections.get()
+        try:
+            batch_started = time.monotonic()
+            loaded, rejected = load_batch(worker_conn, source, batch_no, batch)
+            elapsed = time.monotonic() - batch_started
+            with lock:
+                totals['loaded'] += loaded
+                totals['rejected'] += len(rejected)
+                for seq, reason in rejected:
+                    if rejects_shown < MAX_REJECTS_SHOWN:
+                        print(f"  ✗ record {seq}: {reason}")
+                    rejects_shown += 1
+                overall = totals['loaded'] / max(time.monotonic() - started, 1e-9)
+                print(f"✓ batch {batch_no}: {loaded} rows in {elapsed:.2f}s "
+                      f"({loaded / max(elapsed, 1e-9):,.0f} rows/s; total {totals['loaded']:,}, "
+                      f"{overall:,.0f} rows/s)")
+        except Exception as e:
+            failure.append((batch_no, e))
+        finally:
+            connections.put(worker_conn)
+            in_flight.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for batch_no, batch in batches(records, batch_size):
+                if failure:
+                    break
+                if batch_no in done:
+                    totals['skipped_batches'] += 1
+                    continue
+                in_flight.acquire()
+                executor.submit(run, batch_no, batch)
+    finally:
+        while not connections.empty():
+            connections.get().close()
+
+    if failure:
+        batch_no, error = failure[0]
+        raise RuntimeError(f"Batch {batch_no} failed: {error}. Rerun the same command to resume"
+                           + (" (deferred indexes are rebuilt when the load completes)" if defer else ""))
+
+    restored = restore_indexes(source, workers, dsn)
+    if restored:
+        print(f"✓ Rebuilt {restored} deferred indexes")
+    conn = psycopg2.connect(dsn)
+    try:
+        # Batches link keywords set-wise without touching the shared counter rows
+        reconcile_keyword_usage(conn)
+        with conn.cursor() as cur:
+            cur.execute("UPDATE bulk_load_runs SET finished_at = NOW() WHERE source = %s", (source,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    totals['seconds'] = time.monotonic() - started
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load experiences (JSON array, NDJSON or CSV).")
+    parser.add_argument('path', nargs='?', help="Input file, or - for stdin (needs --format)")
+    parser.add_argument('--format', choices=sorted(READERS))
+    parser.add_argument('--source', help="Name used to resume this load (default: the input path)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help="Drop secondary indexes during the load and rebuild them afterwards")
+    parser.add_argument('--restore-indexes', action='store_true',
+                        help="Only rebuild the indexes deferred by an unfinished load of --source")
+    args = parser.parse_args(argv)
+
+    if args.restore_indexes:
+        if not (args.source or args.path):
+            parser.error("--restore-indexes needs --source")
+        source = args.source or os.path.abspath(args.path)
+        print(f"✓ Rebuilt {restore_indexes(source, args.workers)} deferred indexes")
+        return 0
+    if not args.path:
+        parser.error("an input path is required")
+
+    fmt = args.format or detect_format(args.path)
+    source = args.source or (args.path if args.path == '-' else os.path.abspath(args.path))
+    f = sys.stdin if args.path == '-' else open(args.path, newline='' if fmt == 'csv' else None,
+                                                  encoding='utf-8')
+    try:
+        totals = bulk_load(READERS[fmt](f), source, args.batch_size, args.workers, args.defer_indexes)
+    except (RuntimeError, ValueError) as e:
+        print(f"✗ {e}")
+        return 1
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    print(f"\n{'=' * 60}")
+    print(f"✓ Loaded {totals['loaded']:,} experiences in {totals['seconds']:.1f}s "
+          f"({totals['loaded'] / max(totals['seconds'], 1e-9):,.0f} rows/s)")
+    if totals['skipped_batches']:
+        print(f"  {totals['skipped_batches']} batches were already loaded by an earlier run")
+    if totals['rejected']:
+        print(f"  {totals['rejected']:,} records rejected")
+    print(f"{'=' * 60}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+# psycopg2-binary==2.9.11
+import psycopg2
+
+from api.bulk_load import DEFAULT_BATCH_SIZE, DEFAULT_WORKERS, DATABASE_URL, bulk_load
+from api.py_popularity import record_trip_additions
+
+# ==============================================================================
+# Synthetic data generator
+# ==============================================================================
+# Deterministic (same seed and counts -> same data) experiences and trips at
+# realistic scale, for benchmarking (see api/benchmark.py):
+#   - locations cluster around weighted city centres with a gaussian spread,
+#     plus a scattered share outside any city;
+#   - keywords come from public/keywords.json with a Zipf-like popularity, so a
+#     few are everywhere and most are rare;
+#   - users follow a power law (a few prolific authors, a long tail);
+#   - ratings skew positive, some experiences are unrated, photos vary 0-4;
+#   - trips pick experiences from one city, like a real itinerary.
+#
+# Usage:
+#     python -m api.gen_data --experiences 100000 --trips 5000 --load
+#     python -m api.gen_data --experiences 1000 --out sample.ndjson
+SYNTHETIC_USER_PREFIX = 'synthetic-user-'
+KEYWORDS_PATH = os.path.join(os.path.dirname(__file__), '..', 'public', 'keywords.json')
+ANCHOR_DATE = date(2025, 10, 1)  # Fixed so output does not depend on the day it runs
+SCATTERED_SHARE = 0.08
+UNRATED_SHARE = 0.15
+KEYWORD_ZIPF_EXPONENT = 1.1
+
+# (name, latitude, longitude, weight, spread in km)
+CITIES = [
+    ('New York', 40.7128, -74.0060, 10, 12), ('Los Angeles', 34.0522, -118.2437, 8, 25),
+    ('San Francisco', 37.7749, -122.4194, 6, 10), ('Chicago', 41.8781, -87.6298, 5, 12),
+    ('Seattle', 47.6062, -122.3321, 3, 10), ('Miami', 25.7617, -80.1918, 4, 12),
+    ('Las Vegas', 36.1699, -115.1398, 4, 8), ('Grand Canyon', 36.0544, -112.1401, 2, 30),
+    ('Yellowstone', 44.4280, -110.5885, 2, 40), ('Mexico City', 19.4326, -99.1332, 5, 15),
+    ('Toronto', 43.6532, -79.3832, 3, 12), ('Vancouver', 49.2827, -123.1207, 3, 10),
+    ('London', 51.5074, -0.1278, 10, 12), ('Paris', 48.8566, 2.3522, 10, 8),
+    ('Rome', 41.9028, 12.4964, 7, 8), ('Barcelona', 41.3874, 2.1686, 6, 7),
+    ('Amsterdam', 52.3676, 4.9041, 4, 6), ('Berlin', 52.5200, 13.4050, 4, 10),
+    ('Prague', 50.0755, 14.4378, 3, 6), ('Istanbul', 41.0082, 28.9784, 5, 15),
+    ('Reykjavik', 64.1466, -21.9426, 1, 40), ('Cairo', 30.0444, 31.2357, 3, 12),
+    ('Cape Town', -33.9249, 18.4241, 3, 15), ('Marrakesh', 31.6295, -7.9811, 2, 8),
+    ('Dubai', 25.2048, 55.2708, 4, 15), ('Mumbai', 19.0760, 72.8777, 4, 15),
+    ('Bangkok', 13.7563, 100.5018, 6, 12), ('Singapore', 1.3521, 103.8198, 5, 8),
+    ('Bali', -8.3405, 115.0920, 4, 30), ('Tokyo', 35.6762, 139.6503, 10, 15),
+    ('Kyoto', 35.0116, 135.7681, 4, 6), ('Seoul', 37.5665, 126.9780, 5, 12),
+    ('Hong Kong', 22.3193, 114.1694, 4, 8), ('Sydney', -33.8688, 151.2093, 5, 15),
+    ('Queenstown', -45.0312, 168.6626, 1, 25), ('Rio de Janeiro', -22.9068, -43.1729, 4, 12),
+    ('Buenos Aires', -34.6037, -58.3816, 3, 12), ('Cusco', -13.5320, -71.9675, 2, 20),
+    # Antimeridian neighbours, so wrapped viewports have data on both sides
+    ('Fiji', -17.7134, 178.0650, 1, 30), ('Samoa', -13.7590, -172.1046, 1, 20),
+]
+
+TITLE_TEMPLATES = [
+    '{adjective} {keyword} in {city}', '{keyword} near {city}', 'A day of {keyword} in {city}',
+    '{city}: {adjective} {keyword}', 'Morning {keyword} around {city}', '{adjective} {city} {keyword}',
+]
+ADJECTIVES = ['Unforgettable', 'Hidden', 'Classic', 'Quiet', 'Crowded', 'Budget', 'Family',
+              'Rainy', 'Sunset', 'Late-night', 'Local', 'Scenic', 'Overrated', 'Perfect']
+SENTENCES = [
+    'We spent about {hours} hours here and it was worth every minute.',
+    'Arrive early; by {clock} it gets busy and parking is hard to find.',
+    'Great spot for {keyword}, especially if you like {other}.',
+    'Prices were reasonable and the staff were friendly.',
+    'Bring water and comfortable shoes - there is more walking than expected.',
+    'The views at golden hour make this a must for photography.',
+    'Not the best for young kids, but teenagers loved the {keyword}.',
+    'Public transit drops you a short walk away.',
+    'We came back a second time to try the {other} as well.',
+    'It was a little overrated, but still a good stop on the way to {city}.',
+]
+
+
+def load_keywords(path=KEYWORDS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return [name for name in json.load(f) if isinstance(name, str) and name.strip()]
+
+
+def _offset(latitude, longitude, rng, spread_km):
+    """Gaussian offset of spread_km around a point (kept inside valid coordinates)."""
+    lat = latitude + rng.gauss(0, spread_km) / 111.0
+    lon = longitude + rng.gauss(0, spread_km) / (111.0 * max(math.cos(math.radians(latitude)), 0.05))
+    lat = max(-89.9, min(89.9, lat))
+    lon = (lon + 180.0) % 360.0 - 180.0
+    return round(lat, 6), round(lon, 6)
+
+
+def _zipf_weights(count, exponent=KEYWORD_ZIPF_EXPONENT):
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def _user_id(rng, users):
+    # Squared uniform -> low user numbers are far more prolific (power law)
+    return f"{SYNTHETIC_USER_PREFIX}{int(users * rng.random() ** 2):06d}"
+
+
+def generate_experiences(count, seed=42, users=None, keywords=None):
+    """Yield `count` synthetic experience records (bulk_load format), deterministically.
+
+    Args:
+        count (int): Number of experiences
+        seed (int): Random seed; the same seed and count give the same records
+        users (int): Number of distinct authors (default: count // 20, min 10)
+        keywords (list): Keyword vocabulary (default: public/keywords.json)
+
+    Yields:
+        dict: Experience record with keywords, user_rating and photos
+    """
+    rng = random.Random(seed)
+    users = users or max(10, count // 20)
+    vocabulary = list(keywords or load_keywords())
+    rng.shuffle(vocabulary)  # Popularity rank is part of the seed, not the file order
+    keyword_weights = _zipf_weights(len(vocabulary))
+    city_weights = [city[3] for city in CITIES]
+
+    for n in range(count):
+        if rng.random() < SCATTERED_SHARE:
+            latitude, longitude = _offset(rng.uniform(-50, 65), rng.uniform(-180, 180), rng, 50)
+            city = 'the countryside'
+        else:
+            name, lat, lon, _, spread = rng.choices(CITIES, weights=city_weights)[0]
+            latitude, longitude = _offset(lat, lon, rng, spread)
+            city = name
+
+        names = []
+        for keyword in rng.choices(vocabulary, weights=keyword_weights, k=rng.randint(2, 7)):
+            if keyword not in names:
+                names.append(keyword)
+        other = rng.choice(vocabulary)
+
+        experience_date = ANCHOR_DATE - timedelta(days=rng.randint(0, 3 * 365))
+        created = experience_date + timedelta(days=rng.randint(0, 60))
+        description = ' '.join(
+            sentence.format(hours=rng.randint(1, 6), clock=f"{rng.randint(8, 11)} AM",
+                            keyword=rng.choice(names), other=other, city=city)
+            for sentence in rng.sample(SENTENCES, rng.randint(2, 5)))
+
+        rating = None
+        if rng.random() >= UNRATED_SHARE:
+            rating = rng.choices([1, 2, 3, 4, 5], weights=[4, 6, 15, 35, 40])[0]
+
+        yield {
+            'user_id': _user_id(rng, users),
+            'title': rng.choice(TITLE_TEMPLATES).format(
+                adjective=rng.choice(ADJECTIVES), keyword=names[0], city=city),
+            'description': description,
+            'experience_date': experience_date.isoformat(),
+            'create_date': f"{created.isoformat()}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z",
+            'address': f"{rng.randint(1, 999)} Synthetic St, {city}",
+            'latitude': latitude,
+            'longitude': longitude,
+            'keywords': names,
+            'user_rating': rating,
+            'photos': [f"https://example.com/photos/synthetic/{seed}-{n}-{i}.jpg"
+                       for i in range(rng.choices([0, 1, 2, 3, 4], weights=[20, 35, 25, 12, 8])[0])],
+        }
+
+
+def _nearest_city(latitude, longitude):
+    return min(range(len(CITIES)), key=lambda i: (CITIES[i][1] - latitude) ** 2 + (
+        ((CITIES[i][2] - longitude + 180) % 360 - 180) * math.cos(math.radians(latitude))) ** 2)
+
+
+def generate_trips(count, experiences, seed=42, users=None):
+    """Build `count` trips from loaded experiences, each drawn from one city.
+
+    Args:
+        count (int): Number of trips
+        experiences (list): (experience_id, latitude, longitude) rows, ordered by id
+        seed (int): Random seed
+        users (int): Number of distinct trip owners (default: count // 5, min 10)
+
+    Returns:
+        list: Dicts with user_id, title, description, start_date, end_date and
+            experience_ids (in display order)
+    """
+    rng = random.Random(seed + 1)
+    users = users or max(10, count // 5)
+    by_city = {}
+    for experience_id, latitude, longitude in experiences:
+        by_city.setdefault(_nearest_city(latitude, longitude), []).append(experience_id)
+    cities = sorted(by_city)
+    weights = [CITIES[i][3] for i in cities]
+    if not cities:
+        return []
+
+    trips = []
+    for _ in range(count):
+        city = rng.choices(cities, weights=weights)[0]
+        pool = by_city[city]
+        start = ANCHOR_DATE - timedelta(days=rng.randint(0, 2 * 365))
+        trips.append({
+            'user_id': _user_id(rng, users),
+            'title': f"{rng.choice(ADJECTIVES)} {CITIES[city][0]} trip",
+            'description': f"{rng.randint(2, 14)} days around {CITIES[city][0]}.",
+            'start_date': start,
+            'end_date': start + timedelta(days=rng.randint(1, 14)),
+            'experience_ids': rng.sample(pool, min(len(pool), rng.randint(3, 10))),
+        })
+    return trips
+
+
+def insert_trips(conn, trips):
+    """Insert generated trips and their experiences set-wise (with their popularity counters).
+
+    Returns:
+        int: Number of trips inserted
+    """
+    if not trips:
+        return 0
+    with conn.cursor() as cur:
+        cur.execute("SELECT nextval(pg_get_serial_sequence('trips', 'trip_id')) FROM generate_series(1, %s)",
+                    (len(trips),))
+        trip_ids = [row[0] for row in cur.fetchall()]
+        cur.execute("""
+            INSERT INTO trips (trip_id, user_id, title, description, start_date, end_date)
+            SELECT * FROM unnest(%s::int[], %s::text[], %s::text[], %s::text[], %s::date[], %s::date[])
+        """, (trip_ids, [t['user_id'] for t in trips], [t['title'] for t in trips],
+              [t['description'] for t in trips], [t['start_date'] for t in trips],
+              [t['end_date'] for t in trips]))
+
+        link_trips, link_experiences, link_orders = [], [], []
+        for trip_id, trip in zip(trip_ids, trips):
+            for order, experience_id in enumerate(trip['experience_ids']):
+                link_trips.append(trip_id)
+                link_experiences.append(experience_id)
+                link_orders.append(order)
+        cur.execute("""
+            INSERT INTO trip_experiences (trip_id, experience_id, display_order)
+            SELECT * FROM unnest(%s::int[], %s::int[], %s::int[])
+        """, (link_trips, link_experiences, link_orders))
+        record_trip_additions(cur, link_experiences)
+    conn.commit()
+    return len(trips)
+
+
+def load_synthetic(experiences, trips, seed=42, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+                   defer=False):
+    """Generate and load experiences (resumable) and then trips (once per seed)."""
+    source = f"synthetic:seed={seed}:n={experiences}"
+    totals = bulk_load(generate_experiences(experiences, seed), source, batch_size, workers, defer)
+    print(f"✓ Loaded {totals['loaded']:,} synthetic experiences in {totals['seconds']:.1f}s")
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM trips WHERE user_id LIKE %s)",
+                        (SYNTHETIC_USER_PREFIX + '%',))
+            if cur.fetchone()[0]:
+                print("  Synthetic trips already exist; not adding more")
+                return
+            cur.execute("""
+                SELECT experience_id, latitude, longitude
+                FROM experiences
+                WHERE user_id LIKE %s
+                ORDER BY experience_id
+            """, (SYNTHETIC_USER_PREFIX + '%',))
+            rows = cur.fetchall()
+        inserted = insert_trips(conn, generate_trips(trips, rows, seed))
+        print(f"✓ Inserted {inserted:,} synthetic trips")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic experiences and trips.")
+    parser.add_argument('--experiences', type=int, default=10000)
+    parser.add_argument('--trips', type=int, default=None, help="Default: experiences // 20")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help="Write experiences as NDJSON here instead of loading them")
+    parser.add_argument('--load', action='store_true', help="Load into DATABASE_URL (via api.bulk_load)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--defer-indexes', action='store_true')
+    args = parser.parse_args(argv)
+
+    if bool(args.out) == args.load:
+        parser.error("pass exactly one of --out or --load")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            for record in generate_experiences(args.experiences, args.seed):
+                f.write(json.dumps(record) + '\n')
+        print(f"✓ Wrote {args.experiences:,} experiences to {args.out} "
+              f"(trips need experience ids; use --load to create them)")
+        return 0
+
+    trips = args.trips if args.trips is not None else args.experiences // 20
+    try:
+        load_synthetic(args.experiences, trips, args.seed, args.batch_size, args.workers, args.defer_indexes)
+    except Exception as e:
+        print(f"✗ Error loading synthetic data: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
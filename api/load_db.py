@@ -1,9 +1,10 @@
-import os
-import psycopg2
 from dotenv import load_dotenv
 
+from api.bulk_load import bulk_load
+
 load_dotenv()
-DATABASE_URL = os.getenv('DATABASE_URL')
+
+SAMPLE_SOURCE = 'load_db:sample'
 
 def insert_sample_experiences():
     """Insert sample experiences data into the database"""
@@ -187,72 +188,17 @@ def insert_sample_experiences():
         }
     ]
 
-    conn = psycopg2.connect(DATABASE_URL)
+    # COPY-staged and set-based (see api/bulk_load.py); rerunning skips the
+    # already loaded batch instead of inserting duplicates
     try:
-        with conn.cursor() as cur:
-            for exp in experiences:
-                # Insert experience with postGIS data
-                cur.execute("""
-                    INSERT INTO experiences
-                    (user_id, title, description, experience_date, address, latitude, longitude, location)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, ST_Point(%s, %s)::geography)
-                    RETURNING experience_id
-                """, (
-                    exp["user_id"],
-                    exp["title"],
-                    exp["description"],
-                    exp["experience_date"],
-                    exp["address"],
-                    exp["latitude"],
-                    exp["longitude"],
-                    exp["longitude"],
-                    exp["latitude"]
-                ))
-
-                experience_id = cur.fetchone()[0]
-                print(f"✓ Inserted: {exp['title']} (ID: {experience_id})")
-
-                # Insert keywords
-                for keyword_name in exp["keywords"]:
-                    # Insert or get keyword
-                    cur.execute("""
-                        INSERT INTO keywords (name)
-                        VALUES (%s) 
-                        ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name
-                        RETURNING keyword_id
-                    """, (keyword_name,))
-
-                    keyword_id = cur.fetchone()[0]
-
-                    # Link keyword to experience
-                    cur.execute("""
-                        INSERT INTO experience_keywords (experience_id, keyword_id)
-                        VALUES (%s, %s) ON CONFLICT DO NOTHING
-                    """, (experience_id, keyword_id))
-
-                print(f"  → Added {len(exp['keywords'])} keywords")
-
-                # Insert rating
-                if "user_rating" in exp:
-                    cur.execute("""
-                        INSERT INTO experience_ratings (experience_id, user_id, rating)
-                        VALUES (%s, %s, %s)
-                        ON CONFLICT (experience_id, user_id) 
-                        DO UPDATE SET rating = EXCLUDED.rating, updated_at = NOW()
-                    """, (experience_id, exp["user_id"], exp["user_rating"]))
-                    print(f"  → Added rating: {exp['user_rating']}/5")
-
-        conn.commit()
-        print(f"\n{'='*60}")
-        print(f"✓ Successfully inserted {len(experiences)} experiences!")
-        print(f"{'='*60}")
-
+        totals = bulk_load(experiences, SAMPLE_SOURCE, workers=1)
     except Exception as e:
-        conn.rollback()
         print(f"✗ Error inserting experiences: {e}")
         raise
-    finally:
-        conn.close()
+
+    print(f"\n{'='*60}")
+    print(f"✓ Successfully inserted {totals['loaded']} experiences!")
+    print(f"{'='*60}")
 
 
 if __name__ == "__main__":
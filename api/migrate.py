@@ -0,0 +1,251 @@
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+# psycopg2-binary==2.9.11
+import psycopg2
+# python-dotenv==1.0.1
+from dotenv import load_dotenv
+
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# ==============================================================================
+# Schema migrations
+# ==============================================================================
+# Ordered SQL files in api/migrations/ named NNNN_description.sql, applied in
+# one session and recorded in schema_migrations (version, checksum, timing).
+# A pg advisory lock makes concurrent deploys wait for each other instead of
+# racing, and lock_timeout keeps DDL from queueing behind long transactions
+# (and blocking every query queued behind it); rerun the deploy if it trips.
+#
+# A file runs in a single transaction together with its schema_migrations row,
+# unless its first line is "-- migrate: no-transaction": then its statements
+# run one by one in autocommit, which CREATE INDEX CONCURRENTLY requires. Those
+# files must be idempotent (IF NOT EXISTS) since a failure leaves earlier
+# statements applied; an INVALID index left by a failed concurrent build is
+# dropped and rebuilt on the next run.
+#
+# Usage:
+#     python -m api.migrate            (apply pending migrations)
+#     python -m api.migrate --status
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+MIGRATION_LOCK_TIMEOUT = os.getenv('MIGRATION_LOCK_TIMEOUT', '5s')
+_MIGRATION_LOCK_KEY = 0x6d6967726174  # pg advisory lock: one migrator at a time
+_NO_TRANSACTION = '-- migrate: no-transaction'
+_FILENAME_RE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+_DOLLAR_TAG_RE = re.compile(r'\$(?:[A-Za-z_]\w*)?\$')
+_CONCURRENT_INDEX_RE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w."]+)', re.IGNORECASE)
+
+Migration = namedtuple('Migration', ['version', 'name', 'sql', 'checksum', 'transactional'])
+
+
+class MigrationError(Exception):
+    """A migration file is malformed, or an applied one was edited afterwards."""
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Read the migration files in version order.
+
+    Raises:
+        MigrationError: On a misnamed .sql file or a duplicate version
+    """
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.sql'):
+            continue
+        match = _FILENAME_RE.match(filename)
+        if not match:
+            raise MigrationError(f"{filename}: migration files are named NNNN_description.sql")
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"{filename}: version {version} is used twice")
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            sql = f.read()
+        migrations[version] = Migration(
+            version, match.group(2), sql, hashlib.sha256(sql.encode('utf-8')).hexdigest(),
+            not sql.lstrip().startswith(_NO_TRANSACTION))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(sql):
+    """Split SQL on top-level semicolons (outside quotes, dollar quotes and comments)."""
+    statements = []
+    start = i = 0
+    quote = None
+    while i < len(sql):
+        if quote:
+            if sql.startswith(quote, i):
+                i += len(quote)
+                quote = None
+            else:
+                i += 1
+        elif sql.startswith('--', i):
+            newline = sql.find('\n', i)
+            i = len(sql) if newline == -1 else newline
+        elif sql[i] in '\'"':
+            quote = sql[i]
+            i += 1
+        elif sql[i] == '$' and _DOLLAR_TAG_RE.match(sql, i):
+            quote = _DOLLAR_TAG_RE.match(sql, i).group(0)
+            i += len(quote)
+        elif sql[i] == ';':
+            statements.append(sql[start:i])
+            i += 1
+            start = i
+        else:
+            i += 1
+    statements.append(sql[start:])
+    # Drop comment-only fragments
+    return [statement.strip() for statement in statements
+            if any(line.strip() and not line.strip().startswith('--') for line in statement.splitlines())]
+
+
+def _ensure_tracking_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version integer PRIMARY KEY,
+            name text NOT NULL,
+            checksum text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT NOW(),
+            duration_ms integer NOT NULL
+        )
+    """)
+
+
+def applied_migrations(cur):
+    """Return {version: (name, checksum, applied_at)} of recorded migrations."""
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row[0]: row[1:] for row in cur.fetchall()}
+
+
+def _drop_invalid_index(cur, name):
+    """Drop an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY."""
+    cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    if row and not row[0]:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def apply_migration(conn, migration):
+    """Apply one migration and record it. The connection must be in autocommit mode.
+
+    Returns:
+        int: Duration in milliseconds
+    """
+    started = time.monotonic()
+    with conn.cursor() as cur:
+        if migration.transactional:
+            cur.execute("BEGIN")
+            try:
+                cur.execute(migration.sql)
+                duration_ms = int((time.monotonic() - started) * 1000)
+                cur.execute("""
+                    INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                    VALUES (%s, %s, %s, %s)
+                """, (migration.version, migration.name, migration.checksum, duration_ms))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            return duration_ms
+
+        for statement in split_statements(migration.sql):
+            index = _CONCURRENT_INDEX_RE.search(statement)
+            if index:
+                _drop_invalid_index(cur, index.group(1))
+            cur.execute(statement)
+        duration_ms = int((time.monotonic() - started) * 1000)
+        cur.execute("""
+            INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+            VALUES (%s, %s, %s, %s)
+        """, (migration.version, migration.name, migration.checksum, duration_ms))
+        return duration_ms
+
+
+def migrate(dsn=None, target=None, directory=MIGRATIONS_DIR):
+    """Apply pending migrations up to `target` (default: all) in one session.
+
+    Returns:
+        list: Migrations applied by this call
+
+    Raises:
+        MigrationError: If an applied migration's file has changed since
+    """
+    migrations = load_migrations(directory)
+    conn = psycopg2.connect(dsn or DATABASE_URL)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            # Wait as long as it takes for another migrator, but not for table locks
+            cur.execute("SELECT pg_advisory_lock(%s)", (_MIGRATION_LOCK_KEY,))
+            cur.execute("SET lock_timeout = %s", (MIGRATION_LOCK_TIMEOUT,))
+            _ensure_tracking_table(cur)
+            applied = applied_migrations(cur)
+
+        done = []
+        for migration in migrations:
+            if target is not None and migration.version > target:
+                break
+            if migration.version in applied:
+                if applied[migration.version][1] != migration.checksum:
+                    raise MigrationError(f"{migration.version:04d}_{migration.name} was edited after it was "
+                                         f"applied; add a new migration instead")
+                continue
+            duration_ms = apply_migration(conn, migration)
+            print(f"✓ Applied {migration.version:04d}_{migration.name} ({duration_ms} ms)")
+            done.append(migration)
+        return done
+    finally:
+        if not conn.closed:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_MIGRATION_LOCK_KEY,))
+        conn.close()
+
+
+def print_status(dsn=None, directory=MIGRATIONS_DIR):
+    conn = psycopg2.connect(dsn or DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+            applied = applied_migrations(cur) if cur.fetchone()[0] else {}
+        conn.rollback()
+    finally:
+        conn.close()
+
+    for migration in load_migrations(directory):
+        record = applied.get(migration.version)
+        if record is None:
+            state = "pending"
+        elif record[1] != migration.checksum:
+            state = f"applied {record[2]:%Y-%m-%d %H:%M} (✗ file changed since)"
+        else:
+            state = f"applied {record[2]:%Y-%m-%d %H:%M}"
+        print(f"{migration.version:04d}_{migration.name:40} {state}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply database schema migrations.")
+    parser.add_argument('--status', action='store_true', help="List migrations and whether they are applied")
+    parser.add_argument('--target', type=int, help="Apply migrations up to this version only")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        print_status()
+        return 0
+    try:
+        applied = migrate(target=args.target)
+    except (MigrationError, psycopg2.Error) as e:
+        print(f"✗ Migration failed: {e}")
+        return 1
+    print(f"✓ Schema up to date ({len(applied)} migrations applied)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+-- Baseline schema, as created by api/init_db.py before migrations existed.
+-- Every statement is idempotent (IF NOT EXISTS), so those databases adopt it
+-- as-is; later changes are separate migrations.
+
+-- trips table
+CREATE TABLE IF NOT EXISTS trips (
+    "trip_id" integer PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    "user_id" text NOT NULL,
+    "title" text NOT NULL,
+    "description" text NOT NULL,
+    "start_date" date,
+    "end_date" date,
+    "create_date" timestamptz NOT NULL DEFAULT NOW()
+);
+
+
+-- experiences table with last_updated timestamp
+CREATE TABLE IF NOT EXISTS experiences (
+    "experience_id" integer PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    "user_id" text NOT NULL,
+    "title" text NOT NULL,
+    "description" text NOT NULL,
+    "experience_date" date NOT NULL,
+    "create_date" timestamptz NOT NULL DEFAULT NOW(),
+    "last_updated" timestamptz,
+    "address" text NOT NULL,
+    "latitude" double precision NOT NULL,
+    "longitude" double precision NOT NULL,
+    "location" GEOGRAPHY(POINT, 4326) NOT NULL
+);
+
+-- GIST spatial index on location column
+CREATE INDEX IF NOT EXISTS idx_experiences_location
+    ON experiences
+    USING GIST (location);
+
+-- Index on user_id for faster user-specific queries
+CREATE INDEX IF NOT EXISTS idx_experiences_user_id
+    ON experiences (user_id);
+
+-- Index on experience_date for date-based sorting/filtering
+CREATE INDEX IF NOT EXISTS idx_experiences_date
+    ON experiences (experience_date DESC);
+
+
+-- keywords table
+CREATE TABLE IF NOT EXISTS keywords (
+    "keyword_id" integer PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    "name" text UNIQUE NOT NULL
+);
+
+
+-- experience_keywords junction table
+CREATE TABLE IF NOT EXISTS experience_keywords (
+    "experience_id" integer NOT NULL REFERENCES experiences(experience_id) ON DELETE CASCADE,
+    "keyword_id" integer NOT NULL REFERENCES keywords(keyword_id) ON DELETE CASCADE,
+    PRIMARY KEY (experience_id, keyword_id)
+);
+
+
+-- experience_ratings table
+CREATE TABLE IF NOT EXISTS experience_ratings (
+    "experience_id" integer NOT NULL REFERENCES experiences(experience_id) ON DELETE CASCADE,
+    "user_id" text NOT NULL,
+    "rating" smallint NOT NULL CHECK (rating BETWEEN 1 AND 5),
+    "created_at" timestamptz NOT NULL DEFAULT NOW(),
+    "updated_at" timestamptz NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (experience_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_experience_ratings_experience
+    ON experience_ratings (experience_id);
+
+
+-- experience_photos table
+CREATE TABLE IF NOT EXISTS experience_photos (
+    photo_id integer PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    experience_id integer NOT NULL REFERENCES experiences(experience_id) ON DELETE CASCADE,
+    photo_url text NOT NULL,
+    caption text DEFAULT '',
+    upload_date timestamptz NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_experience_photos
+    ON experience_photos(experience_id);
+
+
+-- trip_experiences junction table
+CREATE TABLE IF NOT EXISTS trip_experiences (
+    "trip_id" integer NOT NULL REFERENCES trips(trip_id) ON DELETE CASCADE,
+    "experience_id" integer NOT NULL REFERENCES experiences(experience_id) ON DELETE CASCADE,
+    "added_date" timestamptz NOT NULL DEFAULT NOW(),
+    "display_order" integer,
+    PRIMARY KEY (trip_id, experience_id)
+);
+
+-- Indexes for efficient queries
+CREATE INDEX IF NOT EXISTS trip_experiences_trip_idx
+    ON trip_experiences ("trip_id");
+
+CREATE INDEX IF NOT EXISTS trip_experiences_experience_idx
+    ON trip_experiences ("experience_id");
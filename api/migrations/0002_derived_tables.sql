@@ -0,0 +1,160 @@
+-- New tables (search documents, rating/popularity aggregates, photo storage
+-- bookkeeping, bulk load state) and new columns on existing tables. New
+-- tables are empty, so their indexes are built here; indexes on existing
+-- tables are built CONCURRENTLY in 0003.
+--
+-- Backfills of the derived tables for existing rows:
+--     python -m api.py_fts          (experience_search)
+--     python -m api.py_ratings      (experience_rating_stats)
+--     python -m api.py_popularity   (experience_popularity trend scores)
+--     python -m api.py_photos       (experience_photos renditions)
+
+-- Extensions the schema depends on (pg_trgm for autocomplete indexes)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+
+-- experience_search table (weighted full-text document per experience)
+CREATE TABLE IF NOT EXISTS experience_search (
+    "experience_id" integer PRIMARY KEY REFERENCES experiences(experience_id) ON DELETE CASCADE,
+    "search_vector" tsvector NOT NULL
+);
+
+-- GIN index for @@ full-text matching
+CREATE INDEX IF NOT EXISTS idx_experience_search_vector
+    ON experience_search
+    USING GIN (search_vector);
+
+
+-- experience_rating_stats table (per-experience rating aggregates)
+CREATE TABLE IF NOT EXISTS experience_rating_stats (
+    "experience_id" integer PRIMARY KEY REFERENCES experiences(experience_id) ON DELETE CASCADE,
+    "rating_sum" bigint NOT NULL DEFAULT 0,
+    "rating_count" integer NOT NULL DEFAULT 0,
+    "count_1" integer NOT NULL DEFAULT 0,
+    "count_2" integer NOT NULL DEFAULT 0,
+    "count_3" integer NOT NULL DEFAULT 0,
+    "count_4" integer NOT NULL DEFAULT 0,
+    "count_5" integer NOT NULL DEFAULT 0,
+    "average_rating" numeric(3, 2) GENERATED ALWAYS AS (
+        CASE WHEN rating_count > 0
+             THEN ROUND(rating_sum::numeric / rating_count, 2)
+             ELSE 0 END
+    ) STORED,
+    "updated_at" timestamptz NOT NULL DEFAULT NOW()
+);
+
+
+-- experience_popularity table (trip_count and trend score, see api/py_popularity.py)
+CREATE TABLE IF NOT EXISTS experience_popularity (
+    "experience_id" integer PRIMARY KEY REFERENCES experiences(experience_id) ON DELETE CASCADE,
+    "trip_count" integer NOT NULL DEFAULT 0,
+    "trend_log" double precision
+);
+
+-- Top-N by popularity (/top_experiences) as an index scan
+CREATE INDEX IF NOT EXISTS idx_experience_popularity_trip_count
+    ON experience_popularity (trip_count DESC);
+
+-- Trending (decayed score) as an index scan
+CREATE INDEX IF NOT EXISTS idx_experience_popularity_trend
+    ON experience_popularity (trend_log DESC NULLS LAST);
+
+INSERT INTO experience_popularity (experience_id, trip_count)
+SELECT experience_id, COUNT(*)
+FROM trip_experiences
+GROUP BY experience_id
+ON CONFLICT (experience_id) DO NOTHING;
+
+
+-- Number of experiences using each keyword, maintained by link_keywords (autocomplete
+-- ranking). Adding a column with a constant default does not rewrite the table.
+ALTER TABLE keywords
+    ADD COLUMN IF NOT EXISTS "usage_count" integer NOT NULL DEFAULT 0;
+
+UPDATE keywords k
+SET usage_count = uses.usage_count
+FROM (
+    SELECT keyword_id, COUNT(*) AS usage_count
+    FROM experience_keywords
+    GROUP BY keyword_id
+) uses
+WHERE k.keyword_id = uses.keyword_id
+  AND k.usage_count <> uses.usage_count;
+
+
+-- photo_blobs table (content-addressed photo files, reference counted)
+CREATE TABLE IF NOT EXISTS photo_blobs (
+    content_hash text PRIMARY KEY,
+    object_path text NOT NULL,
+    photo_url text NOT NULL,
+    thumbnail_url text,
+    medium_url text,
+    content_type text,
+    ref_count integer NOT NULL DEFAULT 0,
+    released_at timestamptz,
+    created_at timestamptz NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_photo_blobs_released
+    ON photo_blobs(released_at)
+    WHERE ref_count = 0;
+
+-- Photo renditions and blob dedup
+ALTER TABLE experience_photos
+    ADD COLUMN IF NOT EXISTS thumbnail_url text,
+    ADD COLUMN IF NOT EXISTS medium_url text,
+    ADD COLUMN IF NOT EXISTS content_hash text REFERENCES photo_blobs(content_hash);
+
+
+-- photo_uploads table (status of background photo uploads)
+CREATE TABLE IF NOT EXISTS photo_uploads (
+    upload_id integer PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    experience_id integer NOT NULL REFERENCES experiences(experience_id) ON DELETE CASCADE,
+    filename text NOT NULL,
+    content_type text,
+    caption text DEFAULT '',
+    status text NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'uploading', 'done', 'failed')),
+    photo_id integer REFERENCES experience_photos(photo_id) ON DELETE SET NULL,
+    photo_url text,
+    object_path text,
+    error text,
+    created_at timestamptz NOT NULL DEFAULT NOW(),
+    updated_at timestamptz NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_photo_uploads_experience
+    ON photo_uploads(experience_id);
+
+
+-- storage_deletions table (outbox of bucket objects to delete)
+CREATE TABLE IF NOT EXISTS storage_deletions (
+    deletion_id integer PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+    object_path text NOT NULL UNIQUE,
+    attempts integer NOT NULL DEFAULT 0,
+    last_error text,
+    created_at timestamptz NOT NULL DEFAULT NOW(),
+    next_attempt_at timestamptz NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_storage_deletions_due
+    ON storage_deletions(next_attempt_at);
+
+
+-- bulk_load_runs/bulk_load_batches (resume state of api.bulk_load)
+CREATE TABLE IF NOT EXISTS bulk_load_runs (
+    source text PRIMARY KEY,
+    batch_size integer NOT NULL,
+    deferred_indexes jsonb,
+    started_at timestamptz NOT NULL DEFAULT NOW(),
+    finished_at timestamptz
+);
+
+CREATE TABLE IF NOT EXISTS bulk_load_batches (
+    source text NOT NULL REFERENCES bulk_load_runs(source) ON DELETE CASCADE,
+    batch_no integer NOT NULL,
+    row_count integer NOT NULL,
+    rejected_count integer NOT NULL DEFAULT 0,
+    loaded_at timestamptz NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (source, batch_no)
+);
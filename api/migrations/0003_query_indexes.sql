@@ -0,0 +1,47 @@
+-- migrate: no-transaction
+-- Indexes on existing tables for viewport, pagination, autocomplete and photo
+-- dedup queries, built CONCURRENTLY so deploys do not block writes.
+
+-- Composite index backing keyset pagination of a user's trips (newest first)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_trips_user_create_date
+    ON trips (user_id, create_date DESC, trip_id DESC);
+
+-- GIST index on the planar geometry view of location, used by
+-- map viewport (envelope &&) and vector tile queries
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_experiences_location_geom
+    ON experiences
+    USING GIST ((location::geometry));
+
+-- Composite indexes backing keyset pagination of listings (newest first)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_experiences_create_date
+    ON experiences (create_date DESC, experience_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_experiences_user_create_date
+    ON experiences (user_id, create_date DESC, experience_id DESC);
+
+-- Autocomplete on titles: prefix (text_pattern_ops) and infix (trigram)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_experiences_title_prefix
+    ON experiences (lower(title) text_pattern_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_experiences_title_trgm
+    ON experiences
+    USING GIN (lower(title) gin_trgm_ops);
+
+-- Autocomplete on keyword names: prefix (text_pattern_ops) and infix (trigram)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_keywords_name_prefix
+    ON keywords (lower(name) text_pattern_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_keywords_name_trgm
+    ON keywords
+    USING GIN (lower(name) gin_trgm_ops);
+
+-- Most-used keywords first: short autocomplete prefixes walk this index and
+-- stop after CANDIDATE_LIMIT matches instead of sorting every match
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_keywords_usage
+    ON keywords (usage_count DESC)
+    WHERE usage_count > 0;
+
+-- Photos sharing a blob (dedup reference counting)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_experience_photos_content_hash
+    ON experience_photos(content_hash)
+    WHERE content_hash IS NOT NULL;
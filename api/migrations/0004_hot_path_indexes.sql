@@ -0,0 +1,18 @@
+-- migrate: no-transaction
+-- Indexes for hot joins, built CONCURRENTLY so deploys do not block writes.
+-- trips (user_id, create_date) and experiences (create_date) are already
+-- covered by idx_trips_user_create_date and idx_experiences_create_date.
+
+-- Keyword -> experiences lookups and ON DELETE CASCADE from keywords; the
+-- primary key leads with experience_id, so it cannot serve them
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_experience_keywords_keyword
+    ON experience_keywords (keyword_id, experience_id);
+
+-- A user's ratings (the primary key leads with experience_id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_experience_ratings_user
+    ON experience_ratings (user_id);
+
+-- Case-insensitive keyword matching and ORDER BY lower(name) in the column
+-- collation (idx_keywords_name_prefix uses text_pattern_ops ordering)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_keywords_name_lower
+    ON keywords (lower(name));
@@ -0,0 +1,360 @@
+import os
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+from api.py_events import subscribe
+
+# ==============================================================================
+# Autocomplete (search suggestions)
+# ==============================================================================
+# Suggestions come from keyword names and experience titles. Prefix matches use
+# the lower(...) text_pattern_ops indexes; word-start infix matches (the query
+# starting a later word) use the pg_trgm GIN indexes (see api/migrations/).
+# Keywords no experience uses are not suggested. Each source contributes a
+# bounded number of candidates, taken most popular first (keywords by their
+# maintained usage_count, titles by rating count), so a keystroke costs the
+# same no matter how large the catalog is and a popular match is never cut by
+# the limit.
+
+MIN_QUERY_LENGTH = 2
+MIN_INFIX_LENGTH = 3  # Trigram indexes need at least one full trigram
+CANDIDATE_LIMIT = 50  # Candidates taken per source and match type
+
+# In-memory index (see SuggestionTrie below)
+AUTOCOMPLETE_IN_MEMORY = os.getenv('AUTOCOMPLETE_IN_MEMORY', '1') != '0'
+AUTOCOMPLETE_REBUILD_INTERVAL = float(os.getenv('AUTOCOMPLETE_REBUILD_INTERVAL', '900'))  # Seconds between full reloads
+TRIE_TOP_K = 32  # Suggestions cached per trie node (>= the endpoint's max limit)
+
+
+def escape_like(value):
+    """Escape LIKE/ILIKE wildcards so user input matches literally."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def normalize_query(query):
+    """Normalize a raw suggestion query (trimmed, lower-case)."""
+    return ' '.join(query.split()).lower()
+
+
+def _candidates_sql(source, id_column, text_column, popularity_sql, infix, condition="TRUE"):
+    """Most popular prefix candidates, plus word-start infix candidates when the query is long enough.
+
+    match_rank is 0 for prefix matches and 1 for infix-only matches.
+    """
+    sql = f"""
+        (SELECT {id_column} AS id, {text_column} AS suggestion, 0 AS match_rank,
+                {popularity_sql} AS popularity
+         FROM {source}
+         WHERE lower({text_column}) LIKE %(prefix)s AND {condition}
+         ORDER BY {popularity_sql} DESC
+         LIMIT %(candidates)s)
+    """
+    if infix:
+        sql += f"""
+        UNION ALL
+        (SELECT {id_column}, {text_column}, 1, {popularity_sql}
+         FROM {source}
+         WHERE lower({text_column}) LIKE %(infix)s
+           AND lower({text_column}) NOT LIKE %(prefix)s
+           AND {condition}
+         ORDER BY {popularity_sql} DESC
+         LIMIT %(candidates)s)
+        """
+    return sql
+
+
+def suggest_from_db(conn, query, limit):
+    """Rank keyword and title suggestions for a partial query.
+
+    Prefix matches rank ahead of word-start infix matches; within each group
+    keywords are ranked by how many experiences use them and titles by how
+    many ratings the experience has. Same results as SuggestionTrie.suggest.
+
+    Args:
+        conn: Open database connection
+        query (str): Partial query (at least MIN_QUERY_LENGTH characters)
+        limit (int): Maximum number of suggestions
+
+    Returns:
+        list[str]: Suggestions, best first
+    """
+    term = escape_like(normalize_query(query))
+    infix = len(term) >= MIN_INFIX_LENGTH
+    params = {
+        'prefix': f'{term}%',
+        'infix': f'% {term}%',
+        'candidates': CANDIDATE_LIMIT,
+        'limit': limit,
+    }
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(f"""
+            WITH ranked AS (
+                {_candidates_sql('keywords k', 'k.keyword_id', 'k.name', 'k.usage_count', infix,
+                                 condition='k.usage_count > 0')}
+
+                UNION ALL
+
+                {_candidates_sql("experiences e LEFT JOIN experience_rating_stats rs "
+                                 "ON rs.experience_id = e.experience_id",
+                                 'e.experience_id', 'e.title', 'COALESCE(rs.rating_count, 0)', infix)}
+            )
+            SELECT suggestion
+            FROM ranked
+            GROUP BY suggestion
+            ORDER BY MIN(match_rank), MAX(popularity) DESC, suggestion
+            LIMIT %(limit)s
+        """, params)
+        return [row['suggestion'] for row in cur.fetchall()]
+
+
+# ==============================================================================
+# In-memory suggestion index
+# ==============================================================================
+# Every suggestion is stored under its full normalized text (a prefix match)
+# and under each later word ("hike the mountains" -> "the mountains",
+# "mountains"), which gives word-start infix matches. Each trie node caches the
+# TRIE_TOP_K best suggestions of its subtree, so a lookup is a walk down
+# len(query) nodes with no sorting or database access.
+#
+# Matching and popularity mirror suggest_from_db: keyword usage count plus
+# title rating count. refs counts what keeps a suggestion alive (experiences
+# using the keyword / having the title), so unused keywords drop out as they
+# do in SQL.
+
+class _TrieNode:
+    __slots__ = ('children', 'items', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.items = set()  # (match_rank, suggestion) tuples ending here
+        self.top = []  # Best items in this subtree, best first
+
+
+class SuggestionTrie:
+    """Prefix trie of keyword names and titles with per-node top-K lists."""
+
+    def __init__(self, top_k=TRIE_TOP_K):
+        self._top_k = top_k
+        self._root = _TrieNode()
+        self._popularity = {}
+        self._refs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(suggestion):
+        words = normalize_query(suggestion).split(' ')
+        yield 0, ' '.join(words)
+        for i in range(1, len(words)):
+            yield 1, ' '.join(words[i:])
+
+    def _rank(self, item):
+        match_rank, suggestion = item
+        return match_rank, -self._popularity.get(suggestion, 0), suggestion
+
+    def _recompute(self, node):
+        candidates = list(node.items)
+        for child in node.children.values():
+            candidates.extend(child.top)
+        node.top = sorted(candidates, key=self._rank)[:self._top_k]
+
+    def _refresh_path(self, key):
+        """Recompute top-K lists bottom-up along key, pruning empty nodes."""
+        path = [self._root]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                break
+            path.append(node)
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if depth and not node.items and not node.children:
+                del path[depth - 1].children[key[depth - 1]]
+                continue
+            self._recompute(node)
+
+    def _node(self, key):
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        return node
+
+    def _find(self, key):
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _apply(self, suggestion, ref_delta, popularity_delta):
+        if not suggestion or not suggestion.strip():
+            return False
+        was_present = self._refs.get(suggestion, 0) > 0
+        refs = self._refs.get(suggestion, 0) + ref_delta
+        if refs > 0:
+            self._refs[suggestion] = refs
+            self._popularity[suggestion] = max(0, self._popularity.get(suggestion, 0) + popularity_delta)
+        else:
+            self._refs.pop(suggestion, None)
+            self._popularity.pop(suggestion, None)
+
+        for match_rank, key in self._keys(suggestion):
+            if refs > 0 and not was_present:
+                self._node(key).items.add((match_rank, suggestion))
+            elif refs <= 0 and was_present:
+                node = self._find(key)
+                if node is not None:
+                    node.items.discard((match_rank, suggestion))
+        return True
+
+    def update(self, suggestion, ref_delta=1, popularity_delta=0):
+        """Adjust one suggestion and refresh the affected top-K lists."""
+        with self._lock:
+            if self._apply(suggestion, ref_delta, popularity_delta):
+                for _, key in self._keys(suggestion):
+                    self._refresh_path(key)
+
+    def bulk_load(self, rows):
+        """Load (suggestion, refs, popularity) rows, then compute every top-K once."""
+        with self._lock:
+            for suggestion, refs, popularity in rows:
+                self._apply(suggestion, refs, popularity)
+
+            # Post-order pass so children are final before their parent
+            stack = [(self._root, False)]
+            while stack:
+                node, children_done = stack.pop()
+                if children_done:
+                    self._recompute(node)
+                else:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in node.children.values())
+
+    def suggest(self, query, limit):
+        """Return up to limit suggestions for a partial query, best first."""
+        key = normalize_query(query)
+        allow_infix = len(key) >= MIN_INFIX_LENGTH
+        with self._lock:
+            node = self._find(key)
+            top = list(node.top) if node is not None else []
+
+        suggestions = []
+        seen = set()
+        for match_rank, suggestion in top:
+            if (match_rank and not allow_infix) or suggestion in seen:
+                continue
+            seen.add(suggestion)
+            suggestions.append(suggestion)
+            if len(suggestions) == limit:
+                break
+        return suggestions
+
+    def __len__(self):
+        return len(self._refs)
+
+
+def build_suggestion_trie(conn):
+    """Build a SuggestionTrie of the keywords in use and the experience titles."""
+    rows = []
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT k.name, COUNT(*), COUNT(*)
+            FROM keywords k
+                JOIN experience_keywords ek ON ek.keyword_id = k.keyword_id
+            GROUP BY k.name
+        """)
+        rows.extend(cur.fetchall())
+        cur.execute("""
+            SELECT e.title, COUNT(*), COALESCE(SUM(rs.rating_count), 0)
+            FROM experiences e
+                LEFT JOIN experience_rating_stats rs ON rs.experience_id = e.experience_id
+            GROUP BY e.title
+        """)
+        rows.extend(cur.fetchall())
+    conn.rollback()
+
+    trie = SuggestionTrie()
+    trie.bulk_load(rows)
+    return trie
+
+
+_trie = None
+_loader_started = False
+_loader_lock = threading.Lock()
+
+
+def get_suggestion_trie():
+    """The loaded in-memory index, or None while it is still loading / disabled."""
+    return _trie
+
+
+def _reload_forever():
+    global _trie
+    from api.py_db import pooled_connection
+
+    while True:
+        started = time.monotonic()
+        try:
+            with pooled_connection() as conn:
+                trie = build_suggestion_trie(conn)
+            _trie = trie
+            print(f"Autocomplete: loaded {len(trie)} suggestions in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            print(f"Autocomplete: index load failed: {e}")
+        time.sleep(AUTOCOMPLETE_REBUILD_INTERVAL)
+
+
+def start_suggestion_loader():
+    """Load the index in a background thread and reload it periodically.
+
+    Periodic reloads pick up changes that are not applied incrementally
+    (deletes, new ratings) and writes made by other processes.
+    """
+    global _loader_started
+    with _loader_lock:
+        if _loader_started or not AUTOCOMPLETE_IN_MEMORY:
+            return
+        _loader_started = True
+    threading.Thread(target=_reload_forever, name='autocomplete-loader', daemon=True).start()
+
+
+def record_suggestion_changes(added_keywords=(), removed_keywords=(), old_title=None, new_title=None):
+    """Apply a committed experience write to the in-memory index (if loaded)."""
+    trie = _trie
+    if trie is None:
+        return
+    for name in added_keywords:
+        trie.update(name, ref_delta=1, popularity_delta=1)
+    for name in removed_keywords:
+        trie.update(name, ref_delta=-1, popularity_delta=-1)
+    if old_title != new_title:
+        if old_title:
+            trie.update(old_title, ref_delta=-1)
+        if new_title:
+            trie.update(new_title, ref_delta=1)
+
+
+def _on_experience_change(event):
+    # Writes attach their keyword/title diff as event["suggestions"]
+    changes = event.get('suggestions')
+    if changes:
+        record_suggestion_changes(**changes)
+
+
+subscribe('experience', _on_experience_change)
+
+
+def suggest(conn_factory, query, limit):
+    """Serve suggestions from memory, falling back to SQL until the index is loaded.
+
+    Args:
+        conn_factory: Zero-argument callable returning a connection (only
+            called on the SQL fallback)
+    """
+    trie = _trie
+    if trie is not None:
+        return trie.suggest(query, limit)
+    return suggest_from_db(conn_factory(), query, limit)
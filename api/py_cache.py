@@ -0,0 +1,360 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+# Flask==3.1.0
+from flask import make_response, request
+
+from api.py_events import on_resync, subscribe
+
+# ==============================================================================
+# Response cache
+# ==============================================================================
+# Read-through cache for JSON responses. Keys are built from the normalized
+# query parameters plus a generation number; write paths bump the generation
+# (bump_generation) so entries computed before the write are never served
+# again and simply age out.
+#
+# Per-entity responses (cached_entity_json) carry a generation per row, e.g.
+# "experience:12", bumped by evict() when a change event for that row arrives
+# from any worker (see api/py_events.py).
+#
+# CACHE_BACKEND=local (default) keeps entries in this process (LRU + TTL +
+# byte bound). CACHE_BACKEND=redis shares entries and generations across
+# workers via REDIS_URL (requires the optional `redis` package). "none"
+# disables caching.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '300'))  # Seconds
+ENTITY_CACHE_TTL = float(os.getenv('ENTITY_CACHE_TTL', '300'))  # Seconds
+
+# Generation namespace bumped by every experience/rating write
+EXPERIENCES_GENERATION = 'experiences'
+
+
+class LocalCacheBackend:
+    """In-process LRU cache with per-entry TTL and a total size bound (bytes)."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        # namespace -> generation, least recently used first. Bounded like the
+        # entries; a pruned namespace reads as _generation_floor, which is at
+        # least every pruned value, so generations never move backwards
+        self._generations = OrderedDict()
+        self._generation_floor = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _entry_size(key, value):
+        return len(key) + len(value)
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._size -= self._entry_size(key, value)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        size = self._entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_generation(self, namespace):
+        with self._lock:
+            generation = self._generations.get(namespace)
+            if generation is None:
+                return self._generation_floor
+            self._generations.move_to_end(namespace)
+            return generation
+
+    def bump_generation(self, namespace):
+        with self._lock:
+            generation = self._generations.pop(namespace, self._generation_floor) + 1
+            self._generations[namespace] = generation
+            while len(self._generations) > self.max_entries:
+                _, pruned = self._generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, pruned)
+            return generation
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'local',
+                'entries': len(self._entries),
+                'generations': len(self._generations),
+                'bytes': self._size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class RedisCacheBackend:
+    """Shared cache in Redis; eviction is left to the server's maxmemory policy."""
+
+    def __init__(self, url=REDIS_URL, prefix='travelplanner:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from e
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        return self._client.get(self._prefix + key)
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self._client.delete(self._prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self._prefix + '*'):
+            self._client.delete(key)
+
+    def get_generation(self, namespace):
+        return int(self._client.get(f'{self._prefix}gen:{namespace}') or 0)
+
+    def bump_generation(self, namespace):
+        return self._client.incr(f'{self._prefix}gen:{namespace}')
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache backend (None when caching is disabled)."""
+    global _cache
+    if CACHE_BACKEND == 'none':
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RedisCacheBackend() if CACHE_BACKEND == 'redis' else LocalCacheBackend()
+    return _cache
+
+
+def bump_generation(namespace=EXPERIENCES_GENERATION):
+    """Invalidate every cached response that depends on namespace."""
+    cache = get_cache()
+    if cache is None:
+        return
+    try:
+        cache.bump_generation(namespace)
+    except Exception as e:
+        # A failed bump must not fail the write; fall back to dropping everything
+        print(f"Cache generation bump failed: {e}")
+        try:
+            cache.clear()
+        except Exception:
+            pass
+
+
+# Parameters the views parse with float(); "34.0" and "34" share an entry
+FLOAT_PARAMS = {'lat', 'lon', 'radius'}
+# Free-text parameters matched case-insensitively; "Hiking  trails" and
+# "hiking trails" share an entry
+TEXT_PARAMS = {'q'}
+
+
+def _normalize_param(name, value):
+    if name in FLOAT_PARAMS:
+        try:
+            return repr(float(value))
+        except ValueError:
+            return value
+    if name == 'cursor':
+        return value
+    if name in TEXT_PARAMS:
+        return ' '.join(value.split()).lower()
+    return value.strip()
+
+
+def cache_key(prefix, params, generation):
+    """Build a cache key from a route prefix, its parameters and a generation."""
+    normalized = {name: _normalize_param(name, value)
+                  for name, value in params.items() if value is not None and value.strip()}
+    digest = hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    return f'{prefix}:g{generation}:{digest}'
+
+
+def _serve(cache, key, ttl, view, args, kwargs):
+    """Return the cached body for key, or call the view and cache a 200 response."""
+    try:
+        body = cache.get(key)
+    except Exception as e:
+        print(f"Cache read failed: {e}")
+        return view(*args, **kwargs)
+
+    if body is not None:
+        response = make_response(body)
+        response.mimetype = 'application/json'
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    response = make_response(view(*args, **kwargs))
+    if response.status_code == 200:
+        try:
+            cache.set(key, response.get_data(), ttl)
+        except Exception as e:
+            print(f"Cache write failed: {e}")
+    response.headers['X-Cache'] = 'MISS'
+    return response
+
+
+def cached_json(prefix, params, ttl=SEARCH_CACHE_TTL, namespace=EXPERIENCES_GENERATION):
+    """Cache a view's successful (200) JSON response.
+
+    Only the listed query parameters take part in the key, so unrelated
+    parameters (cache busters, tracking tags) do not fragment the cache.
+
+    Args:
+        prefix (str): Key prefix, unique per route
+        params (list[str]): Query parameter names that affect the response
+        ttl (float): Seconds an entry may be served
+        namespace (str): Generation namespace that invalidates the entries
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return view(*args, **kwargs)
+            try:
+                generation = cache.get_generation(namespace)
+            except Exception as e:
+                print(f"Cache read failed: {e}")
+                return view(*args, **kwargs)
+            key = cache_key(prefix, {name: request.args.get(name) for name in params}, generation)
+            return _serve(cache, key, ttl, view, args, kwargs)
+        return wrapper
+    return decorator
+
+
+# entity -> key prefixes of routes caching that entity (for evict())
+_entity_prefixes = defaultdict(set)
+
+
+def _entity_key(prefix, entity_id, generation, variant=''):
+    return f'{prefix}:{entity_id}:g{generation}{variant}'
+
+
+def cached_entity_json(prefix, entity, id_arg, ttl=ENTITY_CACHE_TTL, params=()):
+    """Cache a single-row view (e.g. /details/<id>) until that row changes.
+
+    Args:
+        prefix (str): Key prefix, unique per route
+        entity (str): Entity name used by change events ("experience", "trip")
+        id_arg (str): View argument holding the row id
+        ttl (float): Seconds an entry may be served
+        params (list[str]): Query parameters that select a variant of the
+            response. evict() drops only the plain variant; the others become
+            unreachable through the generation bump and age out.
+    """
+    _entity_prefixes[entity].add(prefix)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return view(*args, **kwargs)
+            entity_id = kwargs[id_arg]
+            try:
+                # Read before the view queries, so a write that lands meanwhile
+                # bumps past this generation and the stale body is never served
+                generation = cache.get_generation(f'{entity}:{entity_id}')
+            except Exception as e:
+                print(f"Cache read failed: {e}")
+                return view(*args, **kwargs)
+            variant = ''.join(f':{name}={request.args[name]}' for name in params if request.args.get(name))
+            return _serve(cache, _entity_key(prefix, entity_id, generation, variant), ttl, view, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def evict(entity, ids):
+    """Invalidate the cached responses of specific rows."""
+    cache = get_cache()
+    if cache is None:
+        return
+    for entity_id in ids:
+        namespace = f'{entity}:{entity_id}'
+        try:
+            generation = cache.get_generation(namespace)
+            cache.bump_generation(namespace)
+            for prefix in _entity_prefixes.get(entity, ()):
+                cache.delete(_entity_key(prefix, entity_id, generation))
+        except Exception as e:
+            print(f"Cache eviction failed ({namespace}): {e}")
+
+
+def _on_change(event):
+    if event['entity'] == 'experience':
+        bump_generation(EXPERIENCES_GENERATION)
+    evict(event['entity'], event['ids'])
+    for entity, ids in event.get('related', {}).items():
+        evict(entity, ids)
+
+
+def _on_resync():
+    # Events may have been missed while the listener was disconnected
+    cache = get_cache()
+    if cache is not None and isinstance(cache, LocalCacheBackend):
+        cache.clear()
+    bump_generation(EXPERIENCES_GENERATION)
+
+
+subscribe('experience', _on_change)
+subscribe('trip', _on_change)
+on_resync(_on_resync)
@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# psycopg2-binary==2.9.11
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+# python-dotenv==1.0.1
+from dotenv import load_dotenv
+# Flask==3.1.0
+from flask import g
+
+# ==============================================================================
+# Configuration
+# ==============================================================================
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# Pool sizing & connection hygiene (all overridable from the environment)
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))  # Connections opened up front and kept warm
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))  # Hard cap on connections per process
+POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))  # Seconds before a connection is recycled
+POOL_CHECKOUT_TIMEOUT = float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', '10'))  # Seconds to wait for a free connection
+POOL_HEALTH_CHECK_IDLE = float(os.getenv('DB_POOL_HEALTH_CHECK_IDLE', '5'))  # Ping connections idle longer than this
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+# ==============================================================================
+# Connection Pool
+# ==============================================================================
+class ConnectionPool:
+    """Thread-safe, bounded pool of psycopg2 connections.
+
+    Connections are handed out LIFO so the warmest connection is reused first.
+    On checkout a connection is discarded if it was closed, has outlived
+    max_lifetime, or fails a ``SELECT 1`` ping after sitting idle for longer
+    than health_check_idle seconds. When max_size connections are checked out,
+    callers block for up to timeout seconds instead of opening more.
+    """
+
+    def __init__(self, dsn, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 max_lifetime=POOL_MAX_LIFETIME, timeout=POOL_CHECKOUT_TIMEOUT,
+                 health_check_idle=POOL_HEALTH_CHECK_IDLE, connection_factory=None):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+        self.connection_factory = connection_factory
+
+        self._cond = threading.Condition()
+        self._idle = []  # Stack of (conn, returned_at)
+        self._created_at = {}  # id(conn) -> monotonic creation time
+        self._size = 0  # Open connections, idle + checked out
+        self._closed = False
+
+        self._stats = {'checkouts': 0, 'connects': 0, 'discarded': 0, 'waits': 0, 'timeouts': 0}
+
+        for _ in range(min_size):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _connect(self):
+        if self.connection_factory is not None:
+            conn = psycopg2.connect(self.dsn, connection_factory=self.connection_factory)
+        else:
+            conn = psycopg2.connect(self.dsn)
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats['connects'] += 1
+        return conn
+
+    def _expired(self, conn):
+        created = self._created_at.get(id(conn), 0)
+        return time.monotonic() - created > self.max_lifetime
+
+    def _is_healthy(self, conn, returned_at):
+        """Check a connection on its way out of the pool."""
+        if conn.closed or self._expired(conn):
+            return False
+        if time.monotonic() - returned_at < self.health_check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def getconn(self):
+        """Check a connection out of the pool, opening one if under max_size.
+
+        Raises:
+            PoolTimeout: If the pool stays exhausted for longer than timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                self._stats['checkouts'] += 1
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(conn, returned_at):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn, close=False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if not close and not conn.closed:
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        if close or conn.closed or self._closed or self._expired(conn):
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, size=self._size, idle=len(self._idle), max_size=self.max_size)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_URL)
+    return _pool
+
+
+def use_pool(pool):
+    """Install a pool built elsewhere (e.g. with a connection_factory); returns the previous one."""
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    return previous
+
+
+# ==============================================================================
+# Request & Background Checkout
+# ==============================================================================
+def get_db_connection():
+    """Return the pooled connection bound to the current request.
+
+    The connection is checked out on first use and returned to the pool by
+    release_db_connection when the app context tears down, so handlers must
+    not close it themselves.
+    """
+    if 'db_conn' not in g:
+        g.db_conn = get_pool().getconn()
+    return g.db_conn
+
+
+def release_db_connection(exception=None):
+    """Teardown hook: return the request's connection (if any) to the pool."""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        get_pool().putconn(conn)
+
+
+@contextmanager
+def pooled_connection():
+    """Check out a connection for work that runs outside a request (threads, scripts)."""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+def init_app(app):
+    """Register the per-request connection teardown on the Flask app."""
+    app.teardown_appcontext(release_db_connection)
@@ -0,0 +1,142 @@
+import json
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+# psycopg2-binary==2.9.11
+import psycopg2
+
+# ==============================================================================
+# Change events (Postgres LISTEN/NOTIFY)
+# ==============================================================================
+# Write paths call notify_change() inside their transaction, so the NOTIFY is
+# delivered only if the write commits, then apply_change() after the commit to
+# update this process right away. Every other worker receives the event on its
+# listener thread and runs the same handlers, which evict exactly the affected
+# cache keys.
+#
+# Event shape:
+#     {"entity": "experience", "ids": [12], "action": "update",
+#      "related": {"trip": [3, 7]}, "origin": "<process id>", ...details}
+# "related" lists entities whose cached data embeds the changed rows.
+EVENTS_CHANNEL = 'travelplanner_changes'
+EVENTS_LISTEN = os.getenv('EVENTS_LISTEN', '1') != '0'
+LISTEN_POLL_SECONDS = 5.0  # select() timeout; also how often a dead socket is noticed
+LISTEN_RETRY_SECONDS = 2.0  # Wait before reconnecting after an error
+MAX_PAYLOAD_BYTES = 7900  # Postgres rejects NOTIFY payloads of 8000 bytes or more
+
+# Identifies this worker so it skips its own events (already applied locally)
+PROCESS_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+_handlers = defaultdict(list)
+_resync_handlers = []
+_listener_started = False
+_listener_lock = threading.Lock()
+
+
+def subscribe(entity, handler):
+    """Call handler(event) for every change to entity, local or remote."""
+    _handlers[entity].append(handler)
+
+
+def on_resync(handler):
+    """Call handler() after the listener (re)connects, when events may have been missed."""
+    _resync_handlers.append(handler)
+
+
+def notify_change(cur, entity, ids, action, related=None, **details):
+    """Queue a change event in the current transaction.
+
+    Args:
+        cur: Cursor of the writing transaction
+        entity (str): "experience" or "trip"
+        ids (list[int]): Affected primary keys
+        action (str): "create", "update", "delete", "rate", ...
+        related (dict): entity -> ids whose caches embed the changed rows
+        **details: Extra JSON-serialisable fields for specific handlers
+
+    Returns:
+        dict: The event, to pass to apply_change() after commit
+    """
+    event = {
+        'entity': entity,
+        'ids': [int(i) for i in ids],
+        'action': action,
+        'related': {name: sorted({int(i) for i in rel_ids}) for name, rel_ids in (related or {}).items()},
+        'origin': PROCESS_ID,
+        **details,
+    }
+    payload = json.dumps(event, default=list, separators=(',', ':'))
+    if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        # Drop optional details; receivers still evict by id
+        event = {key: event[key] for key in ('entity', 'ids', 'action', 'related', 'origin')}
+        payload = json.dumps(event, separators=(',', ':'))
+    cur.execute("SELECT pg_notify(%s, %s)", (EVENTS_CHANNEL, payload))
+    return event
+
+
+def apply_change(event):
+    """Run this process's handlers for an event (call after commit)."""
+    for handler in _handlers.get(event.get('entity'), []):
+        try:
+            handler(event)
+        except Exception as e:
+            print(f"Change handler error ({event.get('entity')}): {e}")
+
+
+def _resync():
+    for handler in _resync_handlers:
+        try:
+            handler()
+        except Exception as e:
+            print(f"Resync handler error: {e}")
+
+
+def _listen_forever():
+    from api.py_db import DATABASE_URL
+
+    connected_before = False
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            conn.set_session(autocommit=True)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {EVENTS_CHANNEL}")
+            if connected_before:
+                _resync()
+            connected_before = True
+
+            while True:
+                if select.select([conn], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    try:
+                        event = json.loads(notification.payload)
+                    except ValueError:
+                        continue
+                    if event.get('origin') != PROCESS_ID:
+                        apply_change(event)
+
+        except Exception as e:
+            print(f"Change listener error: {e}")
+            time.sleep(LISTEN_RETRY_SECONDS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def start_listener():
+    """Start this worker's LISTEN thread (once per process)."""
+    global _listener_started
+    with _listener_lock:
+        if _listener_started or not EVENTS_LISTEN:
+            return
+        _listener_started = True
+    threading.Thread(target=_listen_forever, name='change-listener', daemon=True).start()
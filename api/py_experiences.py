@@ -1,20 +1,39 @@
+import hashlib
 import json
+import math
 import os
 import traceback
-import uuid
 from functools import wraps
-from urllib.parse import unquote
 
 # psycopg2-binary==2.9.11
-import psycopg2
+from psycopg2 import errors
 from psycopg2.extras import RealDictCursor
 # python-dotenv==1.0.1
 from dotenv import load_dotenv
 # Flask==3.1.0
-from flask import jsonify, Blueprint,request, g
+from flask import jsonify, Blueprint,request, g, make_response
 # firebase-admin==6.4.0
 import firebase_admin
-from firebase_admin import credentials, storage
+from firebase_admin import credentials
+
+from api.py_cache import cached_entity_json
+from api.py_db import get_db_connection
+from api.py_events import apply_change, notify_change, subscribe
+from api.py_fts import refresh_search_vector
+from api.py_geo import (cluster_cell_size, lng_span, render_experience_tile, tile_in_range,
+                         viewport_condition)
+from api.py_keywords import link_keywords
+from api.py_loaders import PHOTO_SIZE_SQL, hydrate_experiences, photo_columns_sql
+from api.py_pagination import (InvalidCursor, cursor_condition, next_cursor, order_by_clause,
+                               parse_page_size)
+from api.py_photos import (PHOTO_MAX_PER_REQUEST, create_signed_uploads, discard_photo_uploads,
+                           finalize_signed_uploads, get_photo_uploads, make_photo_derivatives,
+                           record_photo_uploads, spool_photos, store_photo_uploads)
+from api.py_popularity import TREND_HALF_LIFE_DAYS, TREND_SCORE_SQL
+from api.py_ratings import record_rating
+from api.py_singleflight import coalesced
+from api.py_snapshots import SnapshotCache
+from api.py_storage_gc import delete_experience_photos, enqueue_experience_files, wake_storage_gc
 
 # ==============================================================================
 # Configuration
@@ -23,15 +42,41 @@ experiences_bp = Blueprint('experiences', __name__)
 
 # Load environment variables
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
 FIREBASE_BUCKET = os.getenv('FIREBASE_BUCKET')
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
-# Phase 1 safeguards for location-based search
-RESULTS_LIMIT = 200  # Max experiences returned
-MAX_BOX_SIZE = 10.0  # Max degrees (prevents scanning entire planet)
+# Keyset order for experience listings (newest first, experience_id breaks ties)
+LISTING_SORT = [
+    ('e.create_date', 'DESC', 'create_date'),
+    ('e.experience_id', 'DESC', 'experience_id'),
+]
+
+# Safeguards for location-based search
+RESULTS_LIMIT = 200  # Max experiences returned (marker mode)
+MAX_BOX_SIZE = 45.0  # Max viewport degrees in marker mode (clustering mode has no limit)
+
+# Clustering mode for zoomed-out map views
+MAX_ZOOM = 22  # Highest web-map zoom level accepted
+CLUSTER_CELLS_PER_TILE = 4  # Grid cells per 256px map tile side (~64px cells)
+CLUSTER_MAX_CELLS = 1024  # Upper bound on clusters returned per viewport
+CLUSTER_REPRESENTATIVES = 3  # Top-rated experiences returned per cluster
+
+# Top experiences (stale-while-revalidate snapshots)
+TOP_EXPERIENCES_FRESH_SECONDS = float(os.getenv('TOP_EXPERIENCES_FRESH_SECONDS', '60'))
+TOP_EXPERIENCES_DEFAULT_LIMIT = 6
+TOP_EXPERIENCES_MAX_LIMIT = 50
+TOP_EXPERIENCES_WINDOWS = {1, 7, 30, 90, 365}  # Allowed "window" values (days)
+BBOX_GRID = 0.5  # Degrees; region bounds are snapped outward to this grid
+
+# Trending experiences
+TRENDING_DEFAULT_LIMIT = 10
+TRENDING_MAX_LIMIT = 50
+
+# Vector tiles for map markers
+TILE_FEATURE_LIMIT = 5000  # Max markers per tile (best rated kept)
+TILE_CACHE_MAX_AGE = int(os.getenv('TILE_CACHE_MAX_AGE', '300'))  # Seconds browsers/CDNs may reuse a tile
 
 # Initialize Firebase
 try:
@@ -66,12 +111,8 @@ except Exception as e:
 
 
 # ==============================================================================
-# Database & Authentication Utilities
+# Authentication Utilities
 # ==============================================================================
-# Database Connector
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
-
 # Auth
 def require_auth(f):
     """Require authentication using X-User-Id or userID header."""
@@ -93,76 +134,6 @@ def allowed_file(filename):
     return '.' in filename and \
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Upload photo (to firebase)
-def upload_to_firebase(file, experience_id):
-    """Upload file to Firebase Storage and return public URL"""
-    try:
-        # Generate unique filename
-        file_extension = file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"experiences/{experience_id}/{uuid.uuid4()}.{file_extension}"
-
-        # Get Firebase storage bucket
-        bucket = storage.bucket()
-        blob = bucket.blob(unique_filename)
-
-        # Reset the file pointer before upload
-        if hasattr(file, "stream"):
-            file.stream.seek(0)
-            blob.upload_from_file(file.stream, content_type=file.content_type)
-        else:
-            file.seek(0)
-            blob.upload_from_file(file, content_type=file.content_type)
-
-        # Make the blob publicly accessible
-        blob.make_public()
-
-        # Get public URL
-        return blob.public_url
-    except Exception as error:
-        print(f"Firebase upload error: {error}")
-        raise
-
-# Delete Photo (from firebase)
-def delete_from_firebase(photo_url):
-    """Delete file from Firebase Storage"""
-    try:
-        # Extract the file path from the URL
-        if 'storage.googleapis.com' in photo_url:
-            # Extract path after bucket name
-            bucket_marker = f'{FIREBASE_BUCKET}/'
-            if bucket_marker in photo_url:
-                path = photo_url.split(bucket_marker)[-1]
-                # Decode URL-encoded characters
-                path = unquote(path)
-            else:
-                # Parse URL more carefully
-                # URL format: https://storage.googleapis.com/bucket-name/experiences/123/uuid.jpg
-                parts = photo_url.split('/')
-                # Find index of bucket name and get everything after
-                try:
-                    bucket_index = parts.index(FIREBASE_BUCKET)
-                    path = '/'.join(parts[bucket_index + 1:])
-                    path = unquote(path)
-                except ValueError:
-                    print(f"Could not find bucket '{FIREBASE_BUCKET}' in URL: {photo_url}")
-                    return
-
-            print(f"Attempting to delete Firebase path: {path}")  # Debug
-
-            bucket = storage.bucket()
-            blob = bucket.blob(path)
-
-            # Check if blob exists before deleting
-            if blob.exists():
-                blob.delete()
-                print(f"✅ Deleted from Firebase: {path}")
-            else:
-                print(f"⚠️ Blob not found in Firebase: {path}")
-
-    except Exception as error:
-        print(f"Firebase delete error: {error}")
-        traceback.print_exc()
-
 # ==============================================================================
 # FLASK ROUTES
 # ==============================================================================
@@ -170,6 +141,25 @@ def delete_from_firebase(photo_url):
 def experiences_root():
     return jsonify({"message": "Hello from Experiences"})
 
+def parse_photo_size(value):
+    """Validate a photo_size parameter (None -> 'original').
+
+    Raises:
+        ValueError: For an unknown size
+    """
+    size = value or 'original'
+    if size not in PHOTO_SIZE_SQL:
+        raise ValueError(f"photo_size must be one of: {', '.join(PHOTO_SIZE_SQL)}")
+    return size
+
+
+def trip_ids_for_experience(cur, experience_id):
+    """Trips containing an experience (their cached details embed it)."""
+    with cur.connection.cursor() as trip_cur:
+        trip_cur.execute("SELECT trip_id FROM trip_experiences WHERE experience_id = %s", (experience_id,))
+        return [row[0] for row in trip_cur.fetchall()]
+
+
 # ==============================================================================
 # Create
 # ==============================================================================
@@ -196,9 +186,10 @@ def create_experience():
         if user_rating:
             user_rating = int(user_rating)
 
-        # Get uploaded files
+        # Get uploaded files (copied out of the request; stored after commit)
         files = request.files.getlist('photos')
         captions = json.loads(request.form.get('captions', '[]'))
+        photos = spool_photos(files, captions, allowed_file)
 
     except (ValueError, json.JSONDecodeError) as error:
         return jsonify({"error": f"Invalid input  {str(error)}"}), 400
@@ -218,56 +209,37 @@ def create_experience():
                         """, (user_id, title, description, exp_date, address, lat, lon, lon, lat))
             experience_id = cur.fetchone()["experience_id"]
 
-            # Handle keywords
-            for kw in keywords:
-                cur.execute("INSERT INTO keywords (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;", (kw,))
-                cur.execute("SELECT keyword_id FROM keywords WHERE name = %s;", (kw,))
-                keyword_id = cur.fetchone()["keyword_id"]
-                cur.execute("""
-                            INSERT INTO experience_keywords (experience_id, keyword_id)
-                            VALUES (%s, %s) ON CONFLICT DO NOTHING
-                            """, (experience_id, keyword_id))
-
-            # Insert initial user_rating
+            # Handle keywords (resolved and linked set-wise)
+            added_keywords, _ = link_keywords(cur, experience_id, keywords)
+
+            # Keep the full-text search document in sync with title/description/keywords
+            refresh_search_vector(cur, experience_id)
+
+            # Insert initial user_rating (and its rating stats)
             if user_rating and 1 <= user_rating <= 5:
-                cur.execute("""
-                            INSERT INTO experience_ratings (experience_id, user_id, rating)
-                            VALUES (%s, %s, %s) ON CONFLICT (experience_id, user_id)
-                            DO UPDATE SET rating = EXCLUDED.rating, updated_at = NOW()
-                            """, (experience_id, user_id, user_rating))
-
-            # Upload photos to firebase & insert metadata into database
-            for idx, file in enumerate(files):
-                if file and file.filename and allowed_file(file.filename):
-                    try:
-                        # Upload to Firebase Storage
-                        photo_url = upload_to_firebase(file, experience_id)
-
-                        # Get caption if provided
-                        caption = captions[idx] if idx < len(captions) else ''
-
-                        # Save to database
-                        cur.execute("""
-                            INSERT INTO experience_photos (experience_id, photo_url, caption)
-                            VALUES (%s, %s, %s)
-                            RETURNING photo_id, experience_id, photo_url, caption, upload_date
-                        """, (experience_id, photo_url, caption))
-
-                    except Exception as error:
-                        print(f"Error uploading {file.filename}: {error}")
-                        continue
+                record_rating(cur, experience_id, user_id, user_rating)
+
+            # Delivered to other workers on commit
+            event = notify_change(cur, 'experience', [experience_id], 'create',
+                                  suggestions={'added_keywords': sorted(added_keywords), 'new_title': title})
+
+            # Photos are stored once the experience is committed
+            record_photo_uploads(cur, experience_id, photos)
 
         conn.commit()
-        return jsonify({
-            "message": "Experience created",
-            "experience_id": experience_id,
-        }), 201
+        apply_change(event)
 
     except Exception as error:
         conn.rollback()
+        discard_photo_uploads(photos)
         return jsonify({"error": str(error)}), 500
-    finally:
-        conn.close()
+
+    photo_uploads = store_photo_uploads(conn, experience_id, photos)
+    return jsonify({
+        "message": "Experience created",
+        "experience_id": experience_id,
+        "photo_uploads": photo_uploads,
+    }), 201
 
 # ==============================================================================
 # Update
@@ -299,15 +271,16 @@ def update_experience():
         if user_rating:
             user_rating = int(user_rating)
 
-        # Get uploaded files and captions
+        # Get uploaded files and captions (copied out of the request; uploaded after commit)
         files = request.files.getlist('photos')
         captions = json.loads(request.form.get('captions', '[]'))
         photos_to_delete = json.loads(request.form.get('photos_to_delete', '[]'))
+        photos = spool_photos(files, captions, allowed_file)
 
     except (ValueError, json.JSONDecodeError, KeyError) as error:
         return jsonify({"error": f"Invalid input: {str(error)}"}), 400
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Verify ownership of experience
@@ -315,8 +288,10 @@ def update_experience():
             experience = cur.fetchone()
 
             if not experience:
+                discard_photo_uploads(photos)
                 return jsonify({'error': 'Experience not found'}), 404
             if experience['user_id'] != user_id:
+                discard_photo_uploads(photos)
                 return jsonify({'error': 'Unauthorized to modify this experience'}), 403
 
             # Use existing values as defaults if not provided
@@ -344,90 +319,52 @@ def update_experience():
                         ''', (title, description, exp_date, address, latitude, longitude, longitude, latitude, experience_id))
             updated_experience = cur.fetchone()
 
-            # Update keywords (clear and re-add)
-            cur.execute("DELETE FROM experience_keywords WHERE experience_id = %s", (experience_id,))
-            for kw in keywords:
-                cur.execute("INSERT INTO keywords (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;", (kw,))
-                cur.execute("SELECT keyword_id FROM keywords WHERE name = %s;", (kw,))
-                keyword_id = cur.fetchone()['keyword_id']
-                cur.execute("""
-                            INSERT INTO experience_keywords (experience_id, keyword_id)
-                            VALUES (%s, %s) ON CONFLICT DO NOTHING
-                            """, (experience_id, keyword_id))
-
-            # Update or insert user rating
+            # Update keywords (only changed links are inserted/deleted)
+            added_keywords, removed_keywords = link_keywords(cur, experience_id, keywords)
+
+            # Keep the full-text search document in sync with title/description/keywords
+            refresh_search_vector(cur, experience_id)
+
+            # Update or insert user rating (and its rating stats)
             if user_rating and 1 <= user_rating <= 5:
-                cur.execute("""
-                            INSERT INTO experience_ratings (experience_id, user_id, rating)
-                            VALUES (%s, %s, %s)
-                                ON CONFLICT (experience_id, user_id)
-                    DO UPDATE SET rating = EXCLUDED.rating, updated_at = NOW()
-                            """, (experience_id, user_id, user_rating))
-
-            # Delete specified photos (from Firebase and database)
-            if photos_to_delete:
-                for photo_id in photos_to_delete:
-                    # Get photo URL before deleting
-                    cur.execute("""
-                                SELECT photo_url
-                                FROM experience_photos
-                                WHERE photo_id = %s
-                                """, (photo_id,))
-                    photo = cur.fetchone()
-
-                    if photo:
-                        # Delete from database
-                        cur.execute("""
-                                    DELETE
-                                    FROM experience_photos
-                                    WHERE photo_id = %s
-                                    """, (photo_id,))
-
-                        # Delete from Firebase
-                        try:
-                            delete_from_firebase(photo['photo_url'])
-                        except Exception as error:
-                            print(f"Error deleting photo {photo_id} from Firebase: {error}")
-
-            # Upload new photos to Firebase & insert metadata into database
-            uploaded_photos = []
-            for idx, file in enumerate(files):
-                if file and file.filename and allowed_file(file.filename):
-                    try:
-                        # Upload to Firebase Storage
-                        photo_url = upload_to_firebase(file, experience_id)
-
-                        # Get caption if provided
-                        caption = captions[idx] if idx < len(captions) else ''
-
-                        # Save to database
-                        cur.execute("""
-                                    INSERT INTO experience_photos (experience_id, photo_url, caption)
-                                    VALUES (%s, %s, %s)
-                                        RETURNING photo_id, experience_id, photo_url, caption, upload_date
-                                    """, (experience_id, photo_url, caption))
-
-                        uploaded_photos.append(cur.fetchone())
-
-                    except Exception as error:
-                        print(f"Error uploading {file.filename}: {error}")
-                        continue
+                record_rating(cur, experience_id, user_id, user_rating)
+
+            # Delivered to other workers on commit
+            event = notify_change(
+                cur, 'experience', [experience_id], 'update',
+                related={'trip': trip_ids_for_experience(cur, experience_id)},
+                suggestions={
+                    'added_keywords': sorted(added_keywords),
+                    'removed_keywords': sorted(removed_keywords),
+                    'old_title': experience['title'],
+                    'new_title': title,
+                })
+
+            # Delete specified photos; their files are removed from storage after commit
+            deleted_photos = delete_experience_photos(cur, experience_id, photos_to_delete)
+
+            # New photos are stored once the update is committed
+            record_photo_uploads(cur, experience_id, photos)
 
         conn.commit()
-        return jsonify({
-            "message": "Experience updated successfully",
-            "experience": updated_experience,
-            "uploaded_photos": uploaded_photos,
-            "deleted_photos": len(photos_to_delete) if photos_to_delete else 0
-        }), 200
+        apply_change(event)
 
     except Exception as error:
         conn.rollback()
+        discard_photo_uploads(photos)
         print(f"Error updating experience: {str(error)}")
         return jsonify({'error': 'Failed to update experience'}), 500
 
-    finally:
-        conn.close()
+    photo_uploads = store_photo_uploads(conn, experience_id, photos)
+    if deleted_photos:
+        wake_storage_gc()
+    return jsonify({
+        "message": "Experience updated successfully",
+        "experience": updated_experience,
+        "photo_uploads": photo_uploads,
+        "deleted_photos": deleted_photos
+    }), 200
+
 
 # ==============================================================================
 # Delete
@@ -449,28 +386,41 @@ def delete_experience(experience_id):
     """
     user_id = g.user_id
 
-    conn = psycopg2.connect(DATABASE_URL)
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # fetch experience
-            cur.execute('SELECT * FROM experiences WHERE experience_id = %s', (experience_id,))
-            experience = cur.fetchone()
-
-            # Check if experience exists
-            if not experience:
-                return jsonify({'error': 'Experience not found'}), 404
-
-            # Verify user is the creator of the experience
-            if experience['user_id'] != user_id:
-                return jsonify({'error': 'Unauthorized'}), 403
-
-            # Delete the experience from the database
-            cur.execute('DELETE FROM experiences where experience_id = %s', (experience_id,))
-        conn.commit()
-        return jsonify({'message': 'Experience deleted'}), 200
+    conn = get_db_connection()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # fetch experience
+        cur.execute('SELECT * FROM experiences WHERE experience_id = %s', (experience_id,))
+        experience = cur.fetchone()
+
+        # Check if experience exists
+        if not experience:
+            return jsonify({'error': 'Experience not found'}), 404
+
+        # Verify user is the creator of the experience
+        if experience['user_id'] != user_id:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        # Unlink keywords explicitly (not via the cascade) so their usage counts
+        # drop too; the removed names are evicted from caches in every worker
+        _, removed_keywords = link_keywords(cur, experience_id, [])
+        event = notify_change(
+            cur, 'experience', [experience_id], 'delete',
+            related={'trip': trip_ids_for_experience(cur, experience_id)},
+            suggestions={
+                'removed_keywords': sorted(removed_keywords),
+                'old_title': experience['title'],
+            })
+
+        # The cascade removes the photo rows; their files are removed from storage after commit
+        enqueue_experience_files(cur, experience_id)
+
+        # Delete the experience from the database
+        cur.execute('DELETE FROM experiences where experience_id = %s', (experience_id,))
+    conn.commit()
+    apply_change(event)
+    wake_storage_gc()
+    return jsonify({'message': 'Experience deleted'}), 200
 
-    finally:
-        conn.close()
 
 # ==============================================================================
 # Read
@@ -488,91 +438,118 @@ def get_all_experiences():
     Ordered by creation date (newest first).
     Requires admin authentication.
 
+    Query Parameters:
+        limit (int): Page size (default: 50, max: 100); enables cursor pagination
+        cursor (str): Opaque next_cursor from a previous page; enables cursor pagination
+
     Returns:
-        tuple: JSON array of experience objects with ratings & keywords, HTTP 200
+        tuple: JSON array of experience objects with ratings & keywords, HTTP 200.
+               When paginating: {results, count, limit, next_cursor}
     """
-    conn = get_db_connection()
-
+    # Optional cursor pagination (opt in by sending limit and/or cursor)
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    limit = parse_page_size(request.args.get('limit', type=int))
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                        SELECT e.*,
-                               COALESCE(ROUND(AVG(r.rating)::numeric, 2), 0.0) AS average_rating,
-                               COUNT(DISTINCT r.user_id) AS rating_count,
-                               ARRAY_AGG(DISTINCT k.name) FILTER (WHERE k.name IS NOT NULL) AS keywords, owner_rating.rating AS owner_rating
-                        FROM experiences e
-                                 LEFT JOIN experience_ratings r ON e.experience_id = r.experience_id
-                                 LEFT JOIN experience_keywords ek ON e.experience_id = ek.experience_id
-                                 LEFT JOIN keywords k ON ek.keyword_id = k.keyword_id
-                                 LEFT JOIN experience_ratings owner_rating
-                                           ON e.experience_id = owner_rating.experience_id
-                                               AND e.user_id = owner_rating.user_id
-                        GROUP BY e.experience_id, owner_rating.rating
-                        ORDER BY e.create_date DESC
-                        """)
-            results = cur.fetchall()
+        after_sql, after_params = cursor_condition(request.args.get('cursor'), LISTING_SORT)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
 
-            # Convert to proper JSON format
-            experiences = []
-            for exp in results:
-                exp_dict = dict(exp)
-                # Ensure proper types for Rating
-                exp_dict["average_rating"] = float(exp_dict["average_rating"])
-                exp_dict["rating_count"] = int(exp_dict["rating_count"])
-                # Change experience_date format
-                exp_dict["experience_date"] = exp_dict["experience_date"].strftime("%Y-%m-%d")
-                experiences.append(exp_dict)
+    conn = get_db_connection()
 
-        return jsonify(experiences), 200
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+                    SELECT e.*,
+                           COALESCE(rs.average_rating, 0.0) AS average_rating,
+                           COALESCE(rs.rating_count, 0) AS rating_count,
+                           owner_rating.rating AS owner_rating
+                    FROM experiences e
+                             LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
+                             LEFT JOIN experience_ratings owner_rating
+                                       ON e.experience_id = owner_rating.experience_id
+                                           AND e.user_id = owner_rating.user_id
+                    WHERE {after}
+                    ORDER BY {order_by}
+                    LIMIT %s
+                    """.format(after=after_sql, order_by=order_by_clause(LISTING_SORT)),
+                    (*after_params, limit if paginate else None))
+        results = cur.fetchall()
+
+        # Keywords for the whole page in one query
+        hydrate_experiences(cur, results, keywords=True)
+
+        # Convert to proper JSON format
+        experiences = []
+        for exp in results:
+            exp_dict = dict(exp)
+            # Ensure proper types for Rating
+            exp_dict["average_rating"] = float(exp_dict["average_rating"])
+            exp_dict["rating_count"] = int(exp_dict["rating_count"])
+            # Change experience_date format
+            exp_dict["experience_date"] = exp_dict["experience_date"].strftime("%Y-%m-%d")
+            experiences.append(exp_dict)
+
+    if paginate:
+        return jsonify({
+            'count': len(experiences),
+            'limit': limit,
+            'next_cursor': next_cursor(results, limit, LISTING_SORT),
+            'results': experiences
+        }), 200
+    return jsonify(experiences), 200
 
-    finally:
-        conn.close()
 
 @experiences_bp.route('/details/<int:experience_id>', methods=['GET'])
+@cached_entity_json('experience:details', 'experience', 'experience_id', params=['photo_size'])
+@coalesced('experience:details')
 def get_experience_details(experience_id):
     """Retrieve a specific experience by ID. Public version - doesn't return a user_rating.
     Args:
         experience_id (int): The unique identifier of the experience
+    Query Parameters:
+        photo_size (str): thumbnail, medium or original (default) - size returned
+            as each photo's photo_url (thumbnail_url/medium_url/original_url are always included)
     Returns:
-        tuple: JSON object with experience data and HTTP 200, or error message and HTTP 404
+        tuple: JSON object with experience data and HTTP 200, or error message and HTTP 400/404
     """
-    conn = get_db_connection()
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Fetch experience details along with average rating, number of ratings, and keywords
-            cur.execute("""
-                        SELECT e.*,
-                               COALESCE(ROUND(AVG(r.rating)::numeric, 2), 0.0) AS average_rating,
-                               COUNT(DISTINCT r.rating) AS rating_count,
-                               ARRAY_AGG(DISTINCT k.name) FILTER (WHERE k.name IS NOT NULL) AS keywords
-                        FROM experiences e
-                                 LEFT JOIN experience_ratings r ON e.experience_id = r.experience_id
-                                 LEFT JOIN experience_keywords ek ON e.experience_id = ek.experience_id
-                                 LEFT JOIN keywords k ON ek.keyword_id = k.keyword_id
-                        WHERE e.experience_id = %s
-                        GROUP BY e.experience_id
-                        """, (experience_id,))
-            experience = cur.fetchone()
-
-            if not experience:
-                return jsonify({"error": "Experience not found"}), 404
-
-            # Get photos metadata
-            cur.execute("""
-                        SELECT photo_id, photo_url, caption, upload_date
-                        FROM experience_photos
-                        WHERE experience_id = %s
-                        ORDER BY upload_date ASC
-                        """, (experience_id,))
-            experience['photos'] = cur.fetchall()
-
-            # Ensure proper type for average_rating
-            experience["average_rating"] = float(experience["average_rating"])
+        photo_size = parse_photo_size(request.args.get('photo_size'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        return jsonify(experience), 200
+    conn = get_db_connection()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Fetch experience details along with average rating, number of ratings, and keywords
+        cur.execute("""
+                    SELECT e.*,
+                           COALESCE(rs.average_rating, 0.0) AS average_rating,
+                           COALESCE(rs.rating_count, 0) AS rating_count,
+                           (SELECT ARRAY_AGG(k.name ORDER BY k.name)
+                            FROM experience_keywords ek
+                                     JOIN keywords k ON ek.keyword_id = k.keyword_id
+                            WHERE ek.experience_id = e.experience_id) AS keywords
+                    FROM experiences e
+                             LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
+                    WHERE e.experience_id = %s
+                    """, (experience_id,))
+        experience = cur.fetchone()
+
+        if not experience:
+            return jsonify({"error": "Experience not found"}), 404
+
+        # Get photos metadata
+        cur.execute("""
+                    SELECT {columns}
+                    FROM experience_photos p
+                    WHERE p.experience_id = %s
+                    ORDER BY p.upload_date ASC
+                    """.format(columns=photo_columns_sql(photo_size)), (experience_id,))
+        experience['photos'] = cur.fetchall()
+
+        # Ensure proper type for average_rating
+        experience["average_rating"] = float(experience["average_rating"])
+
+    return jsonify(experience), 200
 
-    finally:
-        conn.close()
 
 @experiences_bp.route('/user-experiences', methods=['GET'])
 @require_auth
@@ -585,34 +562,52 @@ def get_user_experiences():
     Args:
         user_id (STR): The ID of the user whose experiences are to retrieve
 
+    Query Parameters:
+        limit (int): Page size (default: 50, max: 100); enables cursor pagination
+        cursor (str): Opaque next_cursor from a previous page; enables cursor pagination
+
     Returns:
-        tuple: JSON array of experience objects and HTTP 200
+        tuple: JSON array of experience objects and HTTP 200.
+               When paginating: {results, count, limit, next_cursor}
     """
     user_id = g.user_id
 
-    conn = get_db_connection()
+    # Optional cursor pagination (opt in by sending limit and/or cursor)
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    limit = parse_page_size(request.args.get('limit', type=int))
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Fetch experience details along with average rating, rating count, and keywords
-            cur.execute("""
-                        SELECT e.*,
-                               COALESCE(ROUND(AVG(r.rating::numeric), 2), 0.00) AS average_rating,
-                               COUNT(DISTINCT r.rating) AS rating_count,
-                               ARRAY_AGG(k.name) FILTER (WHERE k.name IS NOT NULL) AS keywords
-                        FROM experiences e
-                                 LEFT JOIN experience_ratings r ON e.experience_id = r.experience_id
-                                 LEFT JOIN experience_keywords ek ON e.experience_id = ek.experience_id
-                                 LEFT JOIN keywords k ON ek.keyword_id = k.keyword_id
-                        WHERE e.user_id = %s
-                        GROUP BY e.experience_id
-                        ORDER BY e.create_date DESC
-                        """, (user_id,))
-            results = cur.fetchall()
-        return jsonify(results), 200
-    finally:
-        conn.close()
+        after_sql, after_params = cursor_condition(request.args.get('cursor'), LISTING_SORT)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
 
-    return jsonify([dict(experience) for experience in experiences]), 200
+    conn = get_db_connection()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Fetch experience details along with average rating, rating count, and keywords
+        cur.execute("""
+                    SELECT e.*,
+                           COALESCE(rs.average_rating, 0.00) AS average_rating,
+                           COALESCE(rs.rating_count, 0) AS rating_count
+                    FROM experiences e
+                             LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
+                    WHERE e.user_id = %s
+                      AND {after}
+                    ORDER BY {order_by}
+                    LIMIT %s
+                    """.format(after=after_sql, order_by=order_by_clause(LISTING_SORT)),
+                    (user_id, *after_params, limit if paginate else None))
+        results = cur.fetchall()
+
+        # Keywords for the whole page in one query
+        hydrate_experiences(cur, results, keywords=True)
+
+    if paginate:
+        return jsonify({
+            'count': len(results),
+            'limit': limit,
+            'next_cursor': next_cursor(results, limit, LISTING_SORT),
+            'results': results
+        }), 200
+    return jsonify(results), 200
 
 @experiences_bp.route('/user_details/<int:experience_id>', methods=['GET'])
 @require_auth
@@ -621,68 +616,189 @@ def get_user_experience_details(experience_id):
     Get single experience with all details for editing.
 
     Returns: experience details, average_rating, user_rating, keywords, and photos.
+    Optional photo_size query parameter as for /details.
 
     Requires authentication.
     """
     user_id = g.user_id
+    try:
+        photo_size = parse_photo_size(request.args.get('photo_size'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_db_connection()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # Fetch experience details with average rating and keywords
+        cur.execute("""
+                    SELECT e.*,
+                           COALESCE(rs.average_rating, 0.0) AS average_rating,
+                           COALESCE(rs.rating_count, 0) AS rating_count,
+                           (SELECT ARRAY_AGG(k.name ORDER BY k.name)
+                            FROM experience_keywords ek
+                                     JOIN keywords k ON ek.keyword_id = k.keyword_id
+                            WHERE ek.experience_id = e.experience_id) AS keywords
+                    FROM experiences e
+                             LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
+                    WHERE e.experience_id = %s
+                    """, (experience_id,))
+        experience = cur.fetchone()
+
+        if not experience:
+            return jsonify({"error": "Experience not found"}), 404
+
+        # Verify experience ownership
+        if experience['user_id'] != user_id:
+            return jsonify({"error": "Unauthorized to edit this experience"}), 403
+
+        # Fetch user-specific rating
+        cur.execute("""
+                    SELECT rating
+                    FROM experience_ratings
+                    WHERE experience_id = %s AND user_id = %s
+                    """, (experience_id, user_id))
+        user_rating = cur.fetchone()
+
+        # Fetch all photos for this experience
+        cur.execute("""
+                    SELECT {columns}
+                    FROM experience_photos p
+                    WHERE p.experience_id = %s
+                    ORDER BY p.upload_date ASC
+                    """.format(columns=photo_columns_sql(photo_size)), (experience_id,))
+        photos = cur.fetchall()
+
+        # Add all data to the response object
+        experience["owner_rating"] = user_rating["rating"] if user_rating else None
+        experience["average_rating"] = float(experience["average_rating"])
+        experience["photos"] = photos
+
+        # Format dates for frontend
+        experience["experience_date"] = experience["experience_date"].strftime("%Y-%m-%d")
+        experience["create_date"] = experience["create_date"].isoformat()
+        if experience.get("last_updated"):
+            experience["last_updated"] = experience["last_updated"].isoformat()
+
+    return jsonify(experience), 200
+
+
+def owned_experience_error(cur, experience_id, user_id):
+    """Error response if the experience is missing or not owned by user_id, else None."""
+    cur.execute("SELECT user_id FROM experiences WHERE experience_id = %s", (experience_id,))
+    experience = cur.fetchone()
+    if not experience:
+        return jsonify({"error": "Experience not found"}), 404
+    if experience['user_id'] != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+    return None
+
+
+@experiences_bp.route('/photo_uploads/<int:experience_id>', methods=['GET'])
+@require_auth
+def get_experience_photo_uploads(experience_id):
+    """Status of the photo uploads of an experience (owner only).
+
+    Each upload is 'pending', 'done' (photo_id/photo_url set) or 'failed'
+    (error set). Create/update return the same statuses for their photos;
+    signed uploads stay pending until finalized.
+
+    Returns:
+        tuple: {experience_id, pending, uploads} and HTTP 200,
+               or error message with HTTP 404/403
+    """
+    user_id = g.user_id
+
+    conn = get_db_connection()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        error = owned_experience_error(cur, experience_id, user_id)
+        if error:
+            return error
+
+        uploads = get_photo_uploads(cur, experience_id)
+
+    return jsonify({
+        'experience_id': experience_id,
+        'pending': sum(1 for upload in uploads if upload['status'] in ('pending', 'uploading')),
+        'uploads': uploads,
+    }), 200
+
+
+@experiences_bp.route('/photo_uploads/<int:experience_id>/sign', methods=['POST'])
+@require_auth
+def sign_photo_uploads(experience_id):
+    """Issue short-lived signed URLs for uploading photos straight to storage (owner only).
+
+    Request Body (JSON):
+        photos (list): {filename, content_type, caption} per photo
+
+    Returns:
+        tuple: {experience_id, uploads} and HTTP 201; each upload has upload_id,
+               method, url and headers to send the bytes with, then call finalize.
+               Error message with HTTP 400/403/404 otherwise
+    """
+    data = request.get_json(silent=True) or {}
+    photos = data.get('photos')
+    if not isinstance(photos, list) or not photos:
+        return jsonify({"error": "photos must be a non-empty list"}), 400
+    if len(photos) > PHOTO_MAX_PER_REQUEST:
+        return jsonify({"error": f"At most {PHOTO_MAX_PER_REQUEST} photos per request"}), 400
+    for photo in photos:
+        if not isinstance(photo, dict) or not allowed_file(str(photo.get('filename') or '')):
+            return jsonify({"error": f"Unsupported file, allowed: {sorted(ALLOWED_EXTENSIONS)}"}), 400
+        if not str(photo.get('content_type') or '').startswith('image/'):
+            return jsonify({"error": f"content_type must be an image type: {photo.get('filename')}"}), 400
 
     conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Fetch experience details with average rating and keywords
-            cur.execute("""
-                        SELECT e.*,
-                               COALESCE(ROUND(AVG(r.rating)::numeric, 2), 0.0) AS average_rating,
-                               COUNT(DISTINCT r.user_id) AS rating_count,
-                               ARRAY_AGG(DISTINCT k.name) FILTER (WHERE k.name IS NOT NULL) AS keywords
-                        FROM experiences e
-                                 LEFT JOIN experience_ratings r ON e.experience_id = r.experience_id
-                                 LEFT JOIN experience_keywords ek ON e.experience_id = ek.experience_id
-                                 LEFT JOIN keywords k ON ek.keyword_id = k.keyword_id
-                        WHERE e.experience_id = %s
-                        GROUP BY e.experience_id
-                        """, (experience_id,))
-            experience = cur.fetchone()
+            error = owned_experience_error(cur, experience_id, g.user_id)
+            if error:
+                return error
+            uploads = create_signed_uploads(cur, experience_id, photos)
+        conn.commit()
+    except Exception as error:
+        conn.rollback()
+        print(f"Error signing photo uploads: {error}")
+        return jsonify({"error": "Failed to create upload URLs"}), 500
 
-            if not experience:
-                return jsonify({"error": "Experience not found"}), 404
+    return jsonify({'experience_id': experience_id, 'uploads': uploads}), 201
 
-            # Verify experience ownership
-            if experience['user_id'] != user_id:
-                return jsonify({"error": "Unauthorized to edit this experience"}), 403
 
-            # Fetch user-specific rating
-            cur.execute("""
-                        SELECT rating
-                        FROM experience_ratings
-                        WHERE experience_id = %s AND user_id = %s
-                        """, (experience_id, user_id))
-            user_rating = cur.fetchone()
+@experiences_bp.route('/photo_uploads/<int:experience_id>/finalize', methods=['POST'])
+@require_auth
+def finalize_photo_uploads(experience_id):
+    """Register photos uploaded through signed URLs (owner only).
 
-            # Fetch all photos for this experience
-            cur.execute("""
-                        SELECT photo_id, photo_url, caption, upload_date
-                        FROM experience_photos
-                        WHERE experience_id = %s
-                        ORDER BY upload_date ASC
-                        """, (experience_id,))
-            photos = cur.fetchall()
+    Request Body (JSON):
+        upload_ids (list[int]): Uploads whose bytes were sent to storage
 
-            # Add all data to the response object
-            experience["owner_rating"] = user_rating["rating"] if user_rating else None
-            experience["average_rating"] = float(experience["average_rating"])
-            experience["photos"] = photos
+    Returns:
+        tuple: {experience_id, uploads} with each upload's status ('done' or
+               'failed' with error) and HTTP 200, or error message with HTTP 400/403/404
+    """
+    data = request.get_json(silent=True) or {}
+    upload_ids = data.get('upload_ids')
+    if (not isinstance(upload_ids, list) or not upload_ids
+            or not all(isinstance(upload_id, int) for upload_id in upload_ids)):
+        return jsonify({"error": "upload_ids must be a non-empty list of integers"}), 400
 
-            # Format dates for frontend
-            experience["experience_date"] = experience["experience_date"].strftime("%Y-%m-%d")
-            experience["create_date"] = experience["create_date"].isoformat()
-            if experience.get("last_updated"):
-                experience["last_updated"] = experience["last_updated"].isoformat()
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            error = owned_experience_error(cur, experience_id, g.user_id)
+            if error:
+                return error
+        uploads, event, derivative_jobs = finalize_signed_uploads(conn, experience_id, upload_ids)
+        conn.commit()
+    except Exception as error:
+        conn.rollback()
+        print(f"Error finalizing photo uploads: {error}")
+        return jsonify({"error": "Failed to finalize photo uploads"}), 500
 
-        return jsonify(experience), 200
+    if event:
+        apply_change(event)
+    make_photo_derivatives(experience_id, derivative_jobs)
+    return jsonify({'experience_id': experience_id, 'uploads': uploads}), 200
 
-    finally:
-        conn.close()
 
 @experiences_bp.route('/batch-experiences', methods=['POST'])
 @require_auth
@@ -709,55 +825,200 @@ def get_batch_experiences():
     if not experience_ids:
         return jsonify([]), 200
 
-    conn = psycopg2.connect(DATABASE_URL)
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                        SELECT *
-                        FROM experiences
-                        WHERE experience_id = ANY(%s)
-                        ORDER BY create_date DESC
-                        """, (experience_ids,))
+    conn = get_db_connection()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+                    SELECT *
+                    FROM experiences
+                    WHERE experience_id = ANY(%s)
+                    ORDER BY create_date DESC
+                    """, (experience_ids,))
 
-            experiences = cur.fetchall()
-            return jsonify([dict(experience) for experience in experiences]), 200
+        experiences = cur.fetchall()
+        return jsonify([dict(experience) for experience in experiences]), 200
 
-    finally:
-        conn.close()
 
-@experiences_bp.route('/top_experiences', methods=['GET'])
-def get_top_experiences():
-    """Retrieve the top 10 experiences most frequently added to trips.
+def load_top_experiences(conn, limit, bbox, window_days):
+    """Query the experiences most frequently added to trips (snapshot loader).
 
-    Fetches experiences ordered by how many times they've been added to trips,
-    including the count of trips each experience appears in. No authentication required.
+    All-time popularity reads the maintained experience_popularity.trip_count
+    (an index scan on idx_experience_popularity_trip_count, with ties sorted
+    by create_date incrementally), padded with the newest experiences that
+    were never added to a trip; a time window has to count trip_experiences
+    rows by added_date.
 
-    Returns:
-        tuple: JSON array of experience objects with trip_count, HTTP 200
+    Args:
+        conn: Pooled connection
+        limit (int): Number of experiences
+        bbox (tuple): (sw_lat, sw_lng, ne_lat, ne_lng) or None for everywhere
+        window_days (int): Only count trip additions from the last N days (None = all time)
     """
-    conn = psycopg2.connect(DATABASE_URL)
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    where_sql, where_params = 'TRUE', []
+    if bbox is not None:
+        where_sql, where_params = viewport_condition(*bbox)
+
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if window_days is None:
+            cur.execute("""
+                        (SELECT e.*, p.trip_count
+                         FROM experience_popularity p
+                                  JOIN experiences e ON e.experience_id = p.experience_id
+                         WHERE p.trip_count > 0
+                           AND {where}
+                         ORDER BY p.trip_count DESC, e.create_date DESC LIMIT %s)
+                        UNION ALL
+                        (SELECT e.*, 0
+                         FROM experiences e
+                         WHERE {where}
+                           AND NOT EXISTS (SELECT 1
+                                           FROM experience_popularity p
+                                           WHERE p.experience_id = e.experience_id
+                                             AND p.trip_count > 0)
+                         ORDER BY e.create_date DESC LIMIT %s)
+                        ORDER BY trip_count DESC, create_date DESC LIMIT %s
+                        """.format(where=where_sql),
+                        (*where_params, limit, *where_params, limit, limit))
+        else:
+            # Aliased apart from any trip_count column, so ORDER BY is never ambiguous
             cur.execute("""
                         SELECT e.*,
-                               COUNT(te.trip_id) as trip_count
+                               COUNT(te.trip_id) AS window_trip_count
                         FROM experiences e
                                  LEFT JOIN trip_experiences te ON e.experience_id = te.experience_id
+                                     AND te.added_date >= NOW() - %s * INTERVAL '1 day'
+                        WHERE {where}
                         GROUP BY e.experience_id
-                        ORDER BY trip_count DESC, e.create_date DESC LIMIT 6
-                        """)
+                        ORDER BY window_trip_count DESC, e.create_date DESC LIMIT %s
+                        """.format(where=where_sql),
+                        (window_days, *where_params, limit))
+            experiences = [dict(exp) for exp in cur.fetchall()]
+            # The response's trip_count is the count within the window
+            for exp in experiences:
+                exp['trip_count'] = exp.pop('window_trip_count')
+            return experiences
+        return [dict(exp) for exp in cur.fetchall()]
+
+
+TOP_EXPERIENCES = SnapshotCache('top_experiences', load_top_experiences, fresh_for=TOP_EXPERIENCES_FRESH_SECONDS)
+
+# Trip additions/removals change the counts; experience edits change the rows
+subscribe('trip', TOP_EXPERIENCES.mark_stale)
+subscribe('experience', TOP_EXPERIENCES.mark_stale)
+
+
+def parse_bbox(value):
+    """Parse "sw_lng,sw_lat,ne_lng,ne_lat", snapped outward to a BBOX_GRID grid.
+
+    Snapping keeps the number of distinct snapshots small for clients that
+    send slightly different map bounds.
+
+    Returns:
+        tuple: (sw_lat, sw_lng, ne_lat, ne_lng)
+
+    Raises:
+        ValueError: If the value is malformed or out of range
+    """
+    sw_lng, sw_lat, ne_lng, ne_lat = (float(part) for part in value.split(','))
+    if not (-90 <= sw_lat <= ne_lat <= 90 and -180 <= sw_lng <= 180 and -180 <= ne_lng <= 180):
+        raise ValueError('bbox out of range')
+    return (max(-90.0, math.floor(sw_lat / BBOX_GRID) * BBOX_GRID),
+            max(-180.0, math.floor(sw_lng / BBOX_GRID) * BBOX_GRID),
+            min(90.0, math.ceil(ne_lat / BBOX_GRID) * BBOX_GRID),
+            min(180.0, math.ceil(ne_lng / BBOX_GRID) * BBOX_GRID))
 
-            top_experiences = cur.fetchall()
 
-            # Convert Row objects to dictionaries for JSON serialization
-            return jsonify([dict(exp) for exp in top_experiences]), 200
+@experiences_bp.route('/top_experiences', methods=['GET'])
+def get_top_experiences():
+    """Retrieve the experiences most frequently added to trips.
+
+    Served from a precomputed snapshot per parameter set, refreshed in the
+    background once it is older than TOP_EXPERIENCES_FRESH_SECONDS or after a
+    trip/experience change, so requests never wait on the aggregate (except the
+    first one for a new parameter set). No authentication required.
+
+    Query Parameters:
+        limit (int): Number of experiences (default: 6, max: 50)
+        bbox (str): "sw_lng,sw_lat,ne_lng,ne_lat" to restrict to a region
+        window (int): Only count trips from the last N days (one of 1, 7, 30, 90, 365)
+
+    Returns:
+        tuple: JSON array of experience objects with trip_count, HTTP 200
+    """
+    limit = request.args.get('limit', TOP_EXPERIENCES_DEFAULT_LIMIT, type=int)
+    if limit < 1 or limit > TOP_EXPERIENCES_MAX_LIMIT:
+        limit = TOP_EXPERIENCES_DEFAULT_LIMIT
+
+    bbox = None
+    if request.args.get('bbox'):
+        try:
+            bbox = parse_bbox(request.args['bbox'])
+        except ValueError:
+            return jsonify({'error': 'bbox must be "sw_lng,sw_lat,ne_lng,ne_lat"'}), 400
+
+    window = request.args.get('window', type=int)
+    if request.args.get('window') and window not in TOP_EXPERIENCES_WINDOWS:
+        return jsonify({'error': f'window must be one of {sorted(TOP_EXPERIENCES_WINDOWS)}'}), 400
+
+    try:
+        top_experiences = TOP_EXPERIENCES.get((limit, bbox, window))
+        return jsonify(top_experiences), 200
 
     except Exception as error:
         print(f"Error fetching top experiences: {str(error)}")
         return jsonify({'error': 'Failed to fetch top experiences'}), 500
 
-    finally:
-        conn.close()
+
+@experiences_bp.route('/trending', methods=['GET'])
+@coalesced('experience:trending')
+def get_trending_experiences():
+    """Retrieve experiences with the most recent activity.
+
+    Ranked by an exponentially decayed score (half-life TREND_HALF_LIFE_DAYS)
+    of trip additions and ratings, maintained incrementally on each event, so
+    the query is an index scan no matter how much history there is.
+
+    Query Parameters:
+        limit (int): Number of experiences (default: 10, max: 50)
+        bbox (str): "sw_lng,sw_lat,ne_lng,ne_lat" to restrict to a region
+
+    Returns:
+        tuple: JSON {"half_life_days", "results": [experience + trend_score]}, HTTP 200
+    """
+    limit = request.args.get('limit', TRENDING_DEFAULT_LIMIT, type=int)
+    if limit < 1 or limit > TRENDING_MAX_LIMIT:
+        limit = TRENDING_DEFAULT_LIMIT
+
+    where_sql, where_params = 'TRUE', []
+    if request.args.get('bbox'):
+        try:
+            where_sql, where_params = viewport_condition(*parse_bbox(request.args['bbox']))
+        except ValueError:
+            return jsonify({'error': 'bbox must be "sw_lng,sw_lat,ne_lng,ne_lat"'}), 400
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                        SELECT e.*,
+                               {trend_score} AS trend_score
+                        FROM experience_popularity p
+                                 JOIN experiences e ON e.experience_id = p.experience_id
+                        WHERE p.trend_log IS NOT NULL
+                          AND {where}
+                        ORDER BY p.trend_log DESC NULLS LAST LIMIT %s
+                        """.format(trend_score=TREND_SCORE_SQL, where=where_sql),
+                        (*where_params, limit))
+            results = [dict(exp) for exp in cur.fetchall()]
+
+            return jsonify({
+                'half_life_days': TREND_HALF_LIFE_DAYS,
+                'results': results
+            }), 200
+
+    except Exception as error:
+        print(f"Error fetching trending experiences: {str(error)}")
+        return jsonify({'error': 'Failed to fetch trending experiences'}), 500
+
 
 # ==============================================================================
 # Location-based Search
@@ -773,7 +1034,18 @@ def get_experiences_by_location():
         "southWest": {"lat": float, "lng": float}
     }
 
-    Returns: Array of Experience objects within bounds (max 200)
+    A viewport with southWest.lng > northEast.lng crosses the antimeridian
+    and is matched as two boxes.
+
+    Optional "zoom": int (0-22) switches to clustering mode: experiences are
+    bucketed into a grid sized for that zoom level and returned as
+    {"zoom", "cell_size", "clusters": [{"lat", "lng", "count", "representatives"}]},
+    where representatives are the top-rated experiences in the cell.
+
+    Optional "photo_size": thumbnail, medium or original (default) - size
+    returned as each photo's photo_url; map popups should ask for thumbnail.
+
+    Returns: Array of Experience objects within bounds (max 200), or clusters
     """
     data = request.get_json()
 
@@ -805,13 +1077,28 @@ def get_experiences_by_location():
     except (TypeError, ValueError):
         return jsonify({'error': 'Coordinates must be numeric'}), 400
 
-    # ⭐ PHASE 1 SAFEGUARD: Prevent massive area searches
-    lat_span = abs(ne_lat - sw_lat)
-    lng_span = abs(ne_lng - sw_lng)
-    if lat_span > MAX_BOX_SIZE or lng_span > MAX_BOX_SIZE:
+    zoom = data.get('zoom')
+    if zoom is not None:
+        if isinstance(zoom, bool) or not isinstance(zoom, int) or not 0 <= zoom <= MAX_ZOOM:
+            return jsonify({'error': f'zoom must be an integer between 0 and {MAX_ZOOM}'}), 400
+
+    try:
+        photo_size = parse_photo_size(data.get('photo_size'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Envelope intersection against the GIST index (split at the antimeridian)
+    in_viewport_sql, in_viewport_params = viewport_condition(sw_lat, sw_lng, ne_lat, ne_lng)
+
+    if zoom is not None:
+        return get_experience_clusters(zoom, sw_lat, sw_lng, ne_lat, ne_lng,
+                                       in_viewport_sql, in_viewport_params)
+
+    # Marker mode on a huge box would rank every experience in it; cluster instead
+    if abs(ne_lat - sw_lat) > MAX_BOX_SIZE or lng_span(sw_lng, ne_lng) > MAX_BOX_SIZE:
         return jsonify({
             'error': 'Search area too large',
-            'message': f'Please zoom in. Maximum area: {MAX_BOX_SIZE}° x {MAX_BOX_SIZE}°'
+            'message': f'Please zoom in or send "zoom" for clusters. Maximum area: {MAX_BOX_SIZE}° x {MAX_BOX_SIZE}°'
         }), 400
 
     # Database query
@@ -821,38 +1108,23 @@ def get_experiences_by_location():
             cur.execute("""
                 SELECT
                     e.*,
-                    ARRAY_AGG(DISTINCT k.name) FILTER (WHERE k.name IS NOT NULL) AS keywords,
-                    COALESCE(ROUND(AVG(r.rating)::numeric, 2), 0.0) AS average_rating,
-                    COUNT(DISTINCT r.user_id) AS rating_count,
+                    COALESCE(rs.average_rating, 0.0) AS average_rating,
+                    COALESCE(rs.rating_count, 0) AS rating_count,
                     owner_rating.rating AS owner_rating
                 FROM experiences e
-                    LEFT JOIN experience_keywords ek ON e.experience_id = ek.experience_id
-                    LEFT JOIN keywords k ON ek.keyword_id = k.keyword_id
-                    LEFT JOIN experience_ratings r ON e.experience_id = r.experience_id
+                    LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
                     LEFT JOIN experience_ratings owner_rating
                         ON e.experience_id = owner_rating.experience_id
                         AND e.user_id = owner_rating.user_id
-                WHERE
-                    e.latitude BETWEEN %s AND %s
-                    AND e.longitude BETWEEN %s AND %s
-                GROUP BY e.experience_id, owner_rating.rating
+                WHERE {in_viewport}
                 ORDER BY average_rating DESC, e.create_date DESC
                 LIMIT %s
-            """, (sw_lat, ne_lat, sw_lng, ne_lng, RESULTS_LIMIT))
+            """.format(in_viewport=in_viewport_sql), (*in_viewport_params, RESULTS_LIMIT))
 
             experiences = cur.fetchall()
 
-            # Fetch photos for each experience (Phase 1: simple loop)
-            # TODO Phase 2: Optimize with bulk fetch
-            for exp in experiences:
-                cur.execute("""
-                    SELECT photo_id, photo_url, caption, upload_date
-                    FROM experience_photos
-                    WHERE experience_id = %s
-                    ORDER BY upload_date
-                """, (exp['experience_id'],))
-                photos = cur.fetchall()
-                exp['photos'] = photos if photos else []
+            # Photos and keywords for every marker in one query each
+            hydrate_experiences(cur, experiences, photos=True, keywords=True, photo_size=photo_size)
 
             # Convert to proper JSON format
             result_experiences = []
@@ -874,8 +1146,107 @@ def get_experiences_by_location():
         print(f"Location search error: {e}")
         traceback.print_exc()
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
-    finally:
-        conn.close()
+
+
+def get_experience_clusters(zoom, sw_lat, sw_lng, ne_lat, ne_lng, in_viewport_sql, in_viewport_params):
+    """Grid-cluster the experiences inside a viewport (clustering mode of /location).
+
+    Points are bucketed with floor(coord / cell_size) in the database, so the
+    payload size depends on the number of cells (capped by CLUSTER_MAX_CELLS),
+    not on how many experiences fall inside the viewport.
+    """
+    cell_size = cluster_cell_size(zoom, sw_lat, sw_lng, ne_lat, ne_lng,
+                                  CLUSTER_CELLS_PER_TILE, CLUSTER_MAX_CELLS)
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                WITH points AS (
+                    SELECT
+                        e.experience_id,
+                        e.create_date,
+                        ST_X(e.location::geometry) AS lng,
+                        ST_Y(e.location::geometry) AS lat,
+                        COALESCE(rs.average_rating, 0.0) AS average_rating
+                    FROM experiences e
+                        LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
+                    WHERE {in_viewport}
+                ),
+                cells AS (
+                    SELECT
+                        COUNT(*) AS count,
+                        AVG(lat) AS lat,
+                        AVG(lng) AS lng,
+                        (ARRAY_AGG(experience_id ORDER BY average_rating DESC, create_date DESC))[1:%s] AS top_ids
+                    FROM points
+                    GROUP BY FLOOR(lng / %s), FLOOR(lat / %s)
+                )
+                SELECT
+                    c.count,
+                    c.lat,
+                    c.lng,
+                    (SELECT json_agg(json_build_object(
+                                'experience_id', e.experience_id,
+                                'title', e.title,
+                                'latitude', e.latitude,
+                                'longitude', e.longitude,
+                                'average_rating', COALESCE(rs.average_rating, 0.0)
+                            ) ORDER BY r.ord)
+                     FROM unnest(c.top_ids) WITH ORDINALITY AS r(experience_id, ord)
+                         JOIN experiences e ON e.experience_id = r.experience_id
+                         LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
+                    ) AS representatives
+                FROM cells c
+                ORDER BY c.count DESC
+            """.format(in_viewport=in_viewport_sql),
+                (*in_viewport_params, CLUSTER_REPRESENTATIVES, cell_size, cell_size))
+
+            clusters = [dict(cluster) for cluster in cur.fetchall()]
+
+            return jsonify({
+                'zoom': zoom,
+                'cell_size': cell_size,
+                'count': len(clusters),
+                'clusters': clusters
+            }), 200
+
+    except Exception as e:
+        print(f"Cluster search error: {e}")
+        traceback.print_exc()
+        return jsonify({'error': 'Database error', 'message': str(e)}), 500
+
+
+@experiences_bp.route('/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_experience_tile(z, x, y):
+    """
+    Render experience markers as a Mapbox Vector Tile (XYZ scheme).
+
+    Layer "experiences", one point per experience with properties:
+    experience_id, title, average_rating, thumbnail_url.
+
+    Tiles are public and sent with Cache-Control + ETag so browsers and CDNs
+    can cache them; a matching If-None-Match returns 304.
+    """
+    if not tile_in_range(z, x, y, MAX_ZOOM):
+        return jsonify({'error': 'Tile out of range'}), 404
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            tile = render_experience_tile(cur, z, x, y, TILE_FEATURE_LIMIT)
+
+        response = make_response(tile)
+        response.mimetype = 'application/vnd.mapbox-vector-tile'
+        response.cache_control.public = True
+        response.cache_control.max_age = TILE_CACHE_MAX_AGE
+        response.set_etag(hashlib.sha1(tile).hexdigest())
+        return response.make_conditional(request)
+
+    except Exception as e:
+        print(f"Tile render error: {e}")
+        traceback.print_exc()
+        return jsonify({'error': 'Database error', 'message': str(e)}), 500
 
 
 # ==============================================================================
@@ -896,13 +1267,12 @@ def rate_experience():
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO experience_ratings (experience_id, user_id, rating)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (experience_id, user_id)
-                DO UPDATE SET rating = EXCLUDED.rating, updated_at = NOW()
-            """, (experience_id, user_id, rating))
-        conn.commit()
-        return jsonify({"status": "success", "message": "Experience rated"}), 200
-    finally:
-        conn.close()
+            record_rating(cur, experience_id, user_id, rating)
+            event = notify_change(cur, 'experience', [experience_id], 'rate',
+                                  related={'trip': trip_ids_for_experience(cur, experience_id)})
+    except errors.ForeignKeyViolation:
+        conn.rollback()
+        return jsonify({'error': 'Experience not found'}), 404
+    conn.commit()
+    apply_change(event)
+    return jsonify({"status": "success", "message": "Experience rated"}), 200
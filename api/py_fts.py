@@ -0,0 +1,86 @@
+import re
+import sys
+
+# psycopg2-binary==2.9.11
+import psycopg2
+
+# ==============================================================================
+# Full-text search document maintenance
+# ==============================================================================
+# Weighted search document per experience: title (A), keywords (B), description (C).
+# Stored in experience_search (GIN indexed) so `SELECT e.*` responses stay unchanged.
+_UPSERT_SEARCH_DOCUMENT_SQL = """
+    INSERT INTO experience_search (experience_id, search_vector)
+    SELECT e.experience_id,
+           setweight(to_tsvector('english', e.title), 'A') ||
+           setweight(to_tsvector('english', COALESCE(kw.names, '')), 'B') ||
+           setweight(to_tsvector('english', e.description), 'C')
+    FROM experiences e
+        LEFT JOIN LATERAL (
+            SELECT string_agg(k.name, ' ') AS names
+            FROM experience_keywords ek
+                JOIN keywords k ON ek.keyword_id = k.keyword_id
+            WHERE ek.experience_id = e.experience_id
+        ) kw ON TRUE
+    {where}
+    ON CONFLICT (experience_id) DO UPDATE SET search_vector = EXCLUDED.search_vector
+"""
+
+# Words (letters/digits) in a user query; everything else is treated as a separator
+_QUERY_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def refresh_search_vector(cur, experience_id):
+    """Recompute the search document for one experience.
+
+    Must run in the same transaction as the title/description/keyword
+    changes so the index never disagrees with the row.
+    """
+    cur.execute(_UPSERT_SEARCH_DOCUMENT_SQL.format(where="WHERE e.experience_id = %s"),
+                (experience_id,))
+
+
+def refresh_search_vectors(cur, experience_ids):
+    """Recompute the search documents of many experiences in one statement."""
+    cur.execute(_UPSERT_SEARCH_DOCUMENT_SQL.format(where="WHERE e.experience_id = ANY(%s)"),
+                (list(experience_ids),))
+
+
+def rebuild_search_vectors(conn):
+    """Recompute search documents for every experience (backfill / repair)."""
+    with conn.cursor() as cur:
+        cur.execute(_UPSERT_SEARCH_DOCUMENT_SQL.format(where=""))
+        count = cur.rowcount
+    conn.commit()
+    return count
+
+
+def build_tsquery(query):
+    """Turn free text into a prefix-matching to_tsquery() expression.
+
+    Every word must match (AND), and each word also matches as a prefix so
+    partially typed terms ("hik") still find "hiking".
+
+    Returns:
+        str | None: tsquery text, or None if the query contains no words
+    """
+    tokens = _QUERY_TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    return ' & '.join(f"{token}:*" for token in tokens)
+
+
+if __name__ == "__main__":
+    # Usage: python -m api.py_fts   (rebuilds experience_search from scratch)
+    from api.py_db import DATABASE_URL
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        rebuilt = rebuild_search_vectors(conn)
+        print(f"✓ Rebuilt search documents for {rebuilt} experiences")
+    except Exception as e:
+        conn.rollback()
+        print(f"✗ Error rebuilding search documents: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
@@ -0,0 +1,119 @@
+# ==============================================================================
+# Viewport helpers
+# ==============================================================================
+# Map viewports are lon/lat rectangles, so they are matched against the planar
+# geometry view of experiences.location. idx_experiences_location_geom is a GIST
+# expression index on exactly that expression, which lets `&&` use an index
+# scan instead of filtering the plain latitude/longitude columns row by row.
+LOCATION_GEOMETRY_SQL = "e.location::geometry"
+VIEWPORT_INDEX_NAME = "idx_experiences_location_geom"
+
+
+def split_antimeridian(sw_lng, ne_lng):
+    """Split a longitude span into one or two non-wrapping [west, east] ranges.
+
+    A viewport whose west edge is east of its east edge (sw_lng > ne_lng)
+    crosses the antimeridian and becomes [sw_lng, 180] + [-180, ne_lng].
+    """
+    if sw_lng <= ne_lng:
+        return [(sw_lng, ne_lng)]
+    return [(sw_lng, 180.0), (-180.0, ne_lng)]
+
+
+def lng_span(sw_lng, ne_lng):
+    """Width of a viewport in degrees of longitude, accounting for wrap-around."""
+    return sum(east - west for west, east in split_antimeridian(sw_lng, ne_lng))
+
+
+def viewport_condition(sw_lat, sw_lng, ne_lat, ne_lng, column_sql=LOCATION_GEOMETRY_SQL):
+    """Build an index-backed WHERE fragment matching points inside a viewport.
+
+    Returns:
+        tuple: (sql_fragment, params)
+    """
+    south, north = min(sw_lat, ne_lat), max(sw_lat, ne_lat)
+    clauses = []
+    params = []
+    for west, east in split_antimeridian(sw_lng, ne_lng):
+        clauses.append(f"{column_sql} && ST_MakeEnvelope(%s, %s, %s, %s, 4326)")
+        params.extend([west, south, east, north])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def cluster_cell_size(zoom, sw_lat, sw_lng, ne_lat, ne_lng, cells_per_tile, max_cells):
+    """Grid cell size (degrees) for clustering a viewport at a web-map zoom level.
+
+    A zoom-z world is 2**z tiles wide; each tile is divided into cells_per_tile
+    cells per side. The size is doubled until the viewport covers at most
+    max_cells cells, which bounds the response regardless of zoom and box size.
+    The size always divides 360 evenly, so no cell straddles the antimeridian.
+    """
+    cell = 360.0 / (2 ** zoom * cells_per_tile)
+    lat_extent = abs(ne_lat - sw_lat)
+    lng_extent = lng_span(sw_lng, ne_lng)
+    while cell < 360.0 and (lng_extent / cell + 1) * (lat_extent / cell + 1) > max_cells:
+        cell *= 2
+    return cell
+
+
+# ==============================================================================
+# Vector tiles
+# ==============================================================================
+# Marker tiles are rendered by PostGIS (ST_AsMVT) in Web Mercator tile space.
+# The tile envelope is transformed back to lon/lat so the `&&` filter still runs
+# against idx_experiences_location_geom.
+TILE_LAYER_NAME = "experiences"
+TILE_EXTENT = 4096  # Tile coordinate space (MVT default)
+TILE_BUFFER = 64  # Extra tile units kept around the edge so markers aren't clipped
+
+_EXPERIENCE_TILE_SQL = f"""
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS tile,
+               ST_Transform(
+                   ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => {TILE_BUFFER / TILE_EXTENT}),
+                   4326
+               ) AS search
+    ),
+    features AS (
+        SELECT
+            ST_AsMVTGeom(ST_Transform({LOCATION_GEOMETRY_SQL}, 3857), b.tile,
+                         {TILE_EXTENT}, {TILE_BUFFER}, true) AS geom,
+            e.experience_id,
+            e.title,
+            COALESCE(rs.average_rating, 0.0)::double precision AS average_rating,
+            (SELECT COALESCE(p.thumbnail_url, p.photo_url)
+             FROM experience_photos p
+             WHERE p.experience_id = e.experience_id
+             ORDER BY p.upload_date
+             LIMIT 1) AS thumbnail_url
+        FROM experiences e
+            CROSS JOIN bounds b
+            LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
+        WHERE {LOCATION_GEOMETRY_SQL} && b.search
+        ORDER BY average_rating DESC, e.create_date DESC
+        LIMIT %(limit)s
+    )
+    SELECT ST_AsMVT(features.*, '{TILE_LAYER_NAME}', {TILE_EXTENT}, 'geom') AS tile
+    FROM features
+"""
+
+
+def tile_in_range(z, x, y, max_zoom):
+    """Check that z/x/y addresses an existing XYZ tile."""
+    return 0 <= z <= max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def render_experience_tile(cur, z, x, y, limit):
+    """Render one Mapbox Vector Tile of experience markers.
+
+    Each feature carries experience_id, title, average_rating and
+    thumbnail_url (first uploaded photo, its thumbnail rendition once
+    made). At most `limit` features are included, best rated first.
+
+    Returns:
+        bytes: The encoded tile (empty when no experiences fall inside it)
+    """
+    cur.execute(_EXPERIENCE_TILE_SQL, {'z': z, 'x': x, 'y': y, 'limit': limit})
+    row = cur.fetchone()
+    tile = row['tile'] if isinstance(row, dict) else row[0]
+    return bytes(tile) if tile is not None else b''
@@ -1,14 +1,36 @@
+import os
+
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+from api import py_autocomplete, py_cache, py_db, py_events, py_singleflight, py_storage_gc
 from api.py_test import test_bp
-from api.py_experiences import experiences_bp
+from api.py_experiences import TOP_EXPERIENCES, experiences_bp
 from api.py_trips import trips_bp
 from api.py_search import search_bp
 from api.py_keywords import keywords_bp
 
+BACKGROUND_WORKERS = os.getenv('BACKGROUND_WORKERS', '0') == '1'
+
 app = Flask(__name__)
 CORS(app)
 
+# Pooled database connections, checked out per request and returned on teardown
+py_db.init_app(app)
+
+# Background threads only run in a long-lived server (BACKGROUND_WORKERS=1).
+# As a serverless function the process is frozen between requests, so they
+# stay off: autocomplete is served from SQL, caches rely on their TTLs, and
+# the storage GC runs from cron (`python -m api.py_storage_gc --sweep`).
+if BACKGROUND_WORKERS:
+    # In-memory autocomplete index, loaded in the background and reloaded periodically
+    py_autocomplete.start_suggestion_loader()
+
+    # Cross-worker cache invalidation (LISTEN/NOTIFY)
+    py_events.start_listener()
+
+    # Deletes queued photo files from storage and sweeps orphaned ones
+    py_storage_gc.start_storage_gc()
+
 # Register blueprint
 app.register_blueprint(test_bp, url_prefix='/py/test')
 app.register_blueprint(experiences_bp, url_prefix='/py/experiences')
@@ -19,6 +41,17 @@ app.register_blueprint(keywords_bp, url_prefix='/py/keywords')
 # Photo Configs
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+@app.route('/py/stats', methods=['GET'])
+def stats():
+    """Runtime counters for this worker (connection pool, caches, request coalescing)."""
+    cache = py_cache.get_cache()
+    return jsonify({
+        "db_pool": py_db.get_pool().stats(),
+        "cache": cache.stats() if cache is not None else None,
+        "singleflight": py_singleflight.singleflight_stats(),
+        "snapshots": {"top_experiences": TOP_EXPERIENCES.stats()},
+    })
+
 @app.route('/py', methods=['GET'])
 def root():
     return jsonify({"message": "Flask Index Root",
@@ -1,6 +1,7 @@
 import json
 import os
 import re
+import threading
 from flask import Blueprint, jsonify, request
 from dotenv import load_dotenv
 
@@ -224,6 +225,148 @@ def _extract_llm_keywords_anthropic(title: str, description: str):
     return cleaned
 
 
+# ==============================================================================
+# Keyword linking (shared by create/update and the loaders)
+# ==============================================================================
+# Process-level name -> keyword_id cache. Only ids read back from committed
+# rows are cached (never ids inserted by the current, possibly rolled back,
+# transaction), and keyword rows are never deleted, so entries cannot go stale.
+KEYWORD_ID_CACHE_MAX = 10000
+
+_keyword_ids = {}
+_keyword_ids_lock = threading.Lock()
+
+
+def _clean_keyword_names(names):
+    """Drop blanks and duplicates, keeping first-seen order."""
+    seen = set()
+    cleaned = []
+    for name in names or []:
+        if isinstance(name, str) and name.strip() and name not in seen:
+            seen.add(name)
+            cleaned.append(name)
+    return cleaned
+
+
+def resolve_keyword_ids(cur, names):
+    """Map keyword names to ids, creating missing keywords in one statement.
+
+    Returns:
+        dict: name -> keyword_id
+    """
+    with _keyword_ids_lock:
+        ids = {name: _keyword_ids[name] for name in names if name in _keyword_ids}
+    missing = [name for name in names if name not in ids]
+    if not missing:
+        return ids
+
+    with cur.connection.cursor() as kw_cur:
+        # The outer SELECT does not see rows inserted by the CTE, so each name
+        # comes back exactly once: from "created" if new, from keywords otherwise
+        kw_cur.execute("""
+            WITH input(name) AS (
+                SELECT DISTINCT unnest(%s::text[])
+            ),
+            created AS (
+                INSERT INTO keywords (name)
+                SELECT name FROM input
+                ON CONFLICT (name) DO NOTHING
+                RETURNING keyword_id, name
+            )
+            SELECT keyword_id, name, TRUE AS created FROM created
+            UNION ALL
+            SELECT k.keyword_id, k.name, FALSE FROM keywords k JOIN input i ON k.name = i.name
+        """, (missing,))
+        rows = kw_cur.fetchall()
+
+        # A concurrent transaction may have committed one of the names after
+        # this statement's snapshot; a fresh statement sees it
+        returned = {name for _, name, _ in rows}
+        if len(returned) < len(set(missing)):
+            kw_cur.execute("""
+                SELECT keyword_id, name, FALSE FROM keywords WHERE name = ANY(%s)
+            """, ([name for name in missing if name not in returned],))
+            rows.extend(kw_cur.fetchall())
+
+    existing = {}
+    for keyword_id, name, created in rows:
+        ids[name] = keyword_id
+        if not created:
+            existing[name] = keyword_id
+    with _keyword_ids_lock:
+        if len(_keyword_ids) + len(existing) > KEYWORD_ID_CACHE_MAX:
+            _keyword_ids.clear()
+        _keyword_ids.update(existing)
+    return ids
+
+
+def link_keywords(cur, experience_id, names):
+    """Make an experience's keyword links exactly match names.
+
+    Keywords are resolved with at most one statement (none when all are
+    cached) and links are diffed in one more: only links that changed are
+    inserted or deleted, and the usage_count of their keywords adjusted.
+    Runs inside the caller's transaction.
+
+    Args:
+        cur: Open cursor (any cursor factory)
+        experience_id (int): Experience to link
+        names (list[str]): Desired keyword names
+
+    Returns:
+        tuple: (added_names, removed_names) as sets
+    """
+    names = _clean_keyword_names(names)
+    keyword_ids = list(resolve_keyword_ids(cur, names).values()) if names else []
+
+    with cur.connection.cursor() as link_cur:
+        link_cur.execute("""
+            WITH desired(keyword_id) AS (
+                SELECT unnest(%(keyword_ids)s::int[])
+            ),
+            removed AS (
+                DELETE FROM experience_keywords
+                WHERE experience_id = %(experience_id)s
+                  AND keyword_id <> ALL(%(keyword_ids)s::int[])
+                RETURNING keyword_id
+            ),
+            added AS (
+                INSERT INTO experience_keywords (experience_id, keyword_id)
+                SELECT %(experience_id)s, keyword_id FROM desired
+                ON CONFLICT DO NOTHING
+                RETURNING keyword_id
+            ),
+            changed AS (
+                SELECT keyword_id, 1 AS delta FROM added
+                UNION ALL
+                SELECT keyword_id, -1 FROM removed
+            ),
+            -- Counter rows are locked in keyword_id order, so concurrent writers cannot deadlock
+            locked AS (
+                SELECT k.keyword_id
+                FROM keywords k
+                    JOIN changed c USING (keyword_id)
+                ORDER BY k.keyword_id
+                FOR NO KEY UPDATE OF k
+            ),
+            counted AS (
+                UPDATE keywords k
+                SET usage_count = GREATEST(k.usage_count + c.delta, 0)
+                FROM locked l
+                    JOIN changed c USING (keyword_id)
+                WHERE k.keyword_id = l.keyword_id
+            )
+            SELECT TRUE AS is_added, k.name FROM added JOIN keywords k USING (keyword_id)
+            UNION ALL
+            SELECT FALSE, k.name FROM removed JOIN keywords k USING (keyword_id)
+        """, {'experience_id': experience_id, 'keyword_ids': keyword_ids})
+        rows = link_cur.fetchall()
+
+    added = {name for is_added, name in rows if is_added}
+    removed = {name for is_added, name in rows if not is_added}
+    return added, removed
+
+
 @keywords_bp.route('/suggest', methods=['POST'])
 def suggest_keywords():
     """Suggest up to 5 keywords from provided title and description.
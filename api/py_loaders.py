@@ -0,0 +1,137 @@
+from collections import defaultdict
+
+# psycopg2-binary==2.9.11
+from psycopg2.extras import RealDictCursor
+
+# ==============================================================================
+# Batch loaders
+# ==============================================================================
+# Each loader fetches one kind of child data for a whole page of experiences in
+# a single ANY(%s) query, so list endpoints issue a constant number of queries
+# no matter how many rows they return.
+
+
+# Photo URL returned as photo_url for each ?photo_size= (derivatives fall back
+# to the original until they exist)
+PHOTO_SIZE_SQL = {
+    'thumbnail': 'COALESCE(p.thumbnail_url, p.photo_url)',
+    'medium': 'COALESCE(p.medium_url, p.photo_url)',
+    'original': 'p.photo_url',
+}
+DEFAULT_PHOTO_SIZE = 'original'
+
+
+def photo_columns_sql(photo_size=DEFAULT_PHOTO_SIZE):
+    """Select list for experience_photos (aliased p) with every size's URL."""
+    return f"""p.photo_id, {PHOTO_SIZE_SQL[photo_size]} AS photo_url,
+               {PHOTO_SIZE_SQL['thumbnail']} AS thumbnail_url, {PHOTO_SIZE_SQL['medium']} AS medium_url,
+               p.photo_url AS original_url, p.caption, p.upload_date"""
+
+
+def _ids(experience_ids):
+    return list({int(exp_id) for exp_id in experience_ids})
+
+
+def fetch_photos(cur, experience_ids, photo_size=DEFAULT_PHOTO_SIZE):
+    """Fetch photo metadata for many experiences in one query.
+
+    Returns:
+        dict: experience_id -> list of photo dicts, each in upload order, with
+              photo_url in the requested size
+    """
+    photos = defaultdict(list)
+    ids = _ids(experience_ids)
+    if not ids:
+        return photos
+
+    with cur.connection.cursor(cursor_factory=RealDictCursor) as batch_cur:
+        batch_cur.execute("""
+            SELECT p.experience_id, {columns}
+            FROM experience_photos p
+            WHERE p.experience_id = ANY(%s)
+            ORDER BY p.experience_id, p.upload_date
+        """.format(columns=photo_columns_sql(photo_size)), (ids,))
+        for row in batch_cur.fetchall():
+            photos[row.pop('experience_id')].append(row)
+    return photos
+
+
+def fetch_keywords(cur, experience_ids):
+    """Fetch keyword names for many experiences in one query.
+
+    Returns:
+        dict: experience_id -> alphabetically sorted list of keyword names
+    """
+    ids = _ids(experience_ids)
+    if not ids:
+        return {}
+
+    with cur.connection.cursor(cursor_factory=RealDictCursor) as batch_cur:
+        batch_cur.execute("""
+            SELECT ek.experience_id, ARRAY_AGG(k.name ORDER BY k.name) AS keywords
+            FROM experience_keywords ek
+                JOIN keywords k ON ek.keyword_id = k.keyword_id
+            WHERE ek.experience_id = ANY(%s)
+            GROUP BY ek.experience_id
+        """, (ids,))
+        return {row['experience_id']: row['keywords'] for row in batch_cur.fetchall()}
+
+
+def fetch_ratings(cur, experience_ids):
+    """Fetch average rating and rating count for many experiences in one query.
+
+    Returns:
+        dict: experience_id -> {"average_rating": Decimal, "rating_count": int}
+    """
+    ids = _ids(experience_ids)
+    if not ids:
+        return {}
+
+    with cur.connection.cursor(cursor_factory=RealDictCursor) as batch_cur:
+        batch_cur.execute("""
+            SELECT experience_id, average_rating, rating_count
+            FROM experience_rating_stats
+            WHERE experience_id = ANY(%s)
+        """, (ids,))
+        return {row.pop('experience_id'): row for row in batch_cur.fetchall()}
+
+
+def hydrate_experiences(cur, experiences, photos=False, keywords=False, ratings=False,
+                        photo_size=DEFAULT_PHOTO_SIZE):
+    """Attach photos / keywords / ratings to experience rows in place.
+
+    Experiences without photos get an empty list, without keywords get None
+    (matching the old ARRAY_AGG ... FILTER behaviour), and without ratings
+    get 0.0 / 0.
+
+    Args:
+        cur: Open cursor on the request's connection
+        experiences (list[dict]): Rows with an experience_id key
+        photos (bool): Attach ``photos``
+        keywords (bool): Attach ``keywords``
+        ratings (bool): Attach ``average_rating`` and ``rating_count``
+        photo_size (str): Size returned as each photo's ``photo_url`` (see PHOTO_SIZE_SQL)
+
+    Returns:
+        list[dict]: The same rows, for chaining
+    """
+    ids = [exp['experience_id'] for exp in experiences]
+
+    if photos:
+        photo_map = fetch_photos(cur, ids, photo_size)
+        for exp in experiences:
+            exp['photos'] = photo_map.get(exp['experience_id'], [])
+
+    if keywords:
+        keyword_map = fetch_keywords(cur, ids)
+        for exp in experiences:
+            exp['keywords'] = keyword_map.get(exp['experience_id'])
+
+    if ratings:
+        rating_map = fetch_ratings(cur, ids)
+        for exp in experiences:
+            stats = rating_map.get(exp['experience_id'], {})
+            exp['average_rating'] = stats.get('average_rating', 0.0)
+            exp['rating_count'] = stats.get('rating_count', 0)
+
+    return experiences
@@ -0,0 +1,117 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+# ==============================================================================
+# Keyset (cursor) pagination helpers
+# ==============================================================================
+# A sort spec is a list of (sql_expression, direction, row_key) tuples, e.g.
+#     [('e.create_date', 'DESC', 'create_date'), ('e.experience_id', 'DESC', 'experience_id')]
+# The last entry must be a unique column so every row has a distinct position.
+# Cursors are opaque to clients: base64-encoded JSON of the last row's sort key.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded."""
+
+
+def _to_json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(row, sort):
+    """Build the cursor that resumes after row."""
+    values = [_to_json_value(row[row_key]) for _, _, row_key in sort]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Decode a cursor into the list of sort-key values it encodes.
+
+    Values come back as JSON scalars (timestamps/numerics as strings) and are
+    passed to Postgres as literals, which coerces them to the column types.
+
+    Raises:
+        InvalidCursor: If the token is malformed or does not match the sort spec
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Malformed cursor: {e}")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise InvalidCursor("Cursor does not match this endpoint's sort order")
+    if any(v is None or isinstance(v, (list, dict)) for v in values):
+        raise InvalidCursor("Cursor contains invalid values")
+    return values
+
+
+def order_by_clause(sort):
+    """Render the ORDER BY list for a sort spec."""
+    return ', '.join(f"{expr} {direction}" for expr, direction, _ in sort)
+
+
+def keyset_condition(sort, values):
+    """Build a WHERE fragment selecting rows strictly after the cursor position.
+
+    When every key sorts the same direction this is a single row comparison,
+    which Postgres can satisfy with a matching composite index. Mixed
+    directions expand to the equivalent OR-chain.
+
+    Returns:
+        tuple: (sql_fragment, params)
+    """
+    directions = {direction for _, direction, _ in sort}
+    if len(directions) == 1:
+        op = '<' if directions.pop() == 'DESC' else '>'
+        columns = ', '.join(expr for expr, _, _ in sort)
+        placeholders = ', '.join(['%s'] * len(sort))
+        return f"({columns}) {op} ({placeholders})", list(values)
+
+    clauses = []
+    params = []
+    for i, (expr, direction, _) in enumerate(sort):
+        parts = [f"{prev_expr} = %s" for prev_expr, _, _ in sort[:i]]
+        parts.append(f"{expr} {'<' if direction == 'DESC' else '>'} %s")
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i])
+        params.append(values[i])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def cursor_condition(token, sort):
+    """Turn an optional client cursor into a keyset WHERE fragment.
+
+    Returns:
+        tuple: (sql_fragment, params); ('TRUE', []) when token is empty
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    if not token:
+        return 'TRUE', []
+    return keyset_condition(sort, decode_cursor(token, sort))
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Clamp a requested page size the same way the search endpoints do."""
+    if value is None or value < 1 or value > MAX_PAGE_SIZE:
+        return default
+    return value
+
+
+def next_cursor(rows, limit, sort):
+    """Return the cursor for the page after rows, or None on the last page."""
+    if len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1], sort)
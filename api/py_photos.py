@@ -0,0 +1,759 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import quote, unquote, urlparse
+
+# psycopg2-binary==2.9.11
+from psycopg2.extras import RealDictCursor
+# firebase-admin==6.4.0
+from firebase_admin import storage
+
+from api.py_db import pooled_connection
+from api.py_events import apply_change, notify_change
+
+# ==============================================================================
+# Photo ingestion pipeline
+# ==============================================================================
+# Photos are not uploaded inside the request's database transaction. The
+# request spools each file to a temporary file and records a 'pending' row in
+# photo_uploads alongside the experience; once that commits, the files are
+# uploaded to Firebase in parallel on a bounded thread pool (no transaction is
+# open meanwhile), then every stored photo gets its experience_photos row and
+# its upload is marked 'done' (or 'failed' with the error) in one transaction.
+#
+# All of it finishes before the response is sent: the API runs as a
+# serverless function, which is frozen or recycled once it has answered, so
+# nothing may be left running behind a request. An upload still pending after
+# PHOTO_UPLOAD_STALE_SECONDS (the function died mid-request) is reported as
+# failed.
+#
+# Uploaded bytes are content-addressed: stored once at photos/<sha256>.<ext>
+# and recorded in photo_blobs with a ref_count of the experience_photos rows
+# using them. A photo whose hash is already known skips the upload and the
+# renditions entirely. Releasing the last reference only stamps released_at;
+# the storage GC deletes blobs that stayed unreferenced past its grace period,
+# so a concurrent upload of the same bytes can still pick the blob up again.
+PHOTO_UPLOAD_WORKERS = int(os.getenv('PHOTO_UPLOAD_WORKERS', '4'))
+PHOTO_UPLOAD_STALE_SECONDS = int(os.getenv('PHOTO_UPLOAD_STALE_SECONDS', '900'))
+PHOTO_SPOOL_MEMORY_BYTES = 1024 * 1024  # Larger uploads spill to disk until stored
+PHOTO_BLOB_PREFIX = 'photos/'
+_COPY_CHUNK_BYTES = 64 * 1024
+
+# Derivatives: longest edge in pixels per size, stored as WebP next to the original
+PHOTO_DERIVATIVES = {'thumbnail': 320, 'medium': 1280}
+PHOTO_DERIVATIVE_QUALITY = int(os.getenv('PHOTO_DERIVATIVE_QUALITY', '80'))
+
+# Direct-to-storage uploads
+PHOTO_UPLOAD_URL_SECONDS = int(os.getenv('PHOTO_UPLOAD_URL_SECONDS', '600'))  # Signed URL lifetime
+PHOTO_MAX_BYTES = 16 * 1024 * 1024  # Same limit as multipart uploads (MAX_CONTENT_LENGTH)
+PHOTO_MAX_PER_REQUEST = 20
+# Set (e.g. "localhost:9199") to run against the Firebase Storage emulator, which
+# takes unsigned uploads; google-cloud-storage reads STORAGE_EMULATOR_HOST itself
+STORAGE_EMULATOR_HOST = os.getenv('STORAGE_EMULATOR_HOST') or os.getenv('FIREBASE_STORAGE_EMULATOR_HOST')
+if STORAGE_EMULATOR_HOST:
+    if not STORAGE_EMULATOR_HOST.startswith('http'):
+        STORAGE_EMULATOR_HOST = f'http://{STORAGE_EMULATOR_HOST}'
+    os.environ.setdefault('STORAGE_EMULATOR_HOST', STORAGE_EMULATOR_HOST)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PHOTO_UPLOAD_WORKERS,
+                                           thread_name_prefix='photo-upload')
+        return _executor
+
+
+class PhotoUpload:
+    """A photo copied out of the request, waiting to be stored once its upload row is committed."""
+
+    def __init__(self, file, caption):
+        self.filename = file.filename
+        self.extension = file.filename.rsplit('.', 1)[1].lower()
+        self.content_type = file.content_type
+        self.caption = caption
+        self.upload_id = None
+
+        # The request's file stream is closed once the response is sent; hash while copying
+        self.data = tempfile.SpooledTemporaryFile(max_size=PHOTO_SPOOL_MEMORY_BYTES)
+        digest = hashlib.sha256()
+        stream = getattr(file, 'stream', file)
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(_COPY_CHUNK_BYTES), b''):
+            digest.update(chunk)
+            self.data.write(chunk)
+        self.content_hash = digest.hexdigest()
+
+    def close(self):
+        self.data.close()
+
+
+def spool_photos(files, captions, allowed_file):
+    """Copy the allowed uploaded files out of the request.
+
+    Args:
+        files (list): werkzeug FileStorage objects
+        captions (list[str]): Captions by position in files
+        allowed_file: Extension check applied to each filename
+
+    Returns:
+        list[PhotoUpload]
+    """
+    photos = []
+    for idx, file in enumerate(files):
+        if file and file.filename and allowed_file(file.filename):
+            caption = captions[idx] if idx < len(captions) else ''
+            photos.append(PhotoUpload(file, caption))
+    return photos
+
+
+def record_photo_uploads(cur, experience_id, photos):
+    """Insert a 'pending' photo_uploads row per photo (in the caller's transaction)."""
+    if not photos:
+        return
+    with cur.connection.cursor() as upload_cur:
+        upload_cur.execute("""
+            INSERT INTO photo_uploads (experience_id, filename, content_type, caption)
+            SELECT %s, filename, content_type, caption
+            FROM unnest(%s::text[], %s::text[], %s::text[]) WITH ORDINALITY
+                AS p(filename, content_type, caption, position)
+            ORDER BY position
+            RETURNING upload_id
+        """, (experience_id,
+              [photo.filename for photo in photos],
+              [photo.content_type for photo in photos],
+              [photo.caption for photo in photos]))
+        upload_ids = sorted(row[0] for row in upload_cur.fetchall())
+    for photo, upload_id in zip(photos, upload_ids):
+        photo.upload_id = upload_id
+
+
+def discard_photo_uploads(photos):
+    """Release spooled files when the transaction that recorded them rolled back."""
+    for photo in photos:
+        photo.close()
+
+
+def photo_object_path(experience_id, extension):
+    """New, unguessable storage path for a photo of an experience."""
+    return f"experiences/{experience_id}/{uuid.uuid4()}.{extension}"
+
+
+def public_photo_url(blob):
+    """Public URL of a stored photo (emulator URLs when running against it)."""
+    if STORAGE_EMULATOR_HOST:
+        return f"{STORAGE_EMULATOR_HOST}/v0/b/{blob.bucket.name}/o/{quote(blob.name, safe='')}?alt=media"
+    return blob.public_url
+
+
+def upload_photo_file(fileobj, object_path, content_type):
+    """Upload a file to Firebase Storage.
+
+    Returns:
+        tuple: (public_url, blob)
+    """
+    bucket = storage.bucket()
+    blob = bucket.blob(object_path)
+    if object_path.startswith(PHOTO_BLOB_PREFIX):
+        blob.cache_control = 'public, max-age=31536000, immutable'  # Content-addressed
+    fileobj.seek(0)
+    blob.upload_from_file(fileobj, content_type=content_type)
+    if not STORAGE_EMULATOR_HOST:
+        blob.make_public()
+    return public_photo_url(blob), blob
+
+
+# ==============================================================================
+# Derivatives
+# ==============================================================================
+# Thumbnail and medium WebP renditions are made once, when a photo is stored,
+# and their URLs kept on experience_photos (thumbnail_url / medium_url).
+# Readers fall back to the original while they are NULL: Pillow not
+# installed, an undecodable image, or photos stored before derivatives
+# existed (backfill with `python -m api.py_photos`).
+
+def _image_library():
+    """Pillow's Image and ImageOps modules, or None when Pillow is not installed."""
+    try:
+        # Pillow==11.0.0 (optional)
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def render_derivatives(fileobj):
+    """Encode the derivative sizes of an image.
+
+    Returns:
+        dict: size -> WebP bytes (empty when Pillow is missing)
+    """
+    library = _image_library()
+    if library is None:
+        return {}
+    Image, ImageOps = library
+
+    fileobj.seek(0)
+    with Image.open(fileobj) as image:
+        # Apply the camera's EXIF orientation (the metadata itself is dropped)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        renditions = {}
+        for size, max_edge in PHOTO_DERIVATIVES.items():
+            rendition = image.copy()
+            rendition.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            out = io.BytesIO()
+            rendition.save(out, 'WEBP', quality=PHOTO_DERIVATIVE_QUALITY, method=4)
+            renditions[size] = out.getvalue()
+        return renditions
+
+
+def store_derivatives(original_path, fileobj):
+    """Render and upload the derivatives of a stored photo.
+
+    Args:
+        original_path (str): Object path of the original in the bucket
+        fileobj: The original image bytes
+
+    Returns:
+        tuple: ({'thumbnail_url', 'medium_url'}, uploaded blobs); URLs are None
+               when no derivative could be made
+    """
+    urls = {f'{size}_url': None for size in PHOTO_DERIVATIVES}
+    try:
+        renditions = render_derivatives(fileobj)
+    except Exception as error:
+        print(f"Could not render derivatives of {original_path}: {error}")
+        return urls, []
+
+    bucket = storage.bucket()
+    stem = original_path.rsplit('.', 1)[0]
+    blobs = []
+    for size, data in renditions.items():
+        blob = bucket.blob(f'{stem}_{size}.webp')
+        blob.cache_control = 'public, max-age=31536000, immutable'
+        blob.upload_from_string(data, content_type='image/webp')
+        if not STORAGE_EMULATOR_HOST:
+            blob.make_public()
+        urls[f'{size}_url'] = public_photo_url(blob)
+        blobs.append(blob)
+    return urls, blobs
+
+
+def _delete_blobs(blobs):
+    for blob in blobs:
+        try:
+            blob.delete()
+        except Exception as error:
+            print(f"Could not delete {blob.name}: {error}")
+
+
+def store_photo_uploads(conn, experience_id, photos):
+    """Store recorded photos and register them; call once record_photo_uploads committed.
+
+    Files whose bytes are already stored skip the upload; the others are
+    uploaded in parallel with no transaction open. The outcome is recorded in
+    one transaction: stored photos get their experience_photos rows and the
+    rest are marked 'failed'.
+
+    Args:
+        conn: The request's connection (no transaction open)
+        experience_id (int): Experience the photos belong to
+        photos (list[PhotoUpload]): Recorded photos; their spooled files are closed
+
+    Returns:
+        list[dict]: Status of each upload, as returned by get_photo_uploads
+    """
+    if not photos:
+        return []
+    try:
+        stored, errors = _store_photo_blobs(conn, photos)
+    finally:
+        discard_photo_uploads(photos)
+
+    upload_ids = {photo.upload_id for photo in photos}
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            event = _register_photos(cur, experience_id,
+                                     [photo for photo in photos if photo.content_hash in stored], stored)
+            _fail_uploads(cur, [(photo.upload_id, errors[photo.content_hash])
+                                for photo in photos if photo.content_hash in errors])
+            uploads = [upload for upload in get_photo_uploads(cur, experience_id)
+                       if upload['upload_id'] in upload_ids]
+        conn.commit()
+    except Exception as error:
+        # Stored objects nothing references are removed by the storage GC sweep
+        conn.rollback()
+        print(f"Could not register photos of experience {experience_id}: {error}")
+        return [{'upload_id': photo.upload_id, 'filename': photo.filename, 'status': 'failed',
+                 'error': 'Could not register photo'} for photo in photos]
+    if event:
+        apply_change(event)
+    return uploads
+
+
+def _store_photo_blobs(conn, photos):
+    """Upload the files among photos that are not stored yet, each distinct file once.
+
+    Returns:
+        tuple: (stored, errors) - content_hash -> object_path and URLs of the
+               stored file, and content_hash -> error for files that failed
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT content_hash, object_path, photo_url, thumbnail_url, medium_url
+            FROM photo_blobs
+            WHERE content_hash = ANY(%s)
+        """, ([photo.content_hash for photo in photos],))
+        stored = {row.pop('content_hash'): row for row in cur.fetchall()}
+    conn.rollback()  # Don't sit idle in a transaction during the uploads
+
+    new = {photo.content_hash: photo for photo in photos if photo.content_hash not in stored}
+    executor = _get_executor()
+    futures = {content_hash: executor.submit(_upload_photo_blob, photo) for content_hash, photo in new.items()}
+    errors = {}
+    for content_hash, future in futures.items():
+        try:
+            stored[content_hash] = future.result()
+        except Exception as error:
+            print(f"Photo upload of {new[content_hash].filename} failed: {error}")
+            errors[content_hash] = str(error)
+    return stored, errors
+
+
+def _upload_photo_blob(photo):
+    """Upload a photo's bytes and renditions under its content address."""
+    object_path = f"{PHOTO_BLOB_PREFIX}{photo.content_hash}.{photo.extension}"
+    photo_url, _ = upload_photo_file(photo.data, object_path, photo.content_type)
+    derivative_urls, _ = store_derivatives(object_path, photo.data)
+    return dict(derivative_urls, object_path=object_path, photo_url=photo_url)
+
+
+def _register_photos(cur, experience_id, photos, stored):
+    """Reference the photos' blobs, insert their experience_photos rows and mark the uploads 'done'.
+
+    An existing blob row wins, so every photo of the same bytes shares its
+    URLs. Uploads whose row is gone (the experience was deleted meanwhile)
+    are skipped.
+
+    Returns:
+        dict: Change event to apply after commit (None when no photo was added)
+    """
+    if not photos:
+        return None
+    blobs = {photo.content_hash: photo for photo in photos}
+    # photo_ids are drawn up front so each upload row can point at its own
+    # photo even when several uploads share a blob
+    cur.execute("""
+        WITH blob_data(content_hash, object_path, photo_url, thumbnail_url, medium_url, content_type) AS (
+            SELECT * FROM unnest(%(hashes)s::text[], %(object_paths)s::text[], %(photo_urls)s::text[],
+                                 %(thumbnail_urls)s::text[], %(medium_urls)s::text[], %(content_types)s::text[])
+        ),
+        job AS (
+            SELECT u.upload_id, u.experience_id, u.caption, d.content_hash,
+                   nextval(pg_get_serial_sequence('experience_photos', 'photo_id')) AS photo_id
+            FROM photo_uploads u
+                JOIN unnest(%(upload_ids)s::int[], %(upload_hashes)s::text[]) AS d(upload_id, content_hash)
+                    ON d.upload_id = u.upload_id
+            WHERE u.status = 'pending'
+            ORDER BY u.upload_id
+            FOR UPDATE OF u
+        ),
+        blob AS (
+            INSERT INTO photo_blobs AS b (content_hash, object_path, photo_url, thumbnail_url, medium_url,
+                                          content_type, ref_count)
+            SELECT d.content_hash, d.object_path, d.photo_url, d.thumbnail_url, d.medium_url, d.content_type,
+                   uses.refs
+            FROM blob_data d
+                JOIN (SELECT content_hash, COUNT(*) AS refs FROM job GROUP BY content_hash) uses
+                    ON uses.content_hash = d.content_hash
+            ORDER BY d.content_hash
+            ON CONFLICT (content_hash) DO UPDATE
+                SET ref_count = b.ref_count + EXCLUDED.ref_count,
+                    released_at = NULL
+            RETURNING content_hash, object_path, photo_url, thumbnail_url, medium_url
+        ),
+        photo AS (
+            INSERT INTO experience_photos (photo_id, experience_id, photo_url, thumbnail_url, medium_url, caption,
+                                           content_hash)
+            SELECT job.photo_id, job.experience_id, blob.photo_url, blob.thumbnail_url, blob.medium_url,
+                   job.caption, blob.content_hash
+            FROM job
+                JOIN blob ON blob.content_hash = job.content_hash
+            ORDER BY job.upload_id
+            RETURNING photo_id, photo_url
+        )
+        UPDATE photo_uploads u
+        SET status = 'done', photo_id = photo.photo_id, photo_url = photo.photo_url,
+            object_path = blob.object_path, error = NULL, updated_at = NOW()
+        FROM job
+            JOIN photo ON photo.photo_id = job.photo_id
+            JOIN blob ON blob.content_hash = job.content_hash
+        WHERE u.upload_id = job.upload_id
+        RETURNING blob.object_path
+    """, {
+        'hashes': list(blobs),
+        'object_paths': [stored[content_hash]['object_path'] for content_hash in blobs],
+        'photo_urls': [stored[content_hash]['photo_url'] for content_hash in blobs],
+        'thumbnail_urls': [stored[content_hash]['thumbnail_url'] for content_hash in blobs],
+        'medium_urls': [stored[content_hash]['medium_url'] for content_hash in blobs],
+        'content_types': [photo.content_type for photo in blobs.values()],
+        'upload_ids': [photo.upload_id for photo in photos],
+        'upload_hashes': [photo.content_hash for photo in photos],
+    })
+    object_paths = sorted({row['object_path'] for row in cur.fetchall()})
+    if not object_paths:
+        return None
+
+    # A blob picked up again may already be queued for deletion (with its renditions)
+    cur.execute("DELETE FROM storage_deletions WHERE object_path LIKE ANY(%s)",
+                ([path.rsplit('.', 1)[0] + '%' for path in object_paths],))
+    return notify_change(cur, 'experience', [experience_id], 'photos',
+                         related={'trip': _trip_ids(cur, experience_id)})
+
+
+def _fail_uploads(cur, failed):
+    """Mark pending uploads 'failed'; failed is a list of (upload_id, error)."""
+    if not failed:
+        return
+    cur.execute("""
+        UPDATE photo_uploads u
+        SET status = 'failed', error = f.error, updated_at = NOW()
+        FROM unnest(%s::int[], %s::text[]) AS f(upload_id, error)
+        WHERE u.upload_id = f.upload_id
+          AND u.status = 'pending'
+    """, ([upload_id for upload_id, _ in failed], [error for _, error in failed]))
+
+
+def _trip_ids(cur, experience_id):
+    cur.execute("SELECT trip_id FROM trip_experiences WHERE experience_id = %s", (experience_id,))
+    return [row['trip_id'] for row in cur.fetchall()]
+
+
+def get_photo_uploads(cur, experience_id):
+    """Status of an experience's photo uploads, oldest first."""
+    cur.execute("""
+        SELECT upload_id, filename, caption, photo_id, photo_url, error, created_at, updated_at,
+               CASE
+                   WHEN status IN ('pending', 'uploading')
+                       AND updated_at < NOW() - make_interval(secs => %s) THEN 'failed'
+                   ELSE status
+               END AS status
+        FROM photo_uploads
+        WHERE experience_id = %s
+        ORDER BY upload_id
+    """, (PHOTO_UPLOAD_STALE_SECONDS, experience_id))
+    uploads = cur.fetchall()
+    for upload in uploads:
+        if upload['status'] == 'failed' and upload['error'] is None:
+            upload['error'] = 'Upload interrupted'
+        upload['created_at'] = upload['created_at'].isoformat()
+        upload['updated_at'] = upload['updated_at'].isoformat()
+    return uploads
+
+
+# ==============================================================================
+# Direct-to-storage uploads
+# ==============================================================================
+# Clients ask for one short-lived signed PUT URL per photo, upload the bytes
+# straight to the bucket, then call finalize; the API never handles image
+# bytes. Each URL is backed by a 'pending' photo_uploads row holding the
+# object path, so finalize only accepts objects this API handed out.
+
+def _upload_target(blob, content_type):
+    """Method, URL and headers a client uses to upload one photo."""
+    if STORAGE_EMULATOR_HOST:
+        # The emulator does not check signatures; use its media upload endpoint
+        return {
+            'method': 'POST',
+            'url': (f"{STORAGE_EMULATOR_HOST}/upload/storage/v1/b/{blob.bucket.name}/o"
+                    f"?uploadType=media&name={quote(blob.name, safe='')}"),
+            'headers': {'Content-Type': content_type},
+        }
+    headers = {
+        'Content-Type': content_type,
+        'x-goog-content-length-range': f'0,{PHOTO_MAX_BYTES}',
+    }
+    return {
+        'method': 'PUT',
+        'url': blob.generate_signed_url(
+            version='v4',
+            expiration=timedelta(seconds=PHOTO_UPLOAD_URL_SECONDS),
+            method='PUT',
+            content_type=content_type,
+            headers={'x-goog-content-length-range': headers['x-goog-content-length-range']},
+        ),
+        'headers': headers,
+    }
+
+
+def create_signed_uploads(cur, experience_id, photos):
+    """Record pending uploads and issue a signed upload URL for each.
+
+    Args:
+        cur: Open cursor (caller commits)
+        experience_id (int): Experience the photos belong to
+        photos (list[dict]): {filename, content_type, caption}, already validated
+
+    Returns:
+        list[dict]: upload_id, filename, method, url, headers and expires_in per photo
+    """
+    bucket = storage.bucket()
+    paths = [photo_object_path(experience_id, photo['filename'].rsplit('.', 1)[1].lower())
+             for photo in photos]
+    with cur.connection.cursor() as upload_cur:
+        upload_cur.execute("""
+            INSERT INTO photo_uploads (experience_id, filename, content_type, caption, object_path)
+            SELECT %s, filename, content_type, caption, object_path
+            FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[]) WITH ORDINALITY
+                AS p(filename, content_type, caption, object_path, position)
+            ORDER BY position
+            RETURNING upload_id, object_path
+        """, (experience_id,
+              [photo['filename'] for photo in photos],
+              [photo['content_type'] for photo in photos],
+              [photo.get('caption') or '' for photo in photos],
+              paths))
+        upload_ids = {object_path: upload_id for upload_id, object_path in upload_cur.fetchall()}
+
+    uploads = []
+    for photo, path in zip(photos, paths):
+        upload = {'upload_id': upload_ids[path], 'filename': photo['filename'],
+                  'expires_in': PHOTO_UPLOAD_URL_SECONDS}
+        upload.update(_upload_target(bucket.blob(path), photo['content_type']))
+        uploads.append(upload)
+    return uploads
+
+
+def _check_uploaded_object(bucket, upload):
+    """Return (blob, error) for an object a client says it uploaded."""
+    blob = bucket.get_blob(upload['object_path'])
+    if blob is None:
+        return None, 'Object not uploaded'
+    if blob.size is None or blob.size > PHOTO_MAX_BYTES:
+        return blob, f'Object larger than {PHOTO_MAX_BYTES} bytes'
+    if not (blob.content_type or '').startswith('image/'):
+        return blob, f'Unsupported content type {blob.content_type!r}'
+    return blob, None
+
+
+def finalize_signed_uploads(conn, experience_id, upload_ids):
+    """Register uploaded objects in experience_photos.
+
+    Storage is checked before the transaction starts, so no connection is
+    held across network calls to the bucket. Objects that are missing, too
+    large or not images are marked 'failed' (and invalid ones deleted).
+
+    Returns:
+        tuple: (uploads, event, derivative_jobs) - per-upload status dicts, the
+               change event to apply after the caller commits (None when no
+               photo was added) and the (photo_id, object_path) pairs to pass
+               to make_photo_derivatives after commit
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT upload_id, filename, object_path
+            FROM photo_uploads
+            WHERE experience_id = %s
+              AND upload_id = ANY(%s)
+              AND object_path IS NOT NULL
+              AND status = 'pending'
+        """, (experience_id, upload_ids))
+        pending = cur.fetchall()
+    conn.rollback()  # Don't sit idle in a transaction during the storage calls
+
+    bucket = storage.bucket()
+    ready, failed = [], []
+    for upload in pending:
+        blob, error = _check_uploaded_object(bucket, upload)
+        if error is None:
+            if not STORAGE_EMULATOR_HOST:
+                blob.make_public()
+            ready.append((upload['upload_id'], public_photo_url(blob)))
+        else:
+            if blob is not None:
+                blob.delete()
+            failed.append((upload['upload_id'], error))
+
+    event = None
+    derivative_jobs = []
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if ready:
+            cur.execute("""
+                WITH ready(upload_id, photo_url) AS (
+                    SELECT * FROM unnest(%s::int[], %s::text[])
+                ),
+                job AS (
+                    SELECT u.upload_id, u.experience_id, u.caption, r.photo_url
+                    FROM photo_uploads u
+                        JOIN ready r ON r.upload_id = u.upload_id
+                    WHERE u.status = 'pending'
+                    FOR UPDATE OF u
+                ),
+                photo AS (
+                    INSERT INTO experience_photos (experience_id, photo_url, caption)
+                    SELECT experience_id, photo_url, caption FROM job
+                    RETURNING photo_id, photo_url
+                )
+                UPDATE photo_uploads u
+                SET status = 'done', photo_id = photo.photo_id, photo_url = photo.photo_url,
+                    error = NULL, updated_at = NOW()
+                FROM job, photo
+                WHERE u.upload_id = job.upload_id
+                  AND photo.photo_url = job.photo_url
+                RETURNING u.photo_id, u.object_path
+            """, ([upload_id for upload_id, _ in ready], [photo_url for _, photo_url in ready]))
+            derivative_jobs = [(row['photo_id'], row['object_path']) for row in cur.fetchall()]
+            if derivative_jobs:
+                event = notify_change(
+                    cur, 'experience', [experience_id], 'photos',
+                    related={'trip': _trip_ids(cur, experience_id)})
+        _fail_uploads(cur, failed)
+
+        requested = set(upload_ids)
+        uploads = [upload for upload in get_photo_uploads(cur, experience_id)
+                   if upload['upload_id'] in requested]
+    return uploads, event, derivative_jobs
+
+
+def make_photo_derivatives(experience_id, jobs):
+    """Render derivatives of already stored photos in parallel (after commit, before responding)."""
+    executor = _get_executor()
+    futures = [executor.submit(_derive_stored_photo, experience_id, photo_id, object_path)
+               for photo_id, object_path in jobs]
+    for future in futures:
+        future.result()
+
+
+def _derive_stored_photo(experience_id, photo_id, object_path):
+    """Download a stored original, upload its derivatives and record their URLs.
+
+    For a content-addressed original the renditions are recorded on its
+    photo_blobs row and on every photo sharing it.
+    """
+    shared = object_path.startswith(PHOTO_BLOB_PREFIX)
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=PHOTO_SPOOL_MEMORY_BYTES) as data:
+            storage.bucket().blob(object_path).download_to_file(data)
+            urls, blobs = store_derivatives(object_path, data)
+        if not blobs:
+            return
+
+        with pooled_connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute("""
+                        WITH blob AS (
+                            UPDATE photo_blobs
+                            SET thumbnail_url = %(thumbnail_url)s, medium_url = %(medium_url)s
+                            WHERE object_path = %(object_path)s
+                            RETURNING content_hash
+                        )
+                        UPDATE experience_photos p
+                        SET thumbnail_url = %(thumbnail_url)s, medium_url = %(medium_url)s
+                        WHERE p.photo_id = %(photo_id)s
+                           OR p.content_hash IN (SELECT content_hash FROM blob)
+                        RETURNING p.experience_id
+                    """, dict(urls, object_path=object_path, photo_id=photo_id))
+                    experience_ids = sorted({row['experience_id'] for row in cur.fetchall()})
+                    if not experience_ids:
+                        # Photo deleted meanwhile
+                        conn.rollback()
+                        if not shared:
+                            _delete_blobs(blobs)
+                        return
+                    cur.execute("SELECT DISTINCT trip_id FROM trip_experiences WHERE experience_id = ANY(%s)",
+                                (experience_ids,))
+                    event = notify_change(
+                        cur, 'experience', experience_ids, 'photos',
+                        related={'trip': [row['trip_id'] for row in cur.fetchall()]})
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                if not shared:
+                    _delete_blobs(blobs)
+                raise
+        apply_change(event)
+    except Exception as error:
+        print(f"Could not make derivatives of photo {photo_id}: {error}")
+
+
+def object_path_from_url(photo_url):
+    """Bucket object path of a public photo URL, or None if it isn't one of ours."""
+    bucket_name = storage.bucket().name
+    parsed = urlparse(photo_url)
+    path = unquote(parsed.path)
+    if STORAGE_EMULATOR_HOST and f'/v0/b/{bucket_name}/o/' in path:
+        return path.split(f'/v0/b/{bucket_name}/o/', 1)[1]
+    if parsed.netloc == 'storage.googleapis.com' and path.startswith(f'/{bucket_name}/'):
+        return path[len(bucket_name) + 2:]
+    return None
+
+
+def backfill_derivatives(conn, batch_size=100):
+    """Make derivatives for photos stored before derivatives existed.
+
+    Returns:
+        int: Number of photos processed
+    """
+    processed = 0
+    last_photo_id = 0
+    derived_paths = set()  # Photos sharing a content-addressed blob are updated together
+    while True:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT photo_id, experience_id, photo_url
+                FROM experience_photos
+                WHERE thumbnail_url IS NULL
+                  AND photo_id > %s
+                ORDER BY photo_id
+                LIMIT %s
+            """, (last_photo_id, batch_size))
+            rows = cur.fetchall()
+        conn.rollback()
+        if not rows:
+            return processed
+
+        for row in rows:
+            object_path = object_path_from_url(row['photo_url'])
+            if object_path is None:
+                print(f"Skipping photo {row['photo_id']}: not stored in this bucket ({row['photo_url']})")
+                continue
+            if object_path in derived_paths:
+                continue
+            derived_paths.add(object_path)
+            _derive_stored_photo(row['experience_id'], row['photo_id'], object_path)
+            processed += 1
+        last_photo_id = rows[-1]['photo_id']
+
+
+if __name__ == "__main__":
+    # Usage: python -m api.py_photos   (backfills thumbnail/medium derivatives)
+    import sys
+
+    import psycopg2
+
+    # Initializes the Firebase app (storage.bucket() needs it)
+    import api.py_experiences  # noqa: F401
+    from api.py_db import DATABASE_URL
+
+    if _image_library() is None:
+        print("✗ Pillow is not installed (pip install Pillow)")
+        sys.exit(1)
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        count = backfill_derivatives(conn)
+        print(f"✓ Made derivatives for {count} photos")
+    finally:
+        conn.close()
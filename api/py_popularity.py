@@ -0,0 +1,285 @@
+import math
+import os
+import sys
+
+# psycopg2-binary==2.9.11
+import psycopg2
+
+# ==============================================================================
+# Incrementally maintained trip_count
+# ==============================================================================
+# experience_popularity holds the counters of an experience, kept out of the
+# experiences row so `SELECT e.*` responses don't carry them and counter
+# updates don't rewrite the wide experiences rows. A row exists once an
+# experience has been added to a trip or rated; no row means zero.
+#
+# trip_count is the number of trips an experience belongs to. It is adjusted in
+# the same statement that inserts/deletes the trip_experiences row (a
+# data-modifying CTE), so the counter and the link commit together, and the
+# top-N popularity query walks idx_experience_popularity_trip_count in order.
+# create_date lives on experiences, so the index has no tiebreak column; an
+# incremental sort orders each trip_count group by it, and the scan stops once
+# the limit is filled.
+#
+# trend_log is an exponentially decayed activity score kept in log space. Each
+# event of weight w at time t adds w * exp((t - TREND_EPOCH) / tau) to a
+# running sum, stored as its logarithm (log-sum-exp, so it never overflows).
+# Multiplying every score by the same exp(-(now - epoch) / tau) doesn't change
+# their order, so stored values never need decaying and the trending query is
+# an index scan on idx_experience_popularity_trend. The decayed score at query
+# time is exp(trend_log - (now - epoch) / tau).
+TREND_EPOCH = '2025-01-01T00:00:00Z'
+TREND_HALF_LIFE_DAYS = float(os.getenv('TREND_HALF_LIFE_DAYS', '7'))
+TREND_TAU_SECONDS = TREND_HALF_LIFE_DAYS * 86400 / math.log(2)
+TREND_WEIGHT_TRIP = 3.0  # Adding an experience to a trip
+TREND_WEIGHT_RATING = 1.0  # A 5-star rating (scaled by rating / 5)
+
+
+def trend_event_sql(weight_sql, at_sql='NOW()'):
+    """SQL for the trend_log of one event: log(w) + (t - epoch) / tau."""
+    return f"(LN({weight_sql}) + EXTRACT(EPOCH FROM {at_sql} - TIMESTAMPTZ '{TREND_EPOCH}') / {TREND_TAU_SECONDS})"
+
+
+# An event of weight %s happening now
+_TREND_EVENT_SQL = trend_event_sql('%s')
+
+# log(exp(a) + exp(b)), with NULL meaning "no events yet"
+_TREND_ADD_SQL = """CASE WHEN {current} IS NULL THEN {event}
+         ELSE GREATEST({current}, {event}) + LN(1 + EXP(-ABS({current} - {event}))) END"""
+
+# Current decayed score from a stored trend_log (experience_popularity aliased p)
+TREND_SCORE_SQL = f"EXP(p.trend_log - EXTRACT(EPOCH FROM NOW() - TIMESTAMPTZ '{TREND_EPOCH}') / {TREND_TAU_SECONDS})"
+
+# Folds the inserted row's trend_log (one event) into an existing row's
+_TREND_UPSERT_SQL = _TREND_ADD_SQL.format(current='p.trend_log', event='EXCLUDED.trend_log')
+
+
+def record_trend_event(cur, experience_id, weight):
+    """Fold an event of the given weight into an experience's trend score."""
+    cur.execute(f"""
+        INSERT INTO experience_popularity AS p (experience_id, trend_log)
+        SELECT e.experience_id, {_TREND_EVENT_SQL}
+        FROM experiences e
+        WHERE e.experience_id = %s
+        ON CONFLICT (experience_id) DO UPDATE
+        SET trend_log = {_TREND_UPSERT_SQL}
+    """, (weight, experience_id))
+
+
+def add_trip_experience(cur, trip_id, experience_id):
+    """Link an experience to a trip and bump its trip_count and trend score.
+
+    Returns:
+        bool: True if the link was new (False if it already existed)
+    """
+    cur.execute(f"""
+        WITH linked AS (
+            INSERT INTO trip_experiences (trip_id, experience_id)
+            VALUES (%s, %s)
+            ON CONFLICT (trip_id, experience_id) DO NOTHING
+            RETURNING experience_id
+        )
+        INSERT INTO experience_popularity AS p (experience_id, trip_count, trend_log)
+        SELECT linked.experience_id, 1, {_TREND_EVENT_SQL}
+        FROM linked
+        ON CONFLICT (experience_id) DO UPDATE
+        SET trip_count = p.trip_count + 1,
+            trend_log = {_TREND_UPSERT_SQL}
+    """, (trip_id, experience_id, TREND_WEIGHT_TRIP))
+    return cur.rowcount > 0
+
+
+def record_trip_additions(cur, experience_ids):
+    """Count trip links inserted set-wise just now (bulk paths) towards trip_count and trend.
+
+    n additions of one experience at the same moment are a single event of
+    weight n * TREND_WEIGHT_TRIP.
+
+    Args:
+        cur: Cursor of the transaction that inserted the trip_experiences rows
+        experience_ids (list[int]): One entry per inserted link
+    """
+    cur.execute(f"""
+        INSERT INTO experience_popularity AS p (experience_id, trip_count, trend_log)
+        SELECT experience_id, COUNT(*), {trend_event_sql(f'COUNT(*) * {TREND_WEIGHT_TRIP}')}
+        FROM unnest(%s::int[]) AS added(experience_id)
+        GROUP BY experience_id
+        ORDER BY experience_id
+        ON CONFLICT (experience_id) DO UPDATE
+        SET trip_count = p.trip_count + EXCLUDED.trip_count,
+            trend_log = {_TREND_UPSERT_SQL}
+    """, (list(experience_ids),))
+
+
+def remove_trip_experience(cur, trip_id, experience_id):
+    """Unlink an experience from a trip and decrement its trip_count.
+
+    Returns:
+        bool: True if a link was removed
+    """
+    cur.execute("""
+        WITH unlinked AS (
+            DELETE FROM trip_experiences
+            WHERE trip_id = %s AND experience_id = %s
+            RETURNING experience_id
+        ),
+        counted AS (
+            UPDATE experience_popularity p
+            SET trip_count = GREATEST(p.trip_count - 1, 0)
+            FROM unlinked
+            WHERE p.experience_id = unlinked.experience_id
+        )
+        SELECT COUNT(*) FROM unlinked
+    """, (trip_id, experience_id))
+    return cur.fetchone()[0] > 0
+
+
+def release_trip_experiences(cur, trip_id):
+    """Unlink every experience of a trip (before deleting it) and decrement their counts.
+
+    Doing this explicitly instead of relying on ON DELETE CASCADE keeps the
+    counters in step with the links.
+
+    Returns:
+        list[int]: experience_ids that were unlinked
+    """
+    with cur.connection.cursor() as unlink_cur:
+        unlink_cur.execute("""
+            WITH unlinked AS (
+                DELETE FROM trip_experiences
+                WHERE trip_id = %s
+                RETURNING experience_id
+            ),
+            counted AS (
+                UPDATE experience_popularity p
+                SET trip_count = GREATEST(p.trip_count - 1, 0)
+                FROM unlinked
+                WHERE p.experience_id = unlinked.experience_id
+            )
+            SELECT experience_id FROM unlinked
+        """, (trip_id,))
+        return [row[0] for row in unlink_cur.fetchall()]
+
+
+def reconcile_trip_counts(conn):
+    """Recompute trip_count from trip_experiences and fix any drift.
+
+    Returns:
+        int: Number of experiences whose counter was corrected
+    """
+    with conn.cursor() as cur:
+        # Block link changes until the reconcile commits, so none is overwritten
+        cur.execute("LOCK TABLE trip_experiences IN SHARE MODE")
+        cur.execute("""
+            INSERT INTO experience_popularity AS p (experience_id, trip_count)
+            SELECT experience_id, COUNT(*)
+            FROM trip_experiences
+            GROUP BY experience_id
+            ON CONFLICT (experience_id) DO UPDATE
+            SET trip_count = EXCLUDED.trip_count
+            WHERE p.trip_count <> EXCLUDED.trip_count
+        """)
+        fixed = cur.rowcount
+        cur.execute("""
+            UPDATE experience_popularity p
+            SET trip_count = 0
+            WHERE p.trip_count <> 0
+              AND NOT EXISTS (SELECT 1 FROM trip_experiences te WHERE te.experience_id = p.experience_id)
+        """)
+        fixed += cur.rowcount
+    conn.commit()
+    return fixed
+
+
+def rebuild_trend_scores(conn):
+    """Recompute trend_log from trip additions and ratings (backfill / repair).
+
+    Returns:
+        int: Number of experiences with a trend score
+    """
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE trip_experiences, experience_ratings IN SHARE MODE")
+        cur.execute(f"""
+            WITH events AS (
+                SELECT experience_id, {trend_event_sql(TREND_WEIGHT_TRIP, 'added_date')} AS x
+                FROM trip_experiences
+                UNION ALL
+                SELECT experience_id, {trend_event_sql(f'{TREND_WEIGHT_RATING} * rating / 5.0', 'updated_at')}
+                FROM experience_ratings
+            ),
+            peaks AS (
+                SELECT experience_id, MAX(x) AS peak FROM events GROUP BY experience_id
+            ),
+            scores AS (
+                SELECT ev.experience_id, p.peak + LN(SUM(EXP(ev.x - p.peak))) AS trend_log
+                FROM events ev
+                    JOIN peaks p ON p.experience_id = ev.experience_id
+                GROUP BY ev.experience_id, p.peak
+            ),
+            cleared AS (
+                UPDATE experience_popularity p
+                SET trend_log = NULL
+                WHERE p.trend_log IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM scores WHERE scores.experience_id = p.experience_id)
+            )
+            INSERT INTO experience_popularity AS p (experience_id, trend_log)
+            SELECT experience_id, trend_log FROM scores
+            ON CONFLICT (experience_id) DO UPDATE
+            SET trend_log = EXCLUDED.trend_log
+            WHERE p.trend_log IS DISTINCT FROM EXCLUDED.trend_log
+        """)
+        cur.execute("SELECT COUNT(*) FROM experience_popularity WHERE trend_log IS NOT NULL")
+        scored = cur.fetchone()[0]
+    conn.commit()
+    return scored
+
+
+# ==============================================================================
+# Keyword usage_count
+# ==============================================================================
+# keywords.usage_count is the number of experiences linked to a keyword. It is
+# adjusted by link_keywords in the statement that changes the links; bulk loads
+# write links set-wise and reconcile the counters once at the end.
+def reconcile_keyword_usage(conn):
+    """Recompute keywords.usage_count from experience_keywords and fix any drift.
+
+    Returns:
+        int: Number of keywords whose counter was corrected
+    """
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE experience_keywords IN SHARE MODE")
+        cur.execute("""
+            UPDATE keywords k
+            SET usage_count = actual.usage_count
+            FROM (
+                SELECT k2.keyword_id, COUNT(ek.experience_id) AS usage_count
+                FROM keywords k2
+                    LEFT JOIN experience_keywords ek ON ek.keyword_id = k2.keyword_id
+                GROUP BY k2.keyword_id
+            ) actual
+            WHERE k.keyword_id = actual.keyword_id
+              AND k.usage_count <> actual.usage_count
+        """)
+        fixed = cur.rowcount
+    conn.commit()
+    return fixed
+
+
+if __name__ == "__main__":
+    # Usage: python -m api.py_popularity   (reconciles counters and rebuilds trend scores)
+    from api.py_db import DATABASE_URL
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        fixed = reconcile_trip_counts(conn)
+        print(f"✓ Reconciled trip_count ({fixed} experiences corrected)")
+        scored = rebuild_trend_scores(conn)
+        print(f"✓ Rebuilt trend scores ({scored} experiences trending)")
+        fixed = reconcile_keyword_usage(conn)
+        print(f"✓ Reconciled keyword usage_count ({fixed} keywords corrected)")
+    except Exception as e:
+        conn.rollback()
+        print(f"✗ Error reconciling trip counts: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
@@ -0,0 +1,119 @@
+import sys
+
+# psycopg2-binary==2.9.11
+import psycopg2
+
+from api.py_popularity import TREND_WEIGHT_RATING, record_trend_event
+
+# ==============================================================================
+# Incrementally maintained rating aggregates
+# ==============================================================================
+# experience_rating_stats holds one row per rated experience: the running sum,
+# count, and a 1-5 histogram. average_rating is a stored generated column, so
+# read paths join a single row by primary key instead of aggregating
+# experience_ratings on every request.
+
+# Serialises rating writes per experience so the "previous rating" read below
+# cannot race a concurrent write by the same user.
+_LOCK_STATS_ROW_SQL = """
+    INSERT INTO experience_rating_stats (experience_id)
+    VALUES (%(experience_id)s)
+    ON CONFLICT (experience_id) DO UPDATE SET experience_id = EXCLUDED.experience_id
+"""
+
+# Upsert the user's rating and fold the difference into the aggregate row.
+# Re-submitting the same rating writes nothing, so the UPDATE then matches no
+# row (rowcount 0).
+_APPLY_RATING_SQL = """
+    WITH previous AS (
+        SELECT rating
+        FROM experience_ratings
+        WHERE experience_id = %(experience_id)s AND user_id = %(user_id)s
+    ),
+    upserted AS (
+        INSERT INTO experience_ratings (experience_id, user_id, rating)
+        VALUES (%(experience_id)s, %(user_id)s, %(rating)s)
+        ON CONFLICT (experience_id, user_id)
+        DO UPDATE SET rating = EXCLUDED.rating, updated_at = NOW()
+        WHERE experience_ratings.rating IS DISTINCT FROM EXCLUDED.rating
+        RETURNING rating
+    )
+    UPDATE experience_rating_stats s
+    SET rating_sum   = s.rating_sum + u.rating - COALESCE(p.rating, 0),
+        rating_count = s.rating_count + CASE WHEN p.rating IS NULL THEN 1 ELSE 0 END,
+        count_1      = s.count_1 + (u.rating = 1)::int - COALESCE((p.rating = 1)::int, 0),
+        count_2      = s.count_2 + (u.rating = 2)::int - COALESCE((p.rating = 2)::int, 0),
+        count_3      = s.count_3 + (u.rating = 3)::int - COALESCE((p.rating = 3)::int, 0),
+        count_4      = s.count_4 + (u.rating = 4)::int - COALESCE((p.rating = 4)::int, 0),
+        count_5      = s.count_5 + (u.rating = 5)::int - COALESCE((p.rating = 5)::int, 0),
+        updated_at   = NOW()
+    FROM upserted u
+        LEFT JOIN previous p ON TRUE
+    WHERE s.experience_id = %(experience_id)s
+"""
+
+
+def record_rating(cur, experience_id, user_id, rating):
+    """Insert or update a user's rating and keep experience_rating_stats in sync.
+
+    A new or changed rating also counts towards the experience's trend
+    score; re-submitting the same rating is a no-op. Runs inside the caller's
+    transaction; the caller commits.
+
+    Args:
+        cur: Open cursor (any cursor factory)
+        experience_id (int): Experience being rated
+        user_id (str): Rating user
+        rating (int): Rating between 1 and 5
+
+    Returns:
+        bool: True if the rating was inserted or its value changed
+    """
+    params = {'experience_id': experience_id, 'user_id': user_id, 'rating': rating}
+    cur.execute(_LOCK_STATS_ROW_SQL, params)
+    cur.execute(_APPLY_RATING_SQL, params)
+    if cur.rowcount == 0:
+        return False
+    record_trend_event(cur, experience_id, TREND_WEIGHT_RATING * rating / 5)
+    return True
+
+
+def rebuild_rating_stats(conn):
+    """Recompute experience_rating_stats from experience_ratings (repair / backfill)."""
+    with conn.cursor() as cur:
+        # Block concurrent record_rating calls until the rebuild commits
+        cur.execute("LOCK TABLE experience_rating_stats IN EXCLUSIVE MODE")
+        cur.execute("DELETE FROM experience_rating_stats")
+        cur.execute("""
+            INSERT INTO experience_rating_stats
+                (experience_id, rating_sum, rating_count, count_1, count_2, count_3, count_4, count_5)
+            SELECT experience_id,
+                   SUM(rating),
+                   COUNT(*),
+                   COUNT(*) FILTER (WHERE rating = 1),
+                   COUNT(*) FILTER (WHERE rating = 2),
+                   COUNT(*) FILTER (WHERE rating = 3),
+                   COUNT(*) FILTER (WHERE rating = 4),
+                   COUNT(*) FILTER (WHERE rating = 5)
+            FROM experience_ratings
+            GROUP BY experience_id
+        """)
+        count = cur.rowcount
+    conn.commit()
+    return count
+
+
+if __name__ == "__main__":
+    # Usage: python -m api.py_ratings   (rebuilds experience_rating_stats from scratch)
+    from api.py_db import DATABASE_URL
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        rebuilt = rebuild_rating_stats(conn)
+        print(f"✓ Rebuilt rating stats for {rebuilt} experiences")
+    except Exception as e:
+        conn.rollback()
+        print(f"✗ Error rebuilding rating stats: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
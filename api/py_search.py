@@ -1,14 +1,34 @@
-import os
-import psycopg2
-from dotenv import load_dotenv
 from flask import jsonify, Blueprint, request
 from psycopg2.extras import RealDictCursor
 
+from api.py_autocomplete import MIN_QUERY_LENGTH, normalize_query, suggest
+from api.py_cache import cached_json
+from api.py_db import get_db_connection
+from api.py_fts import build_tsquery
+from api.py_pagination import InvalidCursor, cursor_condition, next_cursor, order_by_clause
+from api.py_singleflight import coalesced
+
 search_bp = Blueprint('search', __name__)
 
-# Load environment variables
-load_dotenv()
-DATABASE_URL = os.getenv('DATABASE_URL')
+# Result orderings; each doubles as the keyset spec for cursor pagination
+# (experience_id is the unique tie-breaker)
+KEYWORD_SORT = [
+    ('m.relevance_score', 'DESC', 'relevance_score'),
+    ('COALESCE(rs.average_rating, 0.0)', 'DESC', 'average_rating'),
+    ('e.create_date', 'DESC', 'create_date'),
+    ('e.experience_id', 'DESC', 'experience_id'),
+]
+LOCATION_SORT = [
+    ('d.distance_km', 'ASC', 'distance_km'),
+    ('COALESCE(rs.average_rating, 0.0)', 'DESC', 'average_rating'),
+    ('e.experience_id', 'ASC', 'experience_id'),
+]
+COMBINED_SORT = [
+    ('m.relevance_score', 'DESC', 'relevance_score'),
+    ('d.distance_km', 'ASC', 'distance_km'),
+    ('COALESCE(rs.average_rating, 0.0)', 'DESC', 'average_rating'),
+    ('e.experience_id', 'DESC', 'experience_id'),
+]
 
 
 @search_bp.route('', methods=['GET'])
@@ -18,73 +38,83 @@ def search_root():
 
 
 @search_bp.route('/keyword', methods=['GET'])
+@cached_json('search:keyword', ['q', 'limit', 'offset', 'cursor'])
+@coalesced('search:keyword')
 def search_by_keyword():
     """Search experiences by keyword.
 
-    Searches through experience titles, descriptions, and keywords array.
-    Returns results ranked by relevance and user rating.
+    Full-text search over experience titles, keywords, and descriptions
+    (weighted in that order). Returns results ranked by ts_rank_cd relevance,
+    then user rating.
 
     Query Parameters:
         q (str): Search query string (required)
         limit (int): Maximum number of results to return (default: 50)
         offset (int): Number of results to skip for pagination (default: 0)
+        cursor (str): Opaque next_cursor from a previous page; replaces offset
 
     Returns:
         tuple: JSON array of matching experience objects with relevance scores, HTTP 200
     """
-    query = request.args.get('q', '').strip()
+    # Normalized like the cache key, so a cached body echoes the same query
+    query = normalize_query(request.args.get('q', ''))
     limit = request.args.get('limit', 50, type=int)
     offset = request.args.get('offset', 0, type=int)
 
     if not query:
         return jsonify({'error': 'Query parameter "q" is required'}), 400
 
+    tsquery = build_tsquery(query)
+    if not tsquery:
+        return jsonify({'error': 'Query must contain at least one word'}), 400
+
     # Validate limit and offset
     if limit < 1 or limit > 100:
         limit = 50
     if offset < 0:
         offset = 0
 
-    conn = psycopg2.connect(DATABASE_URL)
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Search using ILIKE for case-insensitive pattern matching
-            # Search in title, description, and keywords using proper JOINs
-            search_pattern = f'%{query}%'
+        after_sql, after_params = cursor_condition(request.args.get('cursor'), KEYWORD_SORT)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    if after_params:
+        offset = 0
 
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Full-text match against the GIN-indexed search document, ranked by
+            # ts_rank_cd (title weighs most, then keywords, then description)
             cur.execute("""
+                WITH matches AS (
+                    SELECT s.experience_id,
+                           ts_rank_cd(s.search_vector, q.query)::double precision AS relevance_score
+                    FROM experience_search s,
+                         to_tsquery('english', %s) AS q(query)
+                    WHERE s.search_vector @@ q.query
+                )
                 SELECT
                     e.*,
-                    ARRAY_AGG(DISTINCT k.name) FILTER (WHERE k.name IS NOT NULL) AS keywords,
-                    COALESCE(ROUND(AVG(r.rating)::numeric, 2), 0.0) AS average_rating,
-                    COUNT(DISTINCT r.user_id) AS rating_count,
+                    (SELECT ARRAY_AGG(k.name ORDER BY k.name)
+                     FROM experience_keywords ek
+                         JOIN keywords k ON ek.keyword_id = k.keyword_id
+                     WHERE ek.experience_id = e.experience_id) AS keywords,
+                    COALESCE(rs.average_rating, 0.0) AS average_rating,
+                    COALESCE(rs.rating_count, 0) AS rating_count,
                     owner_rating.rating AS owner_rating,
-                    MAX(CASE
-                        WHEN LOWER(e.title) LIKE LOWER(%s) THEN 3
-                        WHEN LOWER(e.description) LIKE LOWER(%s) THEN 2
-                        WHEN k.name IS NOT NULL AND LOWER(k.name) LIKE LOWER(%s) THEN 1
-                        ELSE 0
-                    END) as relevance_score
-                FROM experiences e
-                    LEFT JOIN experience_keywords ek ON e.experience_id = ek.experience_id
-                    LEFT JOIN keywords k ON ek.keyword_id = k.keyword_id
-                    LEFT JOIN experience_ratings r ON e.experience_id = r.experience_id
+                    m.relevance_score
+                FROM matches m
+                    JOIN experiences e ON e.experience_id = m.experience_id
+                    LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
                     LEFT JOIN experience_ratings owner_rating
                         ON e.experience_id = owner_rating.experience_id
                         AND e.user_id = owner_rating.user_id
-                WHERE
-                    LOWER(e.title) LIKE LOWER(%s)
-                    OR LOWER(e.description) LIKE LOWER(%s)
-                    OR (k.name IS NOT NULL AND LOWER(k.name) LIKE LOWER(%s))
-                GROUP BY e.experience_id, owner_rating.rating
-                ORDER BY
-                    relevance_score DESC,
-                    average_rating DESC,
-                    e.create_date DESC
+                WHERE {after}
+                ORDER BY {order_by}
                 LIMIT %s OFFSET %s
-            """, (search_pattern, search_pattern, search_pattern,
-                  search_pattern, search_pattern, search_pattern,
-                  limit, offset))
+            """.format(after=after_sql, order_by=order_by_clause(KEYWORD_SORT)),
+                (tsquery, *after_params, limit, offset))
 
             experiences = cur.fetchall()
 
@@ -93,17 +123,18 @@ def search_by_keyword():
                 'count': len(experiences),
                 'limit': limit,
                 'offset': offset,
+                'next_cursor': next_cursor(experiences, limit, KEYWORD_SORT),
                 'results': [dict(exp) for exp in experiences]
             }), 200
 
     except Exception as e:
         print(f"Search error: {e}")
         return jsonify({'error': 'Search failed', 'message': str(e)}), 500
-    finally:
-        conn.close()
 
 
 @search_bp.route('/location', methods=['GET'])
+@cached_json('search:location', ['lat', 'lon', 'radius', 'limit', 'offset', 'cursor'])
+@coalesced('search:location')
 def search_by_location():
     """Search experiences by geographic location.
 
@@ -115,6 +146,7 @@ def search_by_location():
         radius (float): Search radius in kilometers (default: 50, max: 500)
         limit (int): Maximum number of results (default: 50)
         offset (int): Number of results to skip (default: 0)
+        cursor (str): Opaque next_cursor from a previous page; replaces offset
 
     Returns:
         tuple: JSON array of experiences with distance information, HTTP 200
@@ -145,7 +177,14 @@ def search_by_location():
     if offset < 0:
         offset = 0
 
-    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        after_sql, after_params = cursor_condition(request.args.get('cursor'), LOCATION_SORT)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    if after_params:
+        offset = 0
+
+    conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Using PostGIS for distance calculation (more accurate and faster)
@@ -154,27 +193,30 @@ def search_by_location():
             cur.execute("""
                 SELECT
                     e.*,
-                    ARRAY_AGG(DISTINCT k.name) FILTER (WHERE k.name IS NOT NULL) AS keywords,
-                    COALESCE(ROUND(AVG(r.rating)::numeric, 2), 0.0) AS average_rating,
-                    COUNT(DISTINCT r.user_id) AS rating_count,
+                    (SELECT ARRAY_AGG(k.name ORDER BY k.name)
+                     FROM experience_keywords ek
+                         JOIN keywords k ON ek.keyword_id = k.keyword_id
+                     WHERE ek.experience_id = e.experience_id) AS keywords,
+                    COALESCE(rs.average_rating, 0.0) AS average_rating,
+                    COALESCE(rs.rating_count, 0) AS rating_count,
                     owner_rating.rating AS owner_rating,
-                    ROUND((ST_Distance(e.location, ST_Point(%s, %s)::geography) / 1000)::numeric, 2)::double precision AS distance_km
+                    d.distance_km
                 FROM experiences e
-                    LEFT JOIN experience_keywords ek ON e.experience_id = ek.experience_id
-                    LEFT JOIN keywords k ON ek.keyword_id = k.keyword_id
-                    LEFT JOIN experience_ratings r ON e.experience_id = r.experience_id
+                    CROSS JOIN LATERAL (
+                        SELECT ROUND((ST_Distance(e.location, ST_Point(%s, %s)::geography) / 1000)::numeric, 2)::double precision AS distance_km
+                    ) d
+                    LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
                     LEFT JOIN experience_ratings owner_rating
                         ON e.experience_id = owner_rating.experience_id
                         AND e.user_id = owner_rating.user_id
                 WHERE
                     e.location IS NOT NULL
                     AND ST_DWithin(e.location, ST_Point(%s, %s)::geography, %s * 1000)
-                GROUP BY e.experience_id, owner_rating.rating
-                ORDER BY
-                    distance_km ASC,
-                    average_rating DESC
+                    AND {after}
+                ORDER BY {order_by}
                 LIMIT %s OFFSET %s
-            """, (lon, lat, lon, lat, radius, limit, offset))
+            """.format(after=after_sql, order_by=order_by_clause(LOCATION_SORT)),
+                (lon, lat, lon, lat, radius, *after_params, limit, offset))
 
             experiences = cur.fetchall()
 
@@ -184,21 +226,22 @@ def search_by_location():
                 'count': len(experiences),
                 'limit': limit,
                 'offset': offset,
+                'next_cursor': next_cursor(experiences, limit, LOCATION_SORT),
                 'results': [dict(exp) for exp in experiences]
             }), 200
 
     except Exception as e:
         print(f"Location search error: {e}")
         return jsonify({'error': 'Location search failed', 'message': str(e)}), 500
-    finally:
-        conn.close()
 
 
 @search_bp.route('/combined', methods=['GET'])
+@cached_json('search:combined', ['q', 'lat', 'lon', 'radius', 'limit', 'offset', 'cursor'])
+@coalesced('search:combined')
 def search_combined():
     """Search experiences by both keyword and location.
 
-    Combines keyword search with geographic filtering.
+    Combines full-text keyword search with geographic filtering.
     Results are ranked by relevance, distance, and rating.
 
     Query Parameters:
@@ -208,11 +251,13 @@ def search_combined():
         radius (float): Search radius in kilometers (default: 50, max: 500)
         limit (int): Maximum number of results (default: 50)
         offset (int): Number of results to skip (default: 0)
+        cursor (str): Opaque next_cursor from a previous page; replaces offset
 
     Returns:
         tuple: JSON array of matching experiences with relevance and distance, HTTP 200
     """
-    query = request.args.get('q', '').strip()
+    # Normalized like the cache key, so a cached body echoes the same query
+    query = normalize_query(request.args.get('q', ''))
 
     try:
         lat = float(request.args.get('lat', 0))
@@ -225,6 +270,9 @@ def search_combined():
 
     if not query:
         return jsonify({'error': 'Query parameter "q" is required'}), 400
+    tsquery = build_tsquery(query)
+    if not tsquery:
+        return jsonify({'error': 'Query must contain at least one word'}), 400
     if not lat or not lon:
         return jsonify({'error': 'Latitude (lat) and longitude (lon) are required'}), 400
 
@@ -242,52 +290,54 @@ def search_combined():
     if offset < 0:
         offset = 0
 
-    conn = psycopg2.connect(DATABASE_URL)
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            search_pattern = f'%{query}%'
+        after_sql, after_params = cursor_condition(request.args.get('cursor'), COMBINED_SORT)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    if after_params:
+        offset = 0
 
-            # Using PostGIS for distance calculation and spatial filtering
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Same full-text engine as /keyword, restricted to the search radius
             # ST_DWithin uses GIST spatial index for efficient radius filtering
             cur.execute("""
+                WITH matches AS (
+                    SELECT s.experience_id,
+                           ts_rank_cd(s.search_vector, q.query)::double precision AS relevance_score
+                    FROM experience_search s,
+                         to_tsquery('english', %s) AS q(query)
+                    WHERE s.search_vector @@ q.query
+                )
                 SELECT
                     e.*,
-                    ARRAY_AGG(DISTINCT k.name) FILTER (WHERE k.name IS NOT NULL) AS keywords,
-                    COALESCE(ROUND(AVG(r.rating)::numeric, 2), 0.0) AS average_rating,
-                    COUNT(DISTINCT r.user_id) AS rating_count,
+                    (SELECT ARRAY_AGG(k.name ORDER BY k.name)
+                     FROM experience_keywords ek
+                         JOIN keywords k ON ek.keyword_id = k.keyword_id
+                     WHERE ek.experience_id = e.experience_id) AS keywords,
+                    COALESCE(rs.average_rating, 0.0) AS average_rating,
+                    COALESCE(rs.rating_count, 0) AS rating_count,
                     owner_rating.rating AS owner_rating,
-                    MAX(CASE
-                        WHEN LOWER(e.title) LIKE LOWER(%s) THEN 3
-                        WHEN LOWER(e.description) LIKE LOWER(%s) THEN 2
-                        WHEN k.name IS NOT NULL AND LOWER(k.name) LIKE LOWER(%s) THEN 1
-                        ELSE 0
-                    END) as relevance_score,
-                    ROUND((ST_Distance(e.location, ST_Point(%s, %s)::geography) / 1000)::numeric, 2)::double precision AS distance_km
-                FROM experiences e
-                    LEFT JOIN experience_keywords ek ON e.experience_id = ek.experience_id
-                    LEFT JOIN keywords k ON ek.keyword_id = k.keyword_id
-                    LEFT JOIN experience_ratings r ON e.experience_id = r.experience_id
+                    m.relevance_score,
+                    d.distance_km
+                FROM matches m
+                    JOIN experiences e ON e.experience_id = m.experience_id
+                    CROSS JOIN LATERAL (
+                        SELECT ROUND((ST_Distance(e.location, ST_Point(%s, %s)::geography) / 1000)::numeric, 2)::double precision AS distance_km
+                    ) d
+                    LEFT JOIN experience_rating_stats rs ON e.experience_id = rs.experience_id
                     LEFT JOIN experience_ratings owner_rating
                         ON e.experience_id = owner_rating.experience_id
                         AND e.user_id = owner_rating.user_id
                 WHERE
                     e.location IS NOT NULL
                     AND ST_DWithin(e.location, ST_Point(%s, %s)::geography, %s * 1000)
-                    AND (
-                        LOWER(e.title) LIKE LOWER(%s)
-                        OR LOWER(e.description) LIKE LOWER(%s)
-                        OR (k.name IS NOT NULL AND LOWER(k.name) LIKE LOWER(%s))
-                    )
-                GROUP BY e.experience_id, owner_rating.rating
-                ORDER BY
-                    relevance_score DESC,
-                    distance_km ASC,
-                    average_rating DESC
+                    AND {after}
+                ORDER BY {order_by}
                 LIMIT %s OFFSET %s
-            """, (search_pattern, search_pattern, search_pattern,
-                  lon, lat, lon, lat, radius,
-                  search_pattern, search_pattern, search_pattern,
-                  limit, offset))
+            """.format(after=after_sql, order_by=order_by_clause(COMBINED_SORT)),
+                (tsquery, lon, lat, lon, lat, radius, *after_params, limit, offset))
 
             experiences = cur.fetchall()
 
@@ -298,22 +348,22 @@ def search_combined():
                 'count': len(experiences),
                 'limit': limit,
                 'offset': offset,
+                'next_cursor': next_cursor(experiences, limit, COMBINED_SORT),
                 'results': [dict(exp) for exp in experiences]
             }), 200
 
     except Exception as e:
         print(f"Combined search error: {e}")
         return jsonify({'error': 'Combined search failed', 'message': str(e)}), 500
-    finally:
-        conn.close()
 
 
 @search_bp.route('/suggestions', methods=['GET'])
 def get_search_suggestions():
     """Get keyword suggestions based on partial query.
 
-    Returns unique keywords and titles that match the partial query.
-    Useful for autocomplete functionality.
+    Returns unique keywords and titles that start with (or, from 3 characters,
+    contain) the partial query. Prefix matches come first; each group is
+    ranked by popularity (keyword usage count / experience rating count).
 
     Query Parameters:
         q (str): Partial query string (required, min 2 characters)
@@ -325,46 +375,21 @@ def get_search_suggestions():
     query = request.args.get('q', '').strip()
     limit = request.args.get('limit', 10, type=int)
 
-    if not query or len(query) < 2:
-        return jsonify({'error': 'Query must be at least 2 characters'}), 400
+    if not query or len(query) < MIN_QUERY_LENGTH:
+        return jsonify({'error': f'Query must be at least {MIN_QUERY_LENGTH} characters'}), 400
 
     if limit < 1 or limit > 20:
         limit = 10
 
-    conn = psycopg2.connect(DATABASE_URL)
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            search_pattern = f'{query}%'
+        # Served from the in-memory index; SQL only until it has loaded
+        suggestions = suggest(get_db_connection, query, limit)
 
-            # Get suggestions from titles and keywords using proper JOINs
-            cur.execute("""
-                WITH keyword_suggestions AS (
-                    SELECT DISTINCT k.name as suggestion
-                    FROM keywords k
-                    JOIN experience_keywords ek ON k.keyword_id = ek.keyword_id
-                    WHERE LOWER(k.name) LIKE LOWER(%s)
-                ),
-                title_suggestions AS (
-                    SELECT DISTINCT e.title as suggestion
-                    FROM experiences e
-                    WHERE LOWER(e.title) LIKE LOWER(%s)
-                )
-                SELECT suggestion FROM keyword_suggestions
-                UNION
-                SELECT suggestion FROM title_suggestions
-                ORDER BY suggestion
-                LIMIT %s
-            """, (search_pattern, search_pattern, limit))
-
-            suggestions = cur.fetchall()
-
-            return jsonify({
-                'query': query,
-                'suggestions': [s['suggestion'] for s in suggestions]
-            }), 200
+        return jsonify({
+            'query': query,
+            'suggestions': suggestions
+        }), 200
 
     except Exception as e:
         print(f"Suggestions error: {e}")
         return jsonify({'error': 'Failed to get suggestions', 'message': str(e)}), 500
-    finally:
-        conn.close()
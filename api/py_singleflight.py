@@ -0,0 +1,107 @@
+import os
+import threading
+from functools import wraps
+
+# Flask==3.1.0
+from flask import make_response, request
+
+# ==============================================================================
+# Single-flight request coalescing
+# ==============================================================================
+# Concurrent identical reads share one computation: the first request (the
+# leader) runs the view, the others (followers) wait for it and reuse its
+# response body instead of issuing the same queries. Nothing is kept once the
+# leader finishes; stacking a cache decorator on top keeps results around.
+SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv('SINGLEFLIGHT_WAIT_SECONDS', '30'))  # Followers give up after this
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+
+    def do(self, key, fn, timeout=SINGLEFLIGHT_WAIT_SECONDS):
+        """Return fn()'s result, sharing it with concurrent callers of the same key.
+
+        Followers re-raise the leader's exception. A follower that waits
+        longer than timeout runs fn() itself.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+                leader = True
+            else:
+                call.followers += 1
+                self._stats['coalesced'] += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+_flight = SingleFlight()
+
+
+def singleflight_stats():
+    """Counters for /py/stats."""
+    return _flight.stats()
+
+
+def coalesced(prefix):
+    """Coalesce concurrent identical requests to a public, read-only view.
+
+    Requests are identical when they share the route prefix, view arguments
+    and query string. Only the response body, status and headers are shared;
+    each follower gets its own Response object.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (prefix, tuple(sorted(kwargs.items())), request.query_string)
+
+            def compute():
+                response = make_response(view(*args, **kwargs))
+                return response.get_data(), response.status_code, list(response.headers.items())
+
+            body, status, headers = _flight.do(key, compute)
+            return make_response(body, status, headers)
+        return wrapper
+    return decorator
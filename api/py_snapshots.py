@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+from api.py_db import pooled_connection
+from api.py_singleflight import SingleFlight
+
+# ==============================================================================
+# Stale-while-revalidate snapshots
+# ==============================================================================
+# A snapshot is the precomputed result of an expensive query for one parameter
+# set. Requests always get the stored snapshot; once it is older than fresh_for
+# (or marked stale by a change event) the next request starts a background
+# refresh and is still answered from the old snapshot. Only the very first
+# request for a parameter set waits, and concurrent first requests share one load.
+
+
+class _Snapshot:
+    __slots__ = ('value', 'loaded_at', 'stale', 'refreshing')
+
+    def __init__(self, value):
+        self.value = value
+        self.loaded_at = time.monotonic()
+        self.stale = False
+        self.refreshing = False
+
+
+class SnapshotCache:
+    """Per-parameter snapshots of a query, refreshed in the background."""
+
+    def __init__(self, name, loader, fresh_for, max_entries=256):
+        """
+        Args:
+            name (str): Label used in logs and stats
+            loader: loader(conn, *key) -> value; runs on a pooled connection
+            fresh_for (float): Seconds before a snapshot is refreshed
+            max_entries (int): Parameter sets kept (least recently used dropped)
+        """
+        self.name = name
+        self._loader = loader
+        self.fresh_for = fresh_for
+        self.max_entries = max_entries
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._stats = {'hits': 0, 'cold_loads': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    def _load(self, key):
+        with pooled_connection() as conn:
+            try:
+                value = self._loader(conn, *key)
+            finally:
+                conn.rollback()
+        snapshot = _Snapshot(value)
+        with self._lock:
+            self._snapshots[key] = snapshot
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def _refresh(self, key, snapshot):
+        try:
+            fresh = self._load(key)
+            with self._lock:
+                self._stats['refreshes'] += 1
+                # A change landed while loading; the new value may predate it
+                fresh.stale = snapshot.stale
+        except Exception as e:
+            print(f"Snapshot refresh failed ({self.name} {key}): {e}")
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+        finally:
+            snapshot.refreshing = False
+
+    def get(self, key):
+        """Return the snapshot for key, loading it synchronously only on first use."""
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None:
+                self._snapshots.move_to_end(key)
+                self._stats['hits'] += 1
+                expired = snapshot.stale or time.monotonic() - snapshot.loaded_at > self.fresh_for
+                if expired and not snapshot.refreshing:
+                    snapshot.refreshing = True
+                    snapshot.stale = False
+                    threading.Thread(target=self._refresh, args=(key, snapshot),
+                                     name=f'snapshot-{self.name}', daemon=True).start()
+                return snapshot.value
+            self._stats['cold_loads'] += 1
+        return self._flight.do(key, lambda: self._load(key)).value
+
+    def mark_stale(self, event=None):
+        """Refresh every snapshot on its next read (usable as a change-event handler)."""
+        with self._lock:
+            for snapshot in self._snapshots.values():
+                snapshot.stale = True
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._snapshots), fresh_for=self.fresh_for)
@@ -0,0 +1,409 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# psycopg2-binary==2.9.11
+import psycopg2
+from psycopg2.extras import RealDictCursor
+# firebase-admin==6.4.0 (google-cloud-storage / google-api-core come with it)
+from firebase_admin import storage
+from google.api_core.exceptions import NotFound
+
+from api.py_db import pooled_connection
+from api.py_photos import PHOTO_BLOB_PREFIX, object_path_from_url
+
+# ==============================================================================
+# Storage deletion outbox
+# ==============================================================================
+# Write paths never delete from the bucket themselves. They record the object
+# paths to remove in storage_deletions inside their own transaction (so a
+# rollback leaves the files alone), and a background worker drains the outbox
+# after commit: it leases a batch (next_attempt_at pushed into the future, so
+# other workers skip it), deletes the objects in parallel without holding a
+# transaction, then drops the finished rows. A missing object counts as
+# deleted, so every step can safely be repeated; failures retry with backoff.
+#
+# Content-addressed photos (photos/<sha256>.<ext>, see api/py_photos.py) are
+# shared, so deleting a photo only releases its photo_blobs reference; blobs
+# left unreferenced for STORAGE_GC_GRACE_SECONDS are queued by the worker.
+#
+# A periodic sweep lists the photo prefixes in the bucket and queues objects
+# that no experience_photos/photo_blobs row or in-flight upload references
+# (older than STORAGE_GC_GRACE_SECONDS, so uploads still finishing are kept).
+# It fails closed: if any photo URL can't be mapped to an object path (an
+# unexpected URL form), nothing is swept, since that photo's object would
+# otherwise look orphaned.
+STORAGE_GC = os.getenv('STORAGE_GC', '1') != '0'
+STORAGE_GC_WORKERS = int(os.getenv('STORAGE_GC_WORKERS', '8'))  # Parallel deletes per batch
+STORAGE_GC_BATCH_SIZE = 100
+STORAGE_GC_POLL_SECONDS = float(os.getenv('STORAGE_GC_POLL_SECONDS', '30'))  # Idle wait between drains
+STORAGE_GC_LEASE_SECONDS = 300  # A claimed batch is retried by anyone after this
+STORAGE_GC_MAX_BACKOFF_SECONDS = 3600
+STORAGE_SWEEP_INTERVAL = float(os.getenv('STORAGE_SWEEP_INTERVAL', '21600'))  # 0 disables the sweep
+STORAGE_GC_GRACE_SECONDS = int(os.getenv('STORAGE_GC_GRACE_SECONDS', '86400'))
+STORAGE_PHOTO_PREFIXES = ('experiences/', PHOTO_BLOB_PREFIX)
+_SWEEP_LOCK_KEY = 0x70686f746f  # pg advisory lock: one sweeper at a time across workers
+
+_wake = threading.Event()
+_worker_started = False
+_worker_lock = threading.Lock()
+
+
+def enqueue_deletions(cur, object_paths):
+    """Queue bucket objects for deletion (in the caller's transaction)."""
+    object_paths = sorted({path for path in object_paths if path})
+    if not object_paths:
+        return 0
+    with cur.connection.cursor() as outbox_cur:
+        outbox_cur.execute("""
+            INSERT INTO storage_deletions (object_path)
+            SELECT unnest(%s::text[])
+            ON CONFLICT (object_path) DO NOTHING
+        """, (object_paths,))
+        return outbox_cur.rowcount
+
+
+def _photo_paths(rows):
+    paths = []
+    for row in rows:
+        for url in row:
+            if url:
+                path = object_path_from_url(url)
+                if path is None:
+                    print(f"Not deleting {url}: not stored in this bucket")
+                paths.append(path)
+    return paths
+
+
+def release_photo_blobs(cur, content_hashes):
+    """Drop one photo_blobs reference per hash occurrence (in the caller's transaction)."""
+    if not content_hashes:
+        return
+    with cur.connection.cursor() as blob_cur:
+        blob_cur.execute("""
+            UPDATE photo_blobs b
+            SET ref_count = GREATEST(b.ref_count - r.refs, 0),
+                released_at = CASE WHEN b.ref_count - r.refs <= 0 THEN NOW() END
+            FROM (
+                SELECT content_hash, COUNT(*) AS refs
+                FROM unnest(%s::text[]) AS content_hash
+                GROUP BY content_hash
+            ) r
+            WHERE b.content_hash = r.content_hash
+        """, (content_hashes,))
+
+
+def _release_photo_files(cur, rows):
+    """Release shared blobs and queue files owned by single photos."""
+    release_photo_blobs(cur, [row[0] for row in rows if row[0]])
+    enqueue_deletions(cur, _photo_paths(row[1:] for row in rows if not row[0]))
+
+
+def delete_experience_photos(cur, experience_id, photo_ids):
+    """Delete photos of an experience and release their files (original and renditions).
+
+    Photo ids that don't belong to the experience are ignored.
+
+    Returns:
+        int: Number of photos deleted
+    """
+    if not photo_ids:
+        return 0
+    with cur.connection.cursor() as photo_cur:
+        photo_cur.execute("""
+            DELETE FROM experience_photos
+            WHERE experience_id = %s
+              AND photo_id = ANY(%s::int[])
+            RETURNING content_hash, photo_url, thumbnail_url, medium_url
+        """, (experience_id, photo_ids))
+        rows = photo_cur.fetchall()
+    _release_photo_files(cur, rows)
+    return len(rows)
+
+
+def enqueue_experience_files(cur, experience_id):
+    """Release every stored file of an experience that is about to be deleted."""
+    with cur.connection.cursor() as photo_cur:
+        photo_cur.execute("""
+            SELECT content_hash, photo_url, thumbnail_url, medium_url
+            FROM experience_photos
+            WHERE experience_id = %s
+        """, (experience_id,))
+        _release_photo_files(cur, photo_cur.fetchall())
+        # Signed uploads that were never finalized
+        photo_cur.execute("""
+            SELECT object_path
+            FROM photo_uploads
+            WHERE experience_id = %s
+              AND object_path IS NOT NULL
+              AND object_path NOT LIKE %s
+              AND photo_id IS NULL
+        """, (experience_id, PHOTO_BLOB_PREFIX + '%'))
+        return enqueue_deletions(cur, [row[0] for row in photo_cur.fetchall()])
+
+
+def collect_released_blobs(conn):
+    """Queue content-addressed blobs unreferenced for longer than the grace period.
+
+    Returns:
+        int: Number of blobs collected
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM photo_blobs b
+            WHERE b.ref_count = 0
+              AND b.released_at < NOW() - make_interval(secs => %s)
+              AND NOT EXISTS (SELECT 1 FROM experience_photos p WHERE p.content_hash = b.content_hash)
+            RETURNING b.object_path, b.thumbnail_url, b.medium_url
+        """, (STORAGE_GC_GRACE_SECONDS,))
+        rows = cur.fetchall()
+        enqueue_deletions(cur, [row[0] for row in rows] + _photo_paths(row[1:] for row in rows))
+    conn.commit()
+    return len(rows)
+
+
+def reconcile_blob_ref_counts(conn):
+    """Recompute photo_blobs.ref_count from experience_photos and fix any drift.
+
+    Returns:
+        int: Number of blobs whose counter was corrected
+    """
+    with conn.cursor() as cur:
+        cur.execute("LOCK TABLE experience_photos IN SHARE MODE")
+        cur.execute("""
+            UPDATE photo_blobs b
+            SET ref_count = actual.refs,
+                released_at = CASE WHEN actual.refs = 0 THEN COALESCE(b.released_at, NOW()) END
+            FROM (
+                SELECT b2.content_hash, COUNT(p.photo_id) AS refs
+                FROM photo_blobs b2
+                    LEFT JOIN experience_photos p ON p.content_hash = b2.content_hash
+                GROUP BY b2.content_hash
+            ) actual
+            WHERE b.content_hash = actual.content_hash
+              AND b.ref_count <> actual.refs
+        """)
+        fixed = cur.rowcount
+    conn.commit()
+    return fixed
+
+
+def wake_storage_gc():
+    """Drain the outbox now instead of at the next poll (call after commit; no-op without the worker)."""
+    _wake.set()
+
+
+def _delete_object(bucket, object_path):
+    try:
+        bucket.blob(object_path).delete()
+    except NotFound:
+        pass  # Already gone
+
+
+def drain_deletions(conn, executor, batch_size=STORAGE_GC_BATCH_SIZE):
+    """Delete one leased batch of queued objects.
+
+    Returns:
+        int: Number of outbox rows claimed (0 when nothing is due)
+    """
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            UPDATE storage_deletions d
+            SET next_attempt_at = NOW() + make_interval(secs => %s),
+                attempts = d.attempts + 1
+            FROM (
+                SELECT deletion_id
+                FROM storage_deletions
+                WHERE next_attempt_at <= NOW()
+                ORDER BY next_attempt_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ) due
+            WHERE d.deletion_id = due.deletion_id
+            RETURNING d.deletion_id, d.object_path, d.attempts
+        """, (STORAGE_GC_LEASE_SECONDS, batch_size))
+        claimed = cur.fetchall()
+    conn.commit()
+    if not claimed:
+        return 0
+
+    bucket = storage.bucket()
+    futures = [(row, executor.submit(_delete_object, bucket, row['object_path'])) for row in claimed]
+    done, failed = [], []
+    for row, future in futures:
+        try:
+            future.result()
+            done.append(row['deletion_id'])
+        except Exception as error:
+            backoff = min(STORAGE_GC_POLL_SECONDS * 2 ** row['attempts'], STORAGE_GC_MAX_BACKOFF_SECONDS)
+            failed.append((row['deletion_id'], str(error), backoff))
+
+    with conn.cursor() as cur:
+        if done:
+            cur.execute("DELETE FROM storage_deletions WHERE deletion_id = ANY(%s::int[])", (done,))
+        if failed:
+            cur.execute("""
+                UPDATE storage_deletions d
+                SET last_error = f.error,
+                    next_attempt_at = NOW() + make_interval(secs => f.backoff)
+                FROM unnest(%s::int[], %s::text[], %s::float8[]) AS f(deletion_id, error, backoff)
+                WHERE d.deletion_id = f.deletion_id
+            """, ([deletion_id for deletion_id, _, _ in failed],
+                  [error for _, error, _ in failed],
+                  [backoff for _, _, backoff in failed]))
+    conn.commit()
+    if failed:
+        print(f"Storage GC: {len(failed)} deletions failed, will retry")
+    return len(claimed)
+
+
+def _referenced_paths(conn):
+    """Object paths that rows still point to (photos and unfinished uploads).
+
+    Returns:
+        tuple: (paths, unmapped) - unmapped lists the URLs that could not be
+               mapped to an object path
+    """
+    paths, unmapped = set(), []
+
+    def add_urls(rows):
+        for row in rows:
+            for url in row:
+                if url:
+                    path = object_path_from_url(url)
+                    if path is None:
+                        unmapped.append(url)
+                    else:
+                        paths.add(path)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT photo_url, thumbnail_url, medium_url FROM experience_photos")
+        add_urls(cur.fetchall())
+        cur.execute("""
+            SELECT object_path
+            FROM photo_uploads
+            WHERE object_path IS NOT NULL
+              AND status <> 'failed'
+        """)
+        paths.update(row[0] for row in cur.fetchall())
+        cur.execute("SELECT object_path, thumbnail_url, medium_url FROM photo_blobs")
+        rows = cur.fetchall()
+        paths.update(row[0] for row in rows)
+        add_urls(row[1:] for row in rows)
+    return paths, unmapped
+
+
+def sweep_orphaned_objects(conn):
+    """Queue bucket objects under the photo prefixes that nothing references.
+
+    Objects younger than STORAGE_GC_GRACE_SECONDS are skipped: their rows may
+    not be committed yet. Renditions are kept while their original is referenced.
+    Nothing is swept while any photo URL can't be mapped to an object path.
+
+    Returns:
+        int: Number of objects queued (None if skipped or another worker is sweeping)
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (_SWEEP_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return None
+    try:
+        referenced, unmapped = _referenced_paths(conn)
+        conn.rollback()
+        if unmapped:
+            print(f"Storage GC: not sweeping, {len(unmapped)} photo URLs are not objects of this bucket "
+                  f"(e.g. {unmapped[0]})")
+            return None
+        referenced_stems = {path.rsplit('.', 1)[0] for path in referenced}
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=STORAGE_GC_GRACE_SECONDS)
+        orphans = []
+        bucket = storage.bucket()
+        for prefix in STORAGE_PHOTO_PREFIXES:
+            for blob in bucket.list_blobs(prefix=prefix):
+                if blob.name in referenced or blob.time_created is None or blob.time_created > cutoff:
+                    continue
+                stem = blob.name.rsplit('.', 1)[0]
+                if stem.rsplit('_', 1)[0] in referenced_stems:
+                    continue  # A rendition (<stem>_<size>.webp) of a referenced original
+                orphans.append(blob.name)
+
+        with conn.cursor() as cur:
+            queued = enqueue_deletions(cur, orphans)
+        conn.commit()
+        return queued
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_SWEEP_LOCK_KEY,))
+        conn.commit()
+
+
+def _run_forever():
+    executor = ThreadPoolExecutor(max_workers=STORAGE_GC_WORKERS, thread_name_prefix='storage-gc')
+    next_sweep = time.monotonic() + STORAGE_GC_POLL_SECONDS
+    while True:
+        try:
+            with pooled_connection() as conn:
+                try:
+                    collect_released_blobs(conn)
+                    while drain_deletions(conn, executor):
+                        pass
+                    if STORAGE_SWEEP_INTERVAL > 0 and time.monotonic() >= next_sweep:
+                        next_sweep = time.monotonic() + STORAGE_SWEEP_INTERVAL
+                        queued = sweep_orphaned_objects(conn)
+                        if queued:
+                            print(f"Storage GC: queued {queued} orphaned objects")
+                            continue
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            print(f"Storage GC error: {e}")
+        _wake.wait(STORAGE_GC_POLL_SECONDS)
+        _wake.clear()
+
+
+def start_storage_gc():
+    """Start this worker's outbox drain / sweep thread (once per process)."""
+    global _worker_started
+    with _worker_lock:
+        if _worker_started or not STORAGE_GC:
+            return
+        _worker_started = True
+    threading.Thread(target=_run_forever, name='storage-gc', daemon=True).start()
+
+
+if __name__ == "__main__":
+    # Usage: python -m api.py_storage_gc [--sweep]
+    # (reconciles blob ref counts, drains the outbox; --sweep first queues orphans)
+    # Initializes the Firebase app (storage.bucket() needs it)
+    import api.py_experiences  # noqa: F401
+    from api.py_db import DATABASE_URL
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        fixed = reconcile_blob_ref_counts(conn)
+        print(f"✓ Reconciled photo blob ref counts ({fixed} corrected)")
+        collected = collect_released_blobs(conn)
+        print(f"✓ Collected {collected} unreferenced photo blobs")
+        if '--sweep' in sys.argv[1:]:
+            queued = sweep_orphaned_objects(conn)
+            print(f"✓ Queued {queued or 0} orphaned objects")
+        with ThreadPoolExecutor(max_workers=STORAGE_GC_WORKERS) as executor:
+            total = 0
+            while True:
+                claimed = drain_deletions(conn, executor)
+                if not claimed:
+                    break
+                total += claimed
+        print(f"✓ Processed {total} queued deletions")
+    except Exception as e:
+        conn.rollback()
+        print(f"✗ Storage GC failed: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
@@ -1,15 +1,22 @@
-import os
 import psycopg2
-from dotenv import load_dotenv
 from flask import jsonify, Blueprint,request, g
 from functools import wraps
 from psycopg2.extras import RealDictCursor
 
+from api.py_cache import cached_entity_json
+from api.py_db import get_db_connection
+from api.py_events import apply_change, notify_change
+from api.py_pagination import (InvalidCursor, cursor_condition, next_cursor, order_by_clause,
+                               parse_page_size)
+from api.py_popularity import add_trip_experience, release_trip_experiences, remove_trip_experience
+
 trips_bp = Blueprint('trips', __name__)
 
-# Load environment variables
-load_dotenv()
-DATABASE_URL = os.getenv('DATABASE_URL')
+# Keyset order for trip listings (newest first, trip_id breaks ties)
+TRIP_SORT = [
+    ('t.create_date', 'DESC', 'create_date'),
+    ('t.trip_id', 'DESC', 'trip_id'),
+]
 
 def require_auth(f):
     """Decorator to require authentication for protected endpoints.
@@ -39,26 +46,46 @@ def experiences_root():
 @trips_bp.route('/user-trips', methods=['GET'])
 @require_auth
 def get_all_user_trips():
-    """Retrieve all trips."""
+    """Retrieve all trips.
+
+    Query Parameters:
+        limit (int): Page size (default: 50, max: 100); enables cursor pagination
+        cursor (str): Opaque next_cursor from a previous page; enables cursor pagination
+    """
     user_id = g.user_id
 
-    conn = psycopg2.connect(DATABASE_URL)
+    # Optional cursor pagination (opt in by sending limit and/or cursor)
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    limit = parse_page_size(request.args.get('limit', type=int))
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                        SELECT t.*,
-                               COUNT(te.experience_id) as experience_count
-                        FROM trips t
-                                 LEFT JOIN trip_experiences te ON t.trip_id = te.trip_id
-                        WHERE t.user_id = %s
-                        GROUP BY t.trip_id
-                        ORDER BY t.create_date DESC
-                        """, (user_id,))
-
-            trips = cur.fetchall()
-    finally:
-        conn.close()
-
+        after_sql, after_params = cursor_condition(request.args.get('cursor'), TRIP_SORT)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+                    SELECT t.*,
+                           COUNT(te.experience_id) as experience_count
+                    FROM trips t
+                             LEFT JOIN trip_experiences te ON t.trip_id = te.trip_id
+                    WHERE t.user_id = %s
+                      AND {after}
+                    GROUP BY t.trip_id
+                    ORDER BY {order_by}
+                    LIMIT %s
+                    """.format(after=after_sql, order_by=order_by_clause(TRIP_SORT)),
+                    (user_id, *after_params, limit if paginate else None))
+
+        trips = cur.fetchall()
+
+    if paginate:
+        return jsonify({
+            'count': len(trips),
+            'limit': limit,
+            'next_cursor': next_cursor(trips, limit, TRIP_SORT),
+            'results': [dict(trip) for trip in trips]
+        }), 200
     return jsonify([dict(trip) for trip in trips]), 200
 
 @trips_bp.route('/create-trip', methods=['PUT'])
@@ -86,7 +113,7 @@ def create_trip():
     end_date = data.get('end_date') if data.get('end_date') else None
     create_date = data.get('create_date')
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Insert trip and return the new trip_id
@@ -97,8 +124,10 @@ def create_trip():
                         """, (user_id, title, description, start_date, end_date, create_date))
 
             added_row = cur.fetchone()
+            event = notify_change(cur, 'trip', [added_row['trip_id']], 'create')
 
         conn.commit()
+        apply_change(event)
         return added_row, 200
 
     except psycopg2.Error as e:
@@ -106,8 +135,6 @@ def create_trip():
         print(f"Database error: {e}")
         return jsonify({'error': 'Database Error'}), 400
 
-    finally:
-        conn.close()
 
 @trips_bp.route('/delete-trip/<int:trip_id>', methods=['DELETE'])
 @require_auth
@@ -115,34 +142,37 @@ def delete_trip(trip_id):
     """Delete a Trip"""
     user_id = g.user_id
 
-    conn = psycopg2.connect(DATABASE_URL)
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # fetch experience
-            cur.execute('SELECT * FROM trips WHERE trip_id = %s', (trip_id,))
-            trip = cur.fetchone()
+    conn = get_db_connection()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        # fetch experience
+        cur.execute('SELECT * FROM trips WHERE trip_id = %s', (trip_id,))
+        trip = cur.fetchone()
 
-            # Check if experience exists
-            if not trip:
-                return jsonify({'error': 'Trip not found'}), 404
+        # Check if experience exists
+        if not trip:
+            return jsonify({'error': 'Trip not found'}), 404
 
-            # Verify user is the creator of the experience
-            if trip['user_id'] != user_id:
-                return jsonify({'error': 'Unauthorized'}), 403
+        # Verify user is the creator of the experience
+        if trip['user_id'] != user_id:
+            return jsonify({'error': 'Unauthorized'}), 403
 
-            # Delete the experience from the database
-            cur.execute('DELETE FROM trips where trip_id = %s', (trip_id,))
-        conn.commit()
-        return jsonify({'message': 'Trip deleted'}), 200
+        # Unlink experiences first so their trip_count is decremented
+        experience_ids = release_trip_experiences(cur, trip_id)
+        event = notify_change(cur, 'trip', [trip_id], 'delete', related={'experience': experience_ids})
+
+        # Delete the experience from the database
+        cur.execute('DELETE FROM trips where trip_id = %s', (trip_id,))
+    conn.commit()
+    apply_change(event)
+    return jsonify({'message': 'Trip deleted'}), 200
 
-    finally:
-        conn.close()
 
 @trips_bp.route('/get-trip-details/<int:trip_id>', methods=['GET'])
 @require_auth
+@cached_entity_json('trip:details', 'trip', 'trip_id')
 def get_trip_details(trip_id):
     """Get a single trip by ID with its experiences and metadata."""
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Fetch trip
@@ -182,22 +212,13 @@ def get_trip_details(trip_id):
                     e.description,
                     te.display_order,
                     e.create_date,
-                    COALESCE(ROUND(AVG(r.rating)::numeric, 1), 0.0) AS average_rating
+                    COALESCE(ROUND(rs.average_rating, 1), 0.0) AS average_rating
                 FROM trip_experiences te
                 JOIN experiences e
                     ON te.experience_id = e.experience_id
-                LEFT JOIN experience_ratings r
-                    ON e.experience_id = r.experience_id
+                LEFT JOIN experience_rating_stats rs
+                    ON e.experience_id = rs.experience_id
                 WHERE te.trip_id = %s
-                GROUP BY
-                    e.experience_id,
-                    e.title,
-                    e.latitude,
-                    e.longitude,
-                    e.address,
-                    e.description,
-                    te.display_order,
-                    e.create_date
                 ORDER BY
                     te.display_order NULLS LAST,
                     e.create_date DESC
@@ -231,8 +252,6 @@ def get_trip_details(trip_id):
 
     except psycopg2.Error as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
-    finally:
-        conn.close()
 
 
 @trips_bp.route('/add-experience', methods=['PUT'])
@@ -244,15 +263,15 @@ def add_experience_to_trip():
     trip_id = data['trip_id']
     experience_id = data['experience_id']
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO trip_experiences (trip_id, experience_id)
-                VALUES (%s, %s)
-                ON CONFLICT (trip_id, experience_id) DO NOTHING
-            """, (trip_id, experience_id))
+            # Insert the link and bump trip_count in one statement
+            add_trip_experience(cur, trip_id, experience_id)
+            event = notify_change(cur, 'trip', [trip_id], 'add_experience',
+                                  related={'experience': [experience_id]})
         conn.commit()
+        apply_change(event)
         return {'message': 'Experience added successfully'}, 200
 
     except Exception as e:
@@ -260,8 +279,6 @@ def add_experience_to_trip():
         print("add_experience_to_trip error:", e)
         return {'error': str(e)}, 500
 
-    finally:
-        conn.close()
 
 @trips_bp.route('/remove-experience', methods=['DELETE'])
 @require_auth
@@ -273,29 +290,18 @@ def remove_experience_from_trip():
     experience_id = data['experience_id']
     # user_id = data['user_id']
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            # Check if the relationship exists
-            cur.execute("""
-                        SELECT COUNT(*)
-                        FROM trip_experiences
-                        WHERE trip_id = %s
-                          AND experience_id = %s
-                        """, (trip_id, experience_id))
-
-            if cur.fetchone()[0] == 0:
+            # Delete the relationship (and decrement trip_count)
+            if not remove_trip_experience(cur, trip_id, experience_id):
                 return jsonify({"error": "Experience not found in this trip"}), 404
 
-            # Delete the relationship
-            cur.execute("""
-                        DELETE
-                        FROM trip_experiences
-                        WHERE trip_id = %s
-                          AND experience_id = %s
-                        """, (trip_id, experience_id))
+            event = notify_change(cur, 'trip', [trip_id], 'remove_experience',
+                                  related={'experience': [experience_id]})
 
         conn.commit()
+        apply_change(event)
         return jsonify({
             "message": "Experience removed from trip successfully",
             "trip_id": trip_id,
@@ -305,8 +311,6 @@ def remove_experience_from_trip():
     except psycopg2.Error as e:
         conn.rollback()
         return jsonify({"error": f"Database error: {str(e)}"}), 500
-    finally:
-        conn.close()
 
 @trips_bp.route('/edit-trip', methods=['PUT'])
 @require_auth
@@ -335,7 +339,7 @@ def edit_trip():
     start_date = data.get('start_date') if data.get('start_date') else None
     end_date = data.get('end_date') if data.get('end_date') else None
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_db_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Update trip and return the updated row
@@ -356,7 +360,10 @@ def edit_trip():
                 conn.rollback()
                 return jsonify({'error': 'Trip not found or unauthorized'}), 404
 
+            event = notify_change(cur, 'trip', [trip_id], 'update')
+
         conn.commit()
+        apply_change(event)
         return updated_row, 200
 
     except psycopg2.Error as e:
@@ -364,8 +371,6 @@ def edit_trip():
         print(f"Database error: {e}")
         return jsonify({'error': 'Database Error'}), 500
 
-    finally:
-        conn.close()
 
 @trips_bp.route('/update-experience-order', methods=['PUT'])
 @require_auth
@@ -393,7 +398,7 @@ def update_experience_order():
     if not isinstance(updates, list) or len(updates) == 0:
         return jsonify({'error': 'updates must be a non-empty array'}), 400
 
-    conn = psycopg2.connect(DATABASE_URL)
+    conn = get_db_connection()
     try:
         with conn.cursor() as cur:
             # Update each experience's order within the trip
@@ -411,11 +416,12 @@ def update_experience_order():
                     WHERE trip_id = %s AND experience_id = %s
                 """, (order, trip_id, experience_id))
 
+            event = notify_change(cur, 'trip', [trip_id], 'reorder')
+
         conn.commit()
+        apply_change(event)
         return jsonify({'message': 'Experience orders updated successfully'}), 200
 
     except psycopg2.Error as e:
         conn.rollback()
-        return jsonify({'error': f'Database error: {str(e)}'}), 500
-    finally:
-        conn.close()
\ No newline at end of file
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
\ No newline at end of file
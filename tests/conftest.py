@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# api/ is imported as a namespace package from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_conn():
+    """A connection to DATABASE_URL, rolled back afterwards; skips without one."""
+    dsn = os.getenv('DATABASE_URL')
+    if not dsn:
+        pytest.skip("DATABASE_URL is not set")
+    psycopg2 = pytest.importorskip('psycopg2')
+    conn = psycopg2.connect(dsn)
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+@pytest.fixture
+def client(db_conn):
+    """A test client for the API blueprints, backed by DATABASE_URL."""
+    flask = pytest.importorskip('flask')
+    from api import py_db
+    from api.py_experiences import experiences_bp
+    from api.py_search import search_bp
+    from api.py_trips import trips_bp
+
+    app = flask.Flask(__name__)
+    py_db.init_app(app)
+    app.register_blueprint(experiences_bp, url_prefix='/py/experiences')
+    app.register_blueprint(trips_bp, url_prefix='/py/trips')
+    app.register_blueprint(search_bp, url_prefix='/py/search')
+    return app.test_client()
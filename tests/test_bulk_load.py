@@ -0,0 +1,120 @@
+import io
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+
+from api import bulk_load
+from api.bulk_load import RejectedRecord, batches, detect_format, normalize_record
+
+RECORD = {
+    'user_id': 'u1',
+    'title': 'Sunset hike',
+    'description': 'Great views',
+    'experience_date': '2025-04-10',
+    'address': 'Somewhere',
+    'latitude': '36.1',
+    'longitude': -112.1,
+    'keywords': ['hiking', 'sunset'],
+    'user_rating': 4,
+}
+
+
+class SmallChunks(io.StringIO):
+    """Reads a few characters at a time, so array elements span chunks."""
+
+    def read(self, size=-1):
+        return super().read(7)
+
+
+def test_json_array_is_streamed_across_chunks():
+    records = [{'title': f'Experience {i}', 'keywords': ['a,b', ']'], 'n': i} for i in range(20)]
+    source = SmallChunks(json.dumps(records, indent=2))
+    assert list(bulk_load._iter_json_array(source)) == records
+
+
+def test_json_array_empty():
+    assert list(bulk_load._iter_json_array(io.StringIO(' [ ] '))) == []
+
+
+@pytest.mark.parametrize('text', ['{"title": "not an array"}', '[{"title": "a"}, {"title": '])
+def test_json_array_rejects_bad_input(text):
+    with pytest.raises(ValueError):
+        list(bulk_load._iter_json_array(io.StringIO(text)))
+
+
+def test_ndjson_and_csv_readers():
+    assert list(bulk_load._iter_ndjson(io.StringIO('{"a": 1}\n\n{"a": 2}\n'))) == [{'a': 1}, {'a': 2}]
+    rows = list(bulk_load._iter_csv(io.StringIO('title,keywords\nHike,hiking;views\n')))
+    assert rows == [{'title': 'Hike', 'keywords': 'hiking;views'}]
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('data.json', 'json'), ('data.NDJSON', 'ndjson'), ('data.jsonl', 'ndjson'), ('data.csv', 'csv'),
+])
+def test_detect_format(path, expected):
+    assert detect_format(path) == expected
+
+
+def test_detect_format_unknown():
+    with pytest.raises(ValueError):
+        detect_format('data.xml')
+
+
+def test_normalize_record():
+    assert normalize_record(RECORD) == [
+        'u1', 'Sunset hike', 'Great views', date(2025, 4, 10), None, 'Somewhere', 36.1, -112.1,
+        '["hiking", "sunset"]', 4, '[]',
+    ]
+
+
+def test_normalize_record_public_json_shape():
+    record = dict(RECORD, create_date='2025-04-11T08:00:00Z', imageURLs=['https://a/1.jpg'])
+    del record['user_rating']
+    record['rating'] = '5'
+    row = normalize_record(record)
+    assert row[4] == datetime(2025, 4, 11, 8, tzinfo=timezone.utc)
+    assert row[9] == 5
+    assert row[10] == '["https://a/1.jpg"]'
+
+
+def test_normalize_record_csv_lists():
+    row = normalize_record(dict(RECORD, keywords='hiking; sunset ;', photos='["https://a/1.jpg"]'))
+    assert row[8] == '["hiking", "sunset"]'
+    assert row[10] == '["https://a/1.jpg"]'
+
+
+@pytest.mark.parametrize('rating', [0, 6, '', None])
+def test_normalize_record_ignores_missing_or_out_of_range_ratings(rating):
+    assert normalize_record(dict(RECORD, user_rating=rating))[9] is None
+
+
+@pytest.mark.parametrize('changes, reason', [
+    ({'title': '  '}, 'missing title'),
+    ({'latitude': 'north'}, 'numeric'),
+    ({'latitude': 91}, 'out of range'),
+    ({'longitude': float('nan')}, 'out of range'),
+    ({'experience_date': '10/04/2025'}, 'bad date'),
+    ({'user_rating': 'great'}, 'integer'),
+    ({'keywords': '[not json'}, 'keywords'),
+])
+def test_normalize_record_rejects(changes, reason):
+    with pytest.raises(RejectedRecord, match=reason):
+        normalize_record(dict(RECORD, **changes))
+
+
+def test_normalize_record_rejects_non_objects():
+    with pytest.raises(RejectedRecord):
+        normalize_record(['not', 'a', 'dict'])
+
+
+def test_batches_are_numbered_with_global_sequence():
+    assert list(batches('abcde', 2)) == [
+        (0, [(0, 'a'), (1, 'b')]), (1, [(2, 'c'), (3, 'd')]), (2, [(4, 'e')]),
+    ]
+
+
+def test_copy_value_escapes_text_format():
+    assert bulk_load._copy_value(None) == '\\N'
+    assert bulk_load._copy_value('a\tb\nc\\d') == 'a\\tb\\nc\\\\d'
+    assert bulk_load._copy_value(date(2025, 1, 2)) == '2025-01-02'
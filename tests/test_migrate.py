@@ -0,0 +1,79 @@
+import re
+
+import pytest
+
+from api.migrate import MigrationError, load_migrations, split_statements
+
+
+def _write(directory, files):
+    for name, sql in files.items():
+        (directory / name).write_text(sql, encoding='utf-8')
+    return str(directory)
+
+
+def test_split_statements():
+    assert split_statements("CREATE TABLE a (x int); CREATE TABLE b (y int);\n") == [
+        'CREATE TABLE a (x int)', 'CREATE TABLE b (y int)']
+
+
+def test_split_statements_ignores_quoted_semicolons():
+    sql = """
+        INSERT INTO t VALUES ('a;b', "we;ird");
+        CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql;
+        DO $$ BEGIN PERFORM 1; END $$;
+    """
+    assert split_statements(sql) == [
+        """INSERT INTO t VALUES ('a;b', "we;ird")""",
+        'CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql',
+        'DO $$ BEGIN PERFORM 1; END $$',
+    ]
+
+
+def test_split_statements_skips_comments():
+    sql = """
+        -- migrate: no-transaction
+        -- Index; with a semicolon in the comment
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS i ON t (x);
+        -- trailing comment only
+    """
+    statement, = split_statements(sql)
+    assert statement.endswith('CREATE INDEX CONCURRENTLY IF NOT EXISTS i ON t (x)')
+
+
+def test_load_migrations_orders_and_detects_no_transaction(tmp_path):
+    directory = _write(tmp_path, {
+        '0002_indexes.sql': '-- migrate: no-transaction\nCREATE INDEX CONCURRENTLY i ON t (x);\n',
+        '0001_tables.sql': 'CREATE TABLE t (x int);\n',
+        'README.md': 'not a migration',
+    })
+    first, second = load_migrations(directory)
+    assert (first.version, first.name, first.transactional) == (1, 'tables', True)
+    assert (second.version, second.name, second.transactional) == (2, 'indexes', False)
+    assert first.checksum != second.checksum
+
+
+def test_no_transaction_marker_must_be_the_first_line(tmp_path):
+    directory = _write(tmp_path, {'0001_a.sql': 'CREATE TABLE t (x int);\n-- migrate: no-transaction\n'})
+    assert load_migrations(directory)[0].transactional
+
+
+@pytest.mark.parametrize('files', [
+    {'1_bad_name.sql': 'SELECT 1;'},
+    {'0001_a.sql': 'SELECT 1;', '0001_b.sql': 'SELECT 2;'},
+])
+def test_load_migrations_rejects_bad_files(tmp_path, files):
+    with pytest.raises(MigrationError):
+        load_migrations(_write(tmp_path, files))
+
+
+def test_repository_migrations():
+    migrations = load_migrations()
+    assert [m.version for m in migrations] == list(range(1, len(migrations) + 1))
+    for migration in migrations:
+        indexes = re.findall(r'^CREATE INDEX[^;]*', migration.sql, re.MULTILINE)
+        if migration.transactional:
+            # CONCURRENTLY cannot run inside the migration's transaction
+            assert not any('CONCURRENTLY' in index for index in indexes)
+        else:
+            # Statements run one by one in autocommit, so a rerun must skip finished ones
+            assert all(index.startswith('CREATE INDEX CONCURRENTLY IF NOT EXISTS') for index in indexes)
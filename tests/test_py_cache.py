@@ -0,0 +1,73 @@
+import time
+
+from api.py_cache import LocalCacheBackend, cache_key
+
+
+def test_get_set_and_lru_eviction():
+    cache = LocalCacheBackend(max_entries=2)
+    cache.set('a', b'1', ttl=60)
+    cache.set('b', b'2', ttl=60)
+    assert cache.get('a') == b'1'  # a is now most recently used
+    cache.set('c', b'3', ttl=60)
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1' and cache.get('c') == b'3'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_bound():
+    cache = LocalCacheBackend(max_bytes=10)
+    cache.set('a', b'12345', ttl=60)  # 6 bytes with the key
+    cache.set('b', b'12345', ttl=60)
+    assert cache.get('a') is None and cache.get('b') == b'12345'
+    cache.set('c', b'x' * 20, ttl=60)  # Larger than the whole cache: not stored
+    assert cache.get('c') is None and cache.get('b') == b'12345'
+    assert cache.stats()['bytes'] == 6
+
+
+def test_ttl_expiry(monkeypatch):
+    cache = LocalCacheBackend()
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    cache.set('a', b'1', ttl=10)
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert cache.get('a') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_generations_bump():
+    cache = LocalCacheBackend()
+    assert cache.get_generation('experiences') == 0
+    assert cache.bump_generation('experiences') == 1
+    assert cache.get_generation('experiences') == 1
+    assert cache.get_generation('experience:1') == 0
+
+
+def test_generations_are_bounded_and_never_go_back():
+    cache = LocalCacheBackend(max_entries=2)
+    for _ in range(3):
+        cache.bump_generation('experience:1')
+    cache.bump_generation('experience:2')
+    cache.bump_generation('experience:3')  # Prunes experience:1 (at 3)
+
+    assert cache.stats()['generations'] == 2
+    assert cache.get_generation('experience:1') >= 3
+    assert cache.bump_generation('experience:1') > 3
+
+
+def test_recently_read_generations_are_kept():
+    cache = LocalCacheBackend(max_entries=2)
+    cache.bump_generation('experiences')
+    cache.bump_generation('experience:1')
+    cache.get_generation('experiences')
+    cache.bump_generation('experience:2')  # Prunes experience:1, not experiences
+    assert cache.get_generation('experiences') == 1
+
+
+def test_cache_key_normalizes_params():
+    assert cache_key('search', {'lat': '34', 'radius': '5.0'}, 1) == \
+        cache_key('search', {'lat': '34.0', 'radius': '5'}, 1)
+    assert cache_key('search', {'q': '  Hiking   Trails'}, 1) == cache_key('search', {'q': 'hiking trails'}, 1)
+    assert cache_key('search', {'q': 'hiking', 'cursor': None}, 1) == \
+        cache_key('search', {'q': 'hiking', 'cursor': ''}, 1)
+    assert cache_key('search', {'cursor': 'AbC'}, 1) != cache_key('search', {'cursor': 'abc'}, 1)
+    assert cache_key('search', {'q': 'hiking'}, 1) != cache_key('search', {'q': 'hiking'}, 2)
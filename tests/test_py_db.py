@@ -0,0 +1,171 @@
+import threading
+import time
+
+import psycopg2
+import pytest
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from api import py_db
+from api.py_db import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conn.pings += 1
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class FakeInfo:
+    transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    """Stands in for a psycopg2 connection (passed to the pool as connection_factory)."""
+
+    def __init__(self, dsn, *args, **kwargs):
+        self.dsn = dsn
+        self.closed = 0
+        self.broken = False
+        self.pings = 0
+        self.rollbacks = 0
+        self.info = FakeInfo()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(**kwargs):
+    kwargs.setdefault('min_size', 0)
+    kwargs.setdefault('max_size', 2)
+    return ConnectionPool('dbname=test', connection_factory=FakeConnection, **kwargs)
+
+
+def test_min_size_connections_are_opened_up_front():
+    pool = make_pool(min_size=2)
+    assert pool.stats()['connects'] == 2
+    assert pool.stats()['size'] == pool.stats()['idle'] == 2
+
+
+def test_connections_are_reused_last_in_first_out():
+    pool = make_pool()
+    first, second = pool.getconn(), pool.getconn()
+    assert isinstance(first, FakeConnection) and first.dsn == 'dbname=test'
+
+    pool.putconn(first)
+    pool.putconn(second)
+    assert pool.getconn() is second
+    assert pool.getconn() is first
+    assert pool.stats()['connects'] == 2
+
+
+def test_checkout_times_out_when_exhausted():
+    pool = make_pool(max_size=1, timeout=0.05)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_returned_connection_wakes_a_waiter():
+    pool = make_pool(max_size=1, timeout=5)
+    conn = pool.getconn()
+    checked_out = []
+    waiter = threading.Thread(target=lambda: checked_out.append(pool.getconn()))
+    waiter.start()
+    while pool.stats()['waits'] == 0:
+        time.sleep(0.001)
+
+    pool.putconn(conn)
+    waiter.join(timeout=5)
+    assert checked_out == [conn]
+
+
+def test_open_transaction_is_rolled_back_on_return():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert pool.getconn() is conn
+
+
+def test_closed_connection_is_discarded_on_return():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.close()
+    pool.putconn(conn)
+
+    assert pool.stats()['discarded'] == 1
+    assert pool.stats()['size'] == 0
+    assert pool.getconn() is not conn
+
+
+def test_broken_idle_connection_is_replaced_on_checkout():
+    pool = make_pool(health_check_idle=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.broken = True
+
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert conn.pings == 1 and conn.closed
+    assert pool.stats()['discarded'] == 1
+
+
+def test_recently_used_connection_skips_the_ping():
+    pool = make_pool(health_check_idle=60)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert conn.pings == 0
+
+
+def test_expired_connection_is_recycled():
+    pool = make_pool(max_lifetime=60)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    pool._created_at[id(conn)] -= 120
+
+    assert pool.getconn() is not conn
+    assert conn.closed
+    assert pool.stats()['connects'] == 2
+
+
+def test_closed_pool_refuses_checkouts():
+    pool = make_pool(min_size=1)
+    pool.closeall()
+    with pytest.raises(PoolError):
+        pool.getconn()
+
+
+def test_request_connection_is_returned_on_teardown(monkeypatch):
+    flask = pytest.importorskip('flask')
+    pool = make_pool()
+    monkeypatch.setattr(py_db, '_pool', pool)
+    app = flask.Flask(__name__)
+    py_db.init_app(app)
+
+    with app.app_context():
+        conn = py_db.get_db_connection()
+        assert py_db.get_db_connection() is conn
+        assert pool.stats()['idle'] == 0
+    assert pool.stats()['idle'] == 1
+    assert pool.getconn() is conn
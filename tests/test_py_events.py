@@ -0,0 +1,60 @@
+import json
+
+from api import py_events
+from api.py_events import EVENTS_CHANNEL, MAX_PAYLOAD_BYTES, PROCESS_ID, apply_change, notify_change
+
+
+class RecordingCursor:
+    """Cursor stand-in that records the NOTIFY instead of sending it."""
+
+    def __init__(self):
+        self.notified = []
+
+    def execute(self, sql, params):
+        assert 'pg_notify' in sql
+        self.notified.append(params)
+
+
+def _payload(cur):
+    (channel, payload), = cur.notified
+    assert channel == EVENTS_CHANNEL
+    assert len(payload.encode()) <= MAX_PAYLOAD_BYTES
+    return json.loads(payload)
+
+
+def test_event_shape():
+    cur = RecordingCursor()
+    event = notify_change(cur, 'trip', ['3'], 'add_experience', related={'experience': [9, 2, 9]})
+    assert event == {'entity': 'trip', 'ids': [3], 'action': 'add_experience',
+                     'related': {'experience': [2, 9]}, 'origin': PROCESS_ID}
+    assert _payload(cur) == event
+
+
+def test_details_are_sent_when_they_fit():
+    cur = RecordingCursor()
+    notify_change(cur, 'experience', [1], 'update', suggestions={'added_keywords': ['hiking']})
+    assert _payload(cur)['suggestions'] == {'added_keywords': ['hiking']}
+
+
+def test_oversized_details_are_dropped_but_ids_kept():
+    cur = RecordingCursor()
+    huge = {'added_keywords': [f'keyword {i}' for i in range(2000)]}
+    event = notify_change(cur, 'experience', [1], 'update', related={'trip': list(range(50))},
+                          suggestions=huge)
+    assert 'suggestions' not in event
+    assert _payload(cur) == event
+    assert event['ids'] == [1] and event['related'] == {'trip': list(range(50))}
+
+
+def test_apply_change_isolates_handler_errors(monkeypatch):
+    monkeypatch.setattr(py_events, '_handlers', {'trip': []})
+    seen = []
+
+    def failing(event):
+        raise RuntimeError('boom')
+
+    py_events.subscribe('trip', failing)
+    py_events.subscribe('trip', seen.append)
+    apply_change({'entity': 'trip', 'ids': [1]})
+    apply_change({'entity': 'experience', 'ids': [1]})
+    assert seen == [{'entity': 'trip', 'ids': [1]}]
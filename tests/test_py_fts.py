@@ -0,0 +1,18 @@
+import pytest
+
+from api.py_fts import build_tsquery
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('hik', 'hik:*'),
+    ('Grand  Canyon!', 'grand:* & canyon:*'),
+    ("it's a:b & c | !d", 'it:* & s:* & a:* & b:* & c:* & d:*'),  # tsquery operators are dropped
+    ('Café Zürich', 'café:* & zürich:*'),
+])
+def test_build_tsquery(query, expected):
+    assert build_tsquery(query) == expected
+
+
+@pytest.mark.parametrize('query', ['', '   ', '&|!():*'])
+def test_build_tsquery_without_words(query):
+    assert build_tsquery(query) is None
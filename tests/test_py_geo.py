@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from api.py_geo import (VIEWPORT_INDEX_NAME, cluster_cell_size, lng_span, split_antimeridian, tile_in_range,
+                        viewport_condition)
+
+
+def test_split_antimeridian():
+    assert split_antimeridian(-10.0, 10.0) == [(-10.0, 10.0)]
+    assert split_antimeridian(170.0, -170.0) == [(170.0, 180.0), (-180.0, -170.0)]
+
+
+def test_lng_span_wraps():
+    assert lng_span(-10.0, 10.0) == 20.0
+    assert lng_span(170.0, -170.0) == 20.0
+
+
+def test_viewport_condition_has_one_envelope_per_side():
+    condition, params = viewport_condition(10.0, 170.0, -20.0, -170.0)
+    assert condition.count('ST_MakeEnvelope') == 2
+    assert params == [170.0, -20.0, 180.0, 10.0, -180.0, -20.0, -170.0, 10.0]
+
+
+def test_cluster_cell_size_follows_zoom():
+    # Zoom 2: 4 tiles of 4 cells across the world
+    assert cluster_cell_size(2, -10, -10, 10, 10, cells_per_tile=4, max_cells=1024) == 22.5
+    assert cluster_cell_size(3, -10, -10, 10, 10, cells_per_tile=4, max_cells=1024) == 11.25
+
+
+def test_cluster_cell_size_bounds_the_cell_count():
+    cell = cluster_cell_size(10, -60, -170, 60, 170, cells_per_tile=4, max_cells=100)
+    assert (340 / cell + 1) * (120 / cell + 1) <= 100
+    assert 360 % cell == 0
+
+
+def test_cluster_cell_size_across_the_antimeridian():
+    # A 20 degree wide box, not 340 degrees
+    assert (cluster_cell_size(6, -10, 170, 10, -170, cells_per_tile=4, max_cells=64)
+            == cluster_cell_size(6, -10, -10, 10, 10, cells_per_tile=4, max_cells=64))
+
+
+@pytest.mark.parametrize('z, x, y, expected', [
+    (0, 0, 0, True),
+    (3, 7, 7, True),
+    (3, 8, 0, False),
+    (3, 0, -1, False),
+    (23, 0, 0, False),
+])
+def test_tile_in_range(z, x, y, expected):
+    assert tile_in_range(z, x, y, max_zoom=22) is expected
+
+
+@pytest.mark.parametrize('bounds', [
+    (36.0, -113.0, 38.0, -111.0),
+    (-20.0, 170.0, -10.0, -170.0),  # crosses the antimeridian
+], ids=['regular', 'antimeridian'])
+def test_viewport_plan_uses_index(db_conn, bounds):
+    condition, params = viewport_condition(*bounds)
+    with db_conn.cursor() as cur:
+        # Tiny tables are always cheaper to scan, so take size out of the plan choice
+        cur.execute("SET LOCAL enable_seqscan = off")
+        cur.execute(f"EXPLAIN (FORMAT JSON) SELECT e.experience_id FROM experiences e WHERE {condition}", params)
+        plan = cur.fetchone()[0]
+    assert VIEWPORT_INDEX_NAME in json.dumps(plan)
@@ -0,0 +1,93 @@
+import uuid
+
+import pytest
+
+from api import py_keywords
+from api.py_keywords import link_keywords, resolve_keyword_ids
+
+
+@pytest.fixture(autouse=True)
+def empty_keyword_id_cache(monkeypatch):
+    # Ids cached by one test belong to rows its rollback removed
+    monkeypatch.setattr(py_keywords, '_keyword_ids', {})
+
+
+@pytest.fixture
+def names():
+    suffix = uuid.uuid4().hex[:8]
+    return [f'hiking-{suffix}', f'lakes-{suffix}', f'food-{suffix}']
+
+
+def _new_experience(cur):
+    cur.execute("""
+        INSERT INTO experiences (user_id, title, description, experience_date, address,
+                                 latitude, longitude, location)
+        VALUES ('test-keywords', 'Linked', 'Test row', CURRENT_DATE, 'Nowhere', 0, 0,
+                ST_Point(0, 0)::geography)
+        RETURNING experience_id
+    """)
+    return cur.fetchone()[0]
+
+
+def _linked(cur, experience_id):
+    cur.execute("""
+        SELECT k.name
+        FROM experience_keywords ek
+            JOIN keywords k ON k.keyword_id = ek.keyword_id
+        WHERE ek.experience_id = %s
+    """, (experience_id,))
+    return {row[0] for row in cur.fetchall()}
+
+
+def test_resolve_creates_missing_keywords_once(db_conn, names):
+    with db_conn.cursor() as cur:
+        first = resolve_keyword_ids(cur, names[:2])
+        again = resolve_keyword_ids(cur, names)
+        assert set(first) == set(names[:2])
+        assert {name: again[name] for name in first} == first
+        assert len(set(again.values())) == 3
+
+
+def test_link_only_changes_the_difference(db_conn, names):
+    hiking, lakes, food = names
+    with db_conn.cursor() as cur:
+        experience_id = _new_experience(cur)
+
+        assert link_keywords(cur, experience_id, [hiking, lakes, '', hiking]) == ({hiking, lakes}, set())
+        assert link_keywords(cur, experience_id, [lakes, food]) == ({food}, {hiking})
+        assert link_keywords(cur, experience_id, [lakes, food]) == (set(), set())
+        assert _linked(cur, experience_id) == {lakes, food}
+
+
+def test_link_nothing_clears_every_keyword(db_conn, names):
+    with db_conn.cursor() as cur:
+        experience_id = _new_experience(cur)
+        link_keywords(cur, experience_id, names)
+
+        assert link_keywords(cur, experience_id, []) == (set(), set(names))
+        assert _linked(cur, experience_id) == set()
+
+
+def _usage(cur, names):
+    cur.execute("SELECT name, usage_count FROM keywords WHERE name = ANY(%s)", (names,))
+    return dict(cur.fetchall())
+
+
+def test_usage_count_follows_added_removed_and_cleared_links(db_conn, names):
+    hiking, lakes, food = names
+    with db_conn.cursor() as cur:
+        first, second = _new_experience(cur), _new_experience(cur)
+        link_keywords(cur, first, [hiking, lakes])
+        link_keywords(cur, second, [hiking])
+        assert _usage(cur, names) == {hiking: 2, lakes: 1}
+
+        link_keywords(cur, first, [lakes, food])
+        assert _usage(cur, names) == {hiking: 1, lakes: 1, food: 1}
+
+        link_keywords(cur, first, [lakes, food, hiking])
+        link_keywords(cur, first, [lakes, food, hiking])  # Unchanged links leave counts alone
+        assert _usage(cur, names) == {hiking: 2, lakes: 1, food: 1}
+
+        # What delete_experience does before deleting the row
+        link_keywords(cur, first, [])
+        assert _usage(cur, names) == {hiking: 1, lakes: 0, food: 0}
@@ -0,0 +1,76 @@
+from api.py_loaders import hydrate_experiences
+
+
+class BatchCursor:
+    """Answers each batch query with the canned rows of the table it reads."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        ids = params[0]
+        self.conn.queries.append(sorted(ids))
+        table = next(name for name in self.conn.tables if name in sql)
+        self.rows = [dict(row) for row in self.conn.tables[table] if row['experience_id'] in ids]
+
+    def fetchall(self):
+        return self.rows
+
+
+class BatchConnection:
+    def __init__(self, tables):
+        self.tables = tables
+        self.queries = []
+
+    def cursor(self, cursor_factory=None):
+        return BatchCursor(self)
+
+
+class RequestCursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+
+TABLES = {
+    'experience_photos': [
+        {'experience_id': 1, 'photo_id': 10, 'photo_url': 'a.jpg'},
+        {'experience_id': 1, 'photo_id': 11, 'photo_url': 'b.jpg'},
+    ],
+    'experience_keywords': [{'experience_id': 2, 'keywords': ['hiking', 'lakes']}],
+    'experience_rating_stats': [{'experience_id': 1, 'average_rating': 4.5, 'rating_count': 2}],
+}
+
+
+def test_one_query_per_kind_for_the_whole_page():
+    conn = BatchConnection(TABLES)
+    experiences = [{'experience_id': 1}, {'experience_id': 2}, {'experience_id': 1}]
+
+    hydrate_experiences(RequestCursor(conn), experiences, photos=True, keywords=True, ratings=True)
+    assert conn.queries == [[1, 2]] * 3
+
+
+def test_missing_children_get_defaults():
+    conn = BatchConnection(TABLES)
+    first, second = hydrate_experiences(RequestCursor(conn), [{'experience_id': 1}, {'experience_id': 2}],
+                                        photos=True, keywords=True, ratings=True)
+
+    assert [photo['photo_id'] for photo in first['photos']] == [10, 11]
+    assert first['keywords'] is None
+    assert (first['average_rating'], first['rating_count']) == (4.5, 2)
+    assert second['photos'] == []
+    assert second['keywords'] == ['hiking', 'lakes']
+    assert (second['average_rating'], second['rating_count']) == (0.0, 0)
+
+
+def test_nothing_requested_runs_no_query():
+    conn = BatchConnection(TABLES)
+    hydrate_experiences(RequestCursor(conn), [{'experience_id': 1}])
+    hydrate_experiences(RequestCursor(conn), [], photos=True, keywords=True, ratings=True)
+    assert conn.queries == []
@@ -0,0 +1,86 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from api.py_pagination import (InvalidCursor, cursor_condition, decode_cursor, encode_cursor,
+                               keyset_condition, next_cursor, parse_page_size)
+
+SORT = [
+    ('e.create_date', 'DESC', 'create_date'),
+    ('e.experience_id', 'DESC', 'experience_id'),
+]
+MIXED_SORT = [
+    ('rs.average_rating', 'DESC', 'average_rating'),
+    ('e.title', 'ASC', 'title'),
+    ('e.experience_id', 'DESC', 'experience_id'),
+]
+
+
+def test_cursor_round_trip():
+    row = {'create_date': datetime(2025, 3, 1, 12, 30, tzinfo=timezone.utc), 'experience_id': 42}
+    token = encode_cursor(row, SORT)
+    assert '=' not in token
+    assert decode_cursor(token, SORT) == ['2025-03-01T12:30:00+00:00', 42]
+
+
+def test_cursor_encodes_decimals_as_strings():
+    row = {'average_rating': Decimal('4.50'), 'title': 'Hike', 'experience_id': 7}
+    assert decode_cursor(encode_cursor(row, MIXED_SORT), MIXED_SORT) == ['4.50', 'Hike', 7]
+
+
+@pytest.mark.parametrize('token', [
+    'not base64!',
+    'bm90IGpzb24',  # "not json"
+    encode_cursor({'create_date': '2025-01-01', 'experience_id': 1}, SORT)[:-3],
+])
+def test_malformed_cursor(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, SORT)
+
+
+def test_cursor_for_another_sort_is_rejected():
+    token = encode_cursor({'average_rating': 4, 'title': 'Hike', 'experience_id': 7}, MIXED_SORT)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, SORT)
+
+
+@pytest.mark.parametrize('values', [[None, 1], [[1], 1], [{'a': 1}, 1]])
+def test_cursor_with_invalid_values_is_rejected(values):
+    token = encode_cursor(dict(zip(['create_date', 'experience_id'], values)), SORT)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, SORT)
+
+
+def test_invalid_cursor_is_a_value_error():
+    assert issubclass(InvalidCursor, ValueError)
+
+
+def test_same_direction_keyset_is_a_row_comparison():
+    sql, params = keyset_condition(SORT, ['2025-01-01', 5])
+    assert sql == '(e.create_date, e.experience_id) < (%s, %s)'
+    assert params == ['2025-01-01', 5]
+
+
+def test_mixed_direction_keyset_expands_to_or_chain():
+    sql, params = keyset_condition(MIXED_SORT, ['4.5', 'Hike', 7])
+    assert sql == ('((rs.average_rating < %s)'
+                   ' OR (rs.average_rating = %s AND e.title > %s)'
+                   ' OR (rs.average_rating = %s AND e.title = %s AND e.experience_id < %s))')
+    assert params == ['4.5', '4.5', 'Hike', '4.5', 'Hike', 7]
+
+
+def test_empty_cursor_matches_everything():
+    assert cursor_condition('', SORT) == ('TRUE', [])
+    assert cursor_condition(None, SORT) == ('TRUE', [])
+
+
+def test_next_cursor_only_when_page_is_full():
+    rows = [{'create_date': '2025-01-02', 'experience_id': 2}, {'create_date': '2025-01-01', 'experience_id': 1}]
+    assert next_cursor(rows, 3, SORT) is None
+    assert decode_cursor(next_cursor(rows, 2, SORT), SORT) == ['2025-01-01', 1]
+
+
+@pytest.mark.parametrize('value, expected', [(None, 50), (0, 50), (101, 50), (1, 1), (100, 100)])
+def test_parse_page_size(value, expected):
+    assert parse_page_size(value) == expected
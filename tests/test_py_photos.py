@@ -0,0 +1,98 @@
+import io
+import re
+
+import pytest
+
+from api import py_photos
+from api.py_photos import PHOTO_MAX_BYTES, photo_object_path
+
+BUCKET = 'travelplanner.appspot.com'
+
+
+class FakeBucket:
+    name = BUCKET
+
+
+class FakeStorage:
+    @staticmethod
+    def bucket():
+        return FakeBucket()
+
+
+class FakeBlob:
+    bucket = FakeBucket()
+
+    def __init__(self, name):
+        self.name = name
+        self.signed = None
+
+    def generate_signed_url(self, **kwargs):
+        self.signed = kwargs
+        return f'https://storage.googleapis.com/{BUCKET}/{self.name}?X-Goog-Signature=abc'
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setattr(py_photos, 'storage', FakeStorage)
+    monkeypatch.setattr(py_photos, 'STORAGE_EMULATOR_HOST', None)
+
+
+@pytest.fixture
+def emulator(storage, monkeypatch):
+    monkeypatch.setattr(py_photos, 'STORAGE_EMULATOR_HOST', 'http://localhost:9199')
+
+
+def test_photo_object_paths_are_unique_per_experience():
+    first, second = photo_object_path(12, 'jpg'), photo_object_path(12, 'jpg')
+    assert re.fullmatch(r'experiences/12/[0-9a-f-]{36}\.jpg', first)
+    assert first != second
+
+
+@pytest.mark.parametrize('url, expected', [
+    (f'https://storage.googleapis.com/{BUCKET}/photos/abc.jpg', 'photos/abc.jpg'),
+    (f'https://storage.googleapis.com/{BUCKET}/experiences/1/a%20b.jpg', 'experiences/1/a b.jpg'),
+    ('https://storage.googleapis.com/other-bucket/photos/abc.jpg', None),
+    ('https://example.com/photos/abc.jpg', None),
+])
+def test_object_path_from_url(storage, url, expected):
+    assert py_photos.object_path_from_url(url) == expected
+
+
+def test_object_path_from_emulator_url(emulator):
+    url = f'http://localhost:9199/v0/b/{BUCKET}/o/photos%2Fabc.jpg?alt=media'
+    assert py_photos.object_path_from_url(url) == 'photos/abc.jpg'
+
+
+def test_signed_upload_target(storage):
+    blob = FakeBlob('experiences/1/x.jpg')
+    target = py_photos._upload_target(blob, 'image/jpeg')
+
+    assert target['method'] == 'PUT'
+    assert target['headers'] == {'Content-Type': 'image/jpeg',
+                                 'x-goog-content-length-range': f'0,{PHOTO_MAX_BYTES}'}
+    # The size limit is part of the signature, so clients cannot drop it
+    assert blob.signed['method'] == 'PUT' and blob.signed['content_type'] == 'image/jpeg'
+    assert blob.signed['headers'] == {'x-goog-content-length-range': f'0,{PHOTO_MAX_BYTES}'}
+
+
+def test_emulator_upload_target(emulator):
+    target = py_photos._upload_target(FakeBlob('experiences/1/x.jpg'), 'image/png')
+    assert target == {
+        'method': 'POST',
+        'url': (f'http://localhost:9199/upload/storage/v1/b/{BUCKET}/o'
+                f'?uploadType=media&name=experiences%2F1%2Fx.jpg'),
+        'headers': {'Content-Type': 'image/png'},
+    }
+
+
+def test_render_derivatives_fits_longest_edge():
+    Image = pytest.importorskip('PIL.Image')
+    source = io.BytesIO()
+    Image.new('RGB', (2000, 1000), 'red').save(source, 'JPEG')
+
+    renditions = py_photos.render_derivatives(source)
+    assert set(renditions) == set(py_photos.PHOTO_DERIVATIVES)
+    for size, max_edge in py_photos.PHOTO_DERIVATIVES.items():
+        with Image.open(io.BytesIO(renditions[size])) as image:
+            assert image.format == 'WEBP'
+            assert image.size == (max_edge, max_edge // 2)
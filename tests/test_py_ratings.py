@@ -0,0 +1,47 @@
+import pytest
+
+from api.py_ratings import record_rating
+
+
+@pytest.fixture
+def experience_id(db_conn):
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO experiences (user_id, title, description, experience_date, address,
+                                     latitude, longitude, location)
+            VALUES ('test-ratings', 'Rated', 'Test row', CURRENT_DATE, 'Nowhere', 0, 0,
+                    ST_Point(0, 0)::geography)
+            RETURNING experience_id
+        """)
+        return cur.fetchone()[0]
+
+
+def _state(cur, experience_id):
+    cur.execute("""
+        SELECT s.rating_count, s.rating_sum, p.trend_log
+        FROM experience_rating_stats s
+            LEFT JOIN experience_popularity p ON p.experience_id = s.experience_id
+        WHERE s.experience_id = %s
+    """, (experience_id,))
+    return cur.fetchone()
+
+
+def test_repeated_rating_adds_no_trend_event(db_conn, experience_id):
+    with db_conn.cursor() as cur:
+        assert record_rating(cur, experience_id, 'rater', 4)
+        first = _state(cur, experience_id)
+        assert first[:2] == (1, 4) and first[2] is not None
+
+        assert not record_rating(cur, experience_id, 'rater', 4)
+        assert _state(cur, experience_id) == first
+
+
+def test_changed_rating_updates_stats_and_trend(db_conn, experience_id):
+    with db_conn.cursor() as cur:
+        record_rating(cur, experience_id, 'rater', 4)
+        before = _state(cur, experience_id)
+
+        assert record_rating(cur, experience_id, 'rater', 2)
+        after = _state(cur, experience_id)
+        assert after[:2] == (1, 2)
+        assert after[2] > before[2]
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from api.py_singleflight import SingleFlight
+
+
+def _start_leader(flight, key, release, result='result'):
+    """Run a leader call that blocks until release is set; return (thread, results)."""
+    started = threading.Event()
+    results = []
+
+    def fn():
+        started.set()
+        release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def run():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            results.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+    return thread, results
+
+
+def _follow(flight, key, fn, timeout=5):
+    results = []
+
+    def run():
+        try:
+            results.append(flight.do(key, fn, timeout=timeout))
+        except Exception as e:
+            results.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, results
+
+
+def _wait_for_followers(flight, key, count):
+    for _ in range(500):
+        with flight._lock:
+            if flight._calls[key].followers >= count:
+                return
+        time.sleep(0.01)
+    raise AssertionError('followers did not arrive')
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, leader_results = _start_leader(flight, 'k', release)
+    calls = []
+    followers = [_follow(flight, 'k', lambda: calls.append(1)) for _ in range(3)]
+    _wait_for_followers(flight, 'k', 3)
+    release.set()
+
+    for thread, _ in [(leader, None)] + followers:
+        thread.join(5)
+    assert leader_results == ['result']
+    assert [results for _, results in followers] == [['result']] * 3
+    assert calls == []
+    assert flight.stats() == {'leaders': 1, 'coalesced': 3, 'timeouts': 0, 'errors': 0, 'in_flight': 0}
+
+
+def test_followers_reraise_the_leaders_error():
+    flight = SingleFlight()
+    release = threading.Event()
+    error = RuntimeError('db down')
+    leader, leader_results = _start_leader(flight, 'k', release, result=error)
+    follower, follower_results = _follow(flight, 'k', lambda: 'unused')
+    _wait_for_followers(flight, 'k', 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert leader_results == [error] and follower_results == [error]
+    assert flight.stats()['errors'] == 1
+
+
+def test_follower_runs_itself_after_timeout():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, _ = _start_leader(flight, 'k', release)
+    follower, follower_results = _follow(flight, 'k', lambda: 'own', timeout=0.01)
+    follower.join(5)
+    release.set()
+    leader.join(5)
+
+    assert follower_results == ['own']
+    assert flight.stats()['timeouts'] == 1
+
+
+def test_different_keys_and_sequential_calls_do_not_coalesce():
+    flight = SingleFlight()
+    assert flight.do('a', lambda: 1) == 1
+    assert flight.do('a', lambda: 2) == 2
+    assert flight.do('b', lambda: 3) == 3
+    assert flight.stats()['coalesced'] == 0
+
+
+def test_leader_error_is_raised():
+    flight = SingleFlight()
+    with pytest.raises(KeyError):
+        flight.do('k', lambda: {}['missing'])
+    assert flight.stats()['in_flight'] == 0
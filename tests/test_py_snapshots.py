@@ -0,0 +1,137 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from api import py_snapshots
+from api.py_snapshots import SnapshotCache
+
+
+class FakeConnection:
+    def rollback(self):
+        pass
+
+
+@contextmanager
+def fake_pooled_connection():
+    yield FakeConnection()
+
+
+@pytest.fixture(autouse=True)
+def no_database(monkeypatch):
+    monkeypatch.setattr(py_snapshots, 'pooled_connection', fake_pooled_connection)
+
+
+class Loader:
+    """Counts loads; each refresh after the first can be held back until released."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.loaded = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, conn, key):
+        self.release.wait(5)
+        self.calls += 1
+        if self.fail:
+            self.loaded.set()
+            raise RuntimeError('database down')
+        value = f'{key}-{self.calls}'
+        self.loaded.set()
+        return value
+
+    def refreshed(self, cache):
+        """Wait for a background refresh to finish."""
+        assert self.loaded.wait(5)
+        self.loaded.clear()
+        for thread in threading.enumerate():
+            if thread.name == f'snapshot-{cache.name}':
+                thread.join(5)
+
+
+def test_first_request_loads_and_later_ones_hit():
+    loader = Loader()
+    cache = SnapshotCache('test', loader, fresh_for=60)
+
+    assert cache.get(('a',)) == 'a-1'
+    assert cache.get(('a',)) == 'a-1'
+    assert loader.calls == 1
+    assert cache.stats()['cold_loads'] == 1 and cache.stats()['hits'] == 1
+
+
+def test_expired_snapshot_is_served_while_refreshing():
+    loader = Loader()
+    cache = SnapshotCache('test', loader, fresh_for=0)
+    cache.get(('a',))
+    loader.loaded.clear()
+    loader.release.clear()
+
+    assert cache.get(('a',)) == 'a-1'  # Stale value, refresh started in the background
+    assert cache.get(('a',)) == 'a-1'  # Still refreshing: no second refresh
+    loader.release.set()
+    loader.refreshed(cache)
+
+    assert loader.calls == 2
+    assert cache.stats()['refreshes'] == 1
+    cache.fresh_for = 60
+    assert cache.get(('a',)) == 'a-2'
+
+
+def test_mark_stale_refreshes_a_fresh_snapshot():
+    loader = Loader()
+    cache = SnapshotCache('test', loader, fresh_for=60)
+    cache.get(('a',))
+    loader.loaded.clear()
+
+    cache.mark_stale({'entity': 'trip', 'ids': [1]})
+    assert cache.get(('a',)) == 'a-1'
+    loader.refreshed(cache)
+    assert cache.get(('a',)) == 'a-2'
+    assert loader.calls == 2
+
+
+def test_change_during_refresh_keeps_the_new_snapshot_stale():
+    loader = Loader()
+    cache = SnapshotCache('test', loader, fresh_for=60)
+    cache.get(('a',))
+    loader.loaded.clear()
+    loader.release.clear()
+
+    cache.mark_stale()
+    cache.get(('a',))  # Starts a refresh that is still loading...
+    cache.mark_stale()  # ...when another change lands
+    loader.release.set()
+    loader.refreshed(cache)
+
+    assert cache.get(('a',)) == 'a-2'  # Served, but refreshed again
+    loader.refreshed(cache)
+    assert loader.calls == 3
+
+
+def test_failed_refresh_keeps_the_old_snapshot():
+    loader = Loader()
+    cache = SnapshotCache('test', loader, fresh_for=0)
+    cache.get(('a',))
+    loader.loaded.clear()
+    loader.fail = True
+
+    cache.get(('a',))
+    loader.refreshed(cache)
+    assert cache.stats()['refresh_errors'] == 1
+    cache.fresh_for = 60
+    assert cache.get(('a',)) == 'a-1'
+
+
+def test_least_recently_used_parameter_sets_are_dropped():
+    loader = Loader()
+    cache = SnapshotCache('test', loader, fresh_for=60, max_entries=2)
+    cache.get(('a',))
+    cache.get(('b',))
+    cache.get(('a',))
+    cache.get(('c',))  # Evicts b
+
+    assert cache.stats()['entries'] == 2
+    assert cache.get(('a',)) == 'a-1'
+    assert cache.get(('b',)) == 'b-4'
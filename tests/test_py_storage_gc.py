@@ -0,0 +1,181 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from api import py_photos, py_storage_gc
+from api.py_storage_gc import delete_experience_photos, release_photo_blobs
+
+BUCKET = 'travelplanner.appspot.com'
+
+
+class FakeBlob:
+    def __init__(self, name):
+        self.name = name
+        self.time_created = datetime.now(timezone.utc) - timedelta(days=30)
+
+
+class FakeBucket:
+    name = BUCKET
+    listed = []
+    objects = ['experiences/7/a.jpg', 'experiences/7/a_thumbnail.webp', 'experiences/7/orphan.jpg']
+
+    def list_blobs(self, prefix):
+        self.listed.append(prefix)
+        return [FakeBlob(name) for name in self.objects if name.startswith(prefix)]
+
+
+class FakeStorage:
+    @staticmethod
+    def bucket():
+        return FakeBucket()
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setattr(py_photos, 'storage', FakeStorage)
+    monkeypatch.setattr(py_storage_gc, 'storage', FakeStorage)
+    monkeypatch.setattr(py_photos, 'STORAGE_EMULATOR_HOST', None)
+    monkeypatch.setattr(FakeBucket, 'listed', [])
+
+
+def test_shared_blobs_are_released_and_owned_files_queued(storage, monkeypatch):
+    released, queued = [], []
+    monkeypatch.setattr(py_storage_gc, 'release_photo_blobs', lambda cur, hashes: released.extend(hashes))
+    monkeypatch.setattr(py_storage_gc, 'enqueue_deletions', lambda cur, paths: queued.extend(paths))
+    url = f'https://storage.googleapis.com/{BUCKET}'
+
+    py_storage_gc._release_photo_files(None, [
+        ('h1', f'{url}/photos/h1.jpg', f'{url}/photos/h1_thumbnail.webp', None),
+        ('h1', f'{url}/photos/h1.jpg', None, None),
+        (None, f'{url}/experiences/7/a.jpg', f'{url}/experiences/7/a_thumbnail.webp', None),
+    ])
+    # Shared blobs are only dereferenced; the storage GC deletes them after the grace period
+    assert released == ['h1', 'h1']
+    assert queued == ['experiences/7/a.jpg', 'experiences/7/a_thumbnail.webp']
+
+
+@pytest.fixture
+def blob_photos(db_conn):
+    """Two photos of one experience sharing a blob, and a second blob used once."""
+    shared, single = uuid.uuid4().hex, uuid.uuid4().hex
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO experiences (user_id, title, description, experience_date, address,
+                                     latitude, longitude, location)
+            VALUES ('test-blobs', 'Photos', 'Test row', CURRENT_DATE, 'Nowhere', 0, 0,
+                    ST_Point(0, 0)::geography)
+            RETURNING experience_id
+        """)
+        experience_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO photo_blobs (content_hash, object_path, photo_url, ref_count)
+            VALUES (%(shared)s, 'photos/' || %(shared)s || '.jpg', 'https://example.com/shared.jpg', 2),
+                   (%(single)s, 'photos/' || %(single)s || '.jpg', 'https://example.com/single.jpg', 1)
+        """, {'shared': shared, 'single': single})
+        cur.execute("""
+            INSERT INTO experience_photos (experience_id, photo_url, content_hash)
+            VALUES (%(id)s, 'https://example.com/shared.jpg', %(shared)s),
+                   (%(id)s, 'https://example.com/shared.jpg', %(shared)s),
+                   (%(id)s, 'https://example.com/single.jpg', %(single)s)
+            RETURNING photo_id
+        """, {'id': experience_id, 'shared': shared, 'single': single})
+        photo_ids = [row[0] for row in cur.fetchall()]
+    return experience_id, photo_ids, shared, single
+
+
+def _blob(cur, content_hash):
+    cur.execute("SELECT ref_count, released_at IS NOT NULL FROM photo_blobs WHERE content_hash = %s",
+                (content_hash,))
+    return cur.fetchone()
+
+
+def test_release_counts_each_occurrence_and_stamps_at_zero(db_conn, blob_photos):
+    _, _, shared, single = blob_photos
+    with db_conn.cursor() as cur:
+        release_photo_blobs(cur, [shared, single])
+        assert _blob(cur, shared) == (1, False)
+        assert _blob(cur, single) == (0, True)
+
+        release_photo_blobs(cur, [shared, shared])  # Never below zero
+        assert _blob(cur, shared) == (0, True)
+
+
+def test_deleting_photos_releases_their_blobs(db_conn, blob_photos):
+    experience_id, photo_ids, shared, single = blob_photos
+    with db_conn.cursor() as cur:
+        assert delete_experience_photos(cur, experience_id, photo_ids[:1]) == 1
+        assert _blob(cur, shared) == (1, False)
+
+        assert delete_experience_photos(cur, experience_id, photo_ids[1:] + [0]) == 2
+        assert _blob(cur, shared) == (0, True)
+        assert _blob(cur, single) == (0, True)
+
+        # The blobs are collected later, not queued right away
+        cur.execute("SELECT COUNT(*) FROM storage_deletions WHERE object_path = ANY(%s)",
+                    ([f'photos/{shared}.jpg', f'photos/{single}.jpg'],))
+        assert cur.fetchone()[0] == 0
+
+
+class SweepCursor:
+    """Answers the sweep's queries with the canned rows of the table they read."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if 'advisory' in sql:
+            self.rows = [(True,)]
+        else:
+            self.rows = next(rows for table, rows in self.tables.items() if f'FROM {table}' in sql)
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+class SweepConnection:
+    def __init__(self, tables):
+        self.tables = tables
+
+    def cursor(self, cursor_factory=None):
+        return SweepCursor(self.tables)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def _sweep(monkeypatch, photo_url):
+    queued = []
+    monkeypatch.setattr(py_storage_gc, 'enqueue_deletions', lambda cur, paths: queued.extend(paths) or len(paths))
+    conn = SweepConnection({
+        'experience_photos': [(photo_url, None, None)],
+        'photo_uploads': [],
+        'photo_blobs': [],
+    })
+    return py_storage_gc.sweep_orphaned_objects(conn), queued
+
+
+def test_sweep_queues_unreferenced_objects(storage, monkeypatch):
+    swept, queued = _sweep(monkeypatch, f'https://storage.googleapis.com/{BUCKET}/experiences/7/a.jpg')
+    assert (swept, queued) == (1, ['experiences/7/orphan.jpg'])
+
+
+def test_sweep_fails_closed_on_an_unmapped_url(storage, monkeypatch):
+    # A photo stored under another URL form would look orphaned
+    url = f'https://firebasestorage.googleapis.com/v0/b/{BUCKET}/o/experiences%2F7%2Forphan.jpg?alt=media'
+    swept, queued = _sweep(monkeypatch, url)
+    assert (swept, queued) == (None, [])
+    assert FakeBucket.listed == []
@@ -0,0 +1,103 @@
+import uuid
+
+from api import py_keywords
+from api.py_autocomplete import (SuggestionTrie, build_suggestion_trie, escape_like, normalize_query,
+                                 suggest_from_db)
+from api.py_keywords import link_keywords, resolve_keyword_ids
+
+
+def _trie(rows, top_k=32):
+    trie = SuggestionTrie(top_k=top_k)
+    trie.bulk_load(rows)
+    return trie
+
+
+def test_normalize_and_escape():
+    assert normalize_query('  Hiking   Trails ') == 'hiking trails'
+    assert escape_like('100%_\\') == '100\\%\\_\\\\'
+
+
+def test_prefix_matches_ranked_by_popularity():
+    trie = _trie([('hiking', 1, 5), ('hot springs', 1, 9), ('history', 1, 1)])
+    assert trie.suggest('h', 10) == ['hot springs', 'hiking', 'history']
+    assert trie.suggest('hi', 10) == ['hiking', 'history']
+    assert trie.suggest('HI', 1) == ['hiking']
+
+
+def test_word_start_infix_matches_rank_after_prefix_matches():
+    trie = _trie([('sunset hike', 1, 50), ('hiking', 1, 1)])
+    assert trie.suggest('hik', 10) == ['hiking', 'sunset hike']
+
+
+def test_infix_matches_start_a_word():
+    trie = _trie([('sunset hike', 1, 50)])
+    assert trie.suggest('ike', 10) == []
+
+
+def test_short_queries_skip_infix_matches():
+    trie = _trie([('sunset hike', 1, 50), ('hiking', 1, 1)])
+    assert trie.suggest('hi', 10) == ['hiking']
+
+
+def test_update_adds_and_reranks():
+    trie = _trie([('hiking', 1, 5)])
+    trie.update('hill walk', ref_delta=1, popularity_delta=10)
+    assert trie.suggest('hi', 10) == ['hill walk', 'hiking']
+    assert len(trie) == 2
+
+
+def test_update_removes_when_last_reference_goes():
+    trie = _trie([('hiking', 2, 2)])
+    trie.update('hiking', ref_delta=-1, popularity_delta=-1)
+    assert trie.suggest('hik', 10) == ['hiking']
+    trie.update('hiking', ref_delta=-1, popularity_delta=-1)
+    assert trie.suggest('hik', 10) == []
+    assert len(trie) == 0
+
+
+def test_top_k_is_kept_per_node():
+    trie = _trie([(f'park {i:02d}', 1, i) for i in range(10)], top_k=3)
+    assert trie.suggest('park', 10) == ['park 09', 'park 08', 'park 07']
+    trie.update('park 09', ref_delta=-1)
+    assert trie.suggest('park', 10) == ['park 08', 'park 07', 'park 06']
+
+
+def test_blank_suggestions_are_ignored():
+    trie = _trie([('', 1, 1), ('   ', 1, 1)])
+    assert len(trie) == 0
+
+
+class _KeepTransaction:
+    """Lets build_suggestion_trie read the test's uncommitted rows."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return self.conn.cursor(*args, **kwargs)
+
+    def rollback(self):
+        pass
+
+
+def test_sql_and_trie_agree(db_conn, monkeypatch):
+    monkeypatch.setattr(py_keywords, '_keyword_ids', {})  # Ids of rows the rollback removes
+    term = f'x{uuid.uuid4().hex[:8]}'
+    with db_conn.cursor() as cur:
+        for title in (f'{term} trail', f'sunset {term}', f'mid{term}'):
+            cur.execute("""
+                INSERT INTO experiences (user_id, title, description, experience_date, address,
+                                         latitude, longitude, location)
+                VALUES ('test-suggestions', %s, 'Test row', CURRENT_DATE, 'Nowhere', 0, 0,
+                        ST_Point(0, 0)::geography)
+                RETURNING experience_id
+            """, (title,))
+            experience_id = cur.fetchone()[0]
+        link_keywords(cur, experience_id, [f'{term}-used'])
+        resolve_keyword_ids(cur, [f'{term}-unused'])
+
+    # Prefix matches first (the used keyword is more popular), then word starts; no
+    # mid-word match and no unused keyword
+    expected = [f'{term}-used', f'{term} trail', f'sunset {term}']
+    assert suggest_from_db(db_conn, term, 10) == expected
+    assert build_suggestion_trie(_KeepTransaction(db_conn)).suggest(term, 10) == expected
@@ -0,0 +1,69 @@
+import pytest
+
+from api.py_popularity import add_trip_experience
+
+# A spot in the open Pacific, so the bbox holds only the seeded experience
+LAT, LNG = 0.5, -140.5
+BBOX = '-141,0,-140,1'
+
+
+@pytest.fixture
+def seeded_experience(db_conn):
+    """An experience added to two trips: one today, one 60 days ago."""
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO experiences (user_id, title, description, experience_date, address,
+                                     latitude, longitude, location)
+            VALUES ('test-top', 'Open ocean', 'Test row', CURRENT_DATE, 'Pacific', %s, %s,
+                    ST_Point(%s, %s)::geography)
+            RETURNING experience_id
+        """, (LAT, LNG, LNG, LAT))
+        experience_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO trips (user_id, title, description)
+            VALUES ('test-top', 'Recent', ''), ('test-top', 'Old', '')
+            RETURNING trip_id
+        """)
+        trip_ids = [row[0] for row in cur.fetchall()]
+        for trip_id in trip_ids:
+            add_trip_experience(cur, trip_id, experience_id)
+        cur.execute("""
+            UPDATE trip_experiences SET added_date = NOW() - INTERVAL '60 days'
+            WHERE trip_id = %s
+        """, (trip_ids[1],))
+    db_conn.commit()
+    yield experience_id
+    with db_conn.cursor() as cur:
+        cur.execute("DELETE FROM trips WHERE trip_id = ANY(%s)", (trip_ids,))
+        cur.execute("DELETE FROM experiences WHERE experience_id = %s", (experience_id,))
+    db_conn.commit()
+
+
+def test_top_experiences_window(client, seeded_experience):
+    response = client.get(f'/py/experiences/top_experiences?window=7&bbox={BBOX}')
+    assert response.status_code == 200
+
+    rows = [row for row in response.get_json() if row['experience_id'] == seeded_experience]
+    assert len(rows) == 1
+    assert rows[0]['trip_count'] == 1  # Only the addition inside the window
+    assert 'window_trip_count' not in rows[0]
+
+
+def test_top_experiences_all_time(client, seeded_experience):
+    response = client.get(f'/py/experiences/top_experiences?bbox={BBOX}')
+    assert response.status_code == 200
+
+    rows = [row for row in response.get_json() if row['experience_id'] == seeded_experience]
+    assert len(rows) == 1
+    assert rows[0]['trip_count'] == 2
+
+
+def test_experience_rows_do_not_carry_counters(client, seeded_experience):
+    response = client.get(f'/py/experiences/details/{seeded_experience}')
+    assert response.status_code == 200
+    assert not {'trip_count', 'trend_log'} & set(response.get_json())
+
+
+def test_top_experiences_rejects_unknown_window(client):
+    response = client.get('/py/experiences/top_experiences?window=2')
+    assert response.status_code == 400